@@ -97,6 +97,92 @@ MAX_EXECUTION_COUNT = 20
 MAX_UI_INSTRUCTION_COUNT = 35
 MAX_DETECTION_COUNT = 30
 
+# DockerComputer pool: slot i -> container f"{DOCKER_COMPUTER_NAME}-{i}", VNC port 5900 + i, display :99 + i
+DOCKER_COMPUTER_NAME = "docker-computer"
+DOCKER_COMPUTER_VNC_PORT = 5900
+DOCKER_COMPUTER_DISPLAY_NUM = 99
+MAX_PARALLEL_SCENARIOS = 1
+# > 1: slots of the DockerComputerPool share containers, each container hosting this many X displays
+# (own Xvfb, window manager, VNC server on 5900 + k inside the container, app instance)
+DISPLAYS_PER_CONTAINER = 1
+DOCKER_DISPLAY_SCREEN = "1280x800x24"  # Xvfb screen of the extra displays, as in the Dockerfiles' CMD
+# warm pool: standby containers with the app already launched, VNC ports from 5950
+WARM_POOL_SIZE = 0
+WARM_POOL_VNC_PORT = 5950
+WARM_POOL_WAIT_TIMEOUT = 180  # seconds to wait for a container still warming up before a cold start
+# UI actions and screenshots through one persistent in-container process instead of a docker exec each
+USE_CONTAINER_AGENT = False
+CONTAINER_AGENT_TIMEOUT = 120  # seconds per command before the agent is considered stuck
+# UI backend of the DockerComputers, per run (scripts/app.py): "xdotool" (commands in the container),
+# "vnc" (RFB client on the slot's VNC port: input over the protocol, screenshots and settle detection from a local
+# framebuffer the server keeps up to date with dirty rectangles), "xtest" (input injected by one persistent
+# python-xlib process per display, screenshots as with xdotool)
+COMPUTER_BACKEND = "xdotool"
+VNC_HOST = "localhost"
+VNC_PASSWORD = "secret"  # x11vnc -storepasswd in the Dockerfiles; DES from pycryptodome (requirements.txt)
+VNC_CONNECT_TIMEOUT = 20  # seconds
+XTEST_KEY_DELAY_MS = 1  # between typed characters, as xdotool type --delay 1
+# `type` actions of at least CLIPBOARD_PASTE_MIN_CHARS: paste from the X clipboard (xclip) instead of typing key by
+# key, in the apps of CLIPBOARD_PASTE_KEYS; a paste the app does not request from xclip is typed instead
+USE_CLIPBOARD_PASTE = False
+CLIPBOARD_PASTE_MIN_CHARS = 32
+CLIPBOARD_PASTE_VERIFY_MS = 1000  # at most, waiting for the app to request the clipboard and show the text
+# talk to the Docker Engine API on the local socket instead of spawning the docker CLI (CLI if unavailable)
+USE_DOCKER_ENGINE_API = False
+DOCKER_SOCKET_PATH = "/var/run/docker.sock"
+DOCKER_ENGINE_API_VERSION = "v1.41"
+# diff images: build before/after as concurrent BuildKit stages (DockerfileDiffParallel) with cache mounts
+DOCKER_PARALLEL_DIFF_BUILD = False
+BUILD_METRICS_FILEPATH = Path(OUTPUT_DIR, "build_metrics.jsonl")
+# per-commit build artifact cache, keyed by (repo, commit, recipe hash), LRU above ARTIFACT_CACHE_MAX_BYTES
+USE_ARTIFACT_CACHE = False
+ARTIFACT_CACHE_DIR = Path(ROOT_DIR, "artifact_cache")
+ARTIFACT_CACHE_MAX_BYTES = 100 * 1024 ** 3
+# background prefetch: build the diff images of the next PREFETCH_LOOKAHEAD PRs while the current one runs,
+# at most PREFETCH_MAX_CONCURRENT_BUILDS at a time, each capped to PREFETCH_BUILD_JOBS compiler jobs (0: no prefetch)
+PREFETCH_LOOKAHEAD = 0
+PREFETCH_MAX_CONCURRENT_BUILDS = 1
+PREFETCH_BUILD_JOBS = max(1, (os.cpu_count() or 2) // 2)
+# image GC: least recently used base/diff images are removed once they use more than IMAGE_DISK_QUOTA_BYTES
+USE_IMAGE_GC = False
+IMAGE_DISK_QUOTA_BYTES = 200 * 1024 ** 3
+IMAGE_USAGE_FILEPATH = Path(OUTPUT_DIR, "image_usage.json")
+# firefox: host-side cache of the build archives mozregression launches, mounted read-only into the containers;
+# offline: a build missing from the cache fails fast instead of being downloaded
+USE_MOZ_BUILD_CACHE = False
+MOZ_BUILD_CACHE_DIR = Path(ROOT_DIR, "moz_build_cache")
+MOZ_BUILD_CACHE_MAX_BYTES = 50 * 1024 ** 3
+MOZ_BUILD_CACHE_OFFLINE = False
+MOZ_BUILD_CACHE_MOUNT = "/mozcache"
+# settle / GUI check polling on raw xwd frames (numpy) instead of ImageMagick PNGs; needs x11-apps in the image
+USE_RAW_FRAMES = False
+# UI-settle detection: after an action, wait until the screen is unchanged for SETTLE_STABLE_MS
+# (at most the old fixed wait), polling raw frames every SETTLE_POLL_MS
+USE_SETTLE_DETECTION = False
+SETTLE_STABLE_MS = 500
+SETTLE_POLL_MS = 100
+SETTLE_MIN_MS = 200  # give the app time to react before the first frame
+SETTLE_DIFF_THRESHOLD_PCT = 0.05  # % of changed pixels still counted as stable (blinking cursor)
+SETTLE_IGNORE_TOP = 60  # px, panel clock
+SETTLE_LAUNCH_STABLE_MS = 1500  # after an app launch, bridge the gap between splash screen and main window
+# learned settle profiles per (app, build, action kind): polling delay = p10, timeout = p95 * factor + stable window
+USE_SETTLE_PROFILES = False
+SETTLE_PROFILE_FILEPATH = Path(OUTPUT_DIR, "settle_profiles.json")
+SETTLE_PROFILE_MIN_SAMPLES = 5  # fewer samples: fixed defaults
+SETTLE_PROFILE_MAX_SAMPLES = 200  # most recent samples kept per key
+SETTLE_PROFILE_TIMEOUT_FACTOR = 1.5
+SETTLE_PROFILE_MIN_DELAY_MS = 50
+SETTLE_PROFILE_MAX_TIMEOUT_MS = 30000
+# resumable batch runs (scripts/app.py): finished PRs/stages are recorded in OUTPUT_DIR/<app>/jobs.sqlite and skipped
+# when the script is restarted; False: every run starts over in a new output folder
+USE_JOB_STORE = True
+# executor -> detector overlap: how many executed scenarios may wait for detection
+DETECTION_QUEUE_SIZE = 2
+# multi-host mode: coordinator and workers share WORK_QUEUE_DIR (e.g. an NFS mount)
+WORK_QUEUE_DIR = Path(OUTPUT_DIR, "work_queue")
+WORKER_POLL_INTERVAL = 5  # seconds
+WORKER_LEASE_TIMEOUT = 600  # seconds without heartbeat before a running task goes back to pending
+
 APP_NAME_THUNDERBIRD = "thunderbird"
 APP_NAME_FIREFOX = "firefox"
 
@@ -112,6 +198,46 @@ APP_OWNER_NAME_GODOT = "godotengine"
 APP_NAME_JABREF = "jabref"
 APP_OWNER_NAME_JABREF = "JabRef"
 
+# fast app reset inside a reused container: process to kill and user-state folders (relative to the container
+# user's home) restored from the snapshot taken right after the container started
+APP_PROCESS_PATTERNS = {
+    APP_NAME_FIREFOX: "firefox",
+    APP_NAME_ZETTLR: "Zettlr",
+    APP_NAME_GODOT: APP_NAME_GODOT,
+    APP_NAME_JABREF: "JabRef",
+}
+# launch checks wait for the app's window (APP_READINESS_RULES) instead of a visual diff
+USE_APP_READINESS = False
+# readiness: the app is up once a top-level window matches wm_class or title (regex, case-insensitive),
+# and, with "active", is the active window
+APP_READINESS_RULES = {
+    APP_NAME_FIREFOX: {"wm_class": "firefox|navigator", "title": "mozilla firefox|nightly"},
+    APP_NAME_DESKTOP: {"wm_class": "github desktop", "title": "github desktop"},
+    APP_NAME_VSCODE: {"wm_class": "code", "title": "visual studio code|code - oss"},
+    APP_NAME_ZETTLR: {"wm_class": "zettlr", "title": "zettlr"},
+    APP_NAME_GODOT: {"wm_class": "godot", "title": "godot engine|project manager", "active": True},
+    APP_NAME_JABREF: {"wm_class": "jabref", "title": "^jabref"},
+}
+# where a built commit lives inside a diff image (same paths as run_single_build_for_*), cached per commit
+APP_ARTIFACT_PATHS = {
+    APP_NAME_ZETTLR: "/home/myuser/Zettlr/out/Zettlr-{commit_id}",
+    APP_NAME_GODOT: "/home/myuser/godot/godot-{commit_id}",
+    APP_NAME_JABREF: "/home/myuser/jabref/jabgui/build/packages/jabref-{commit_id}",
+}
+# apps whose text inputs paste from the clipboard, with their paste keys; other apps always get keystrokes
+CLIPBOARD_PASTE_KEYS = {
+    APP_NAME_FIREFOX: ["ctrl", "v"],
+    APP_NAME_ZETTLR: ["ctrl", "v"],
+    APP_NAME_GODOT: ["ctrl", "v"],
+    APP_NAME_JABREF: ["ctrl", "v"],
+}
+APP_STATE_DIRS = {
+    APP_NAME_FIREFOX: [".mozilla", "Downloads"],
+    APP_NAME_ZETTLR: [".config/Zettlr", "Documents", "Downloads"],
+    APP_NAME_GODOT: [".config/godot", ".local/share/godot", ".cache/godot", "Documents", "Downloads"],
+    APP_NAME_JABREF: [".java/.userPrefs/org/jabref", ".local/share/jabref", "Documents", "Downloads"],
+}
+
 BUG_LINK_ANTENNAPOD = 'https://github.com/AntennaPod/AntennaPod/issues/'
 
 
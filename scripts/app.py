@@ -4,14 +4,20 @@ from pathlib import Path
 from src.pipelines.app import App
 from src.pipelines.detector import BugReportTool
 from src.pipelines.placeholder import Placeholder
+from src.pipelines.prefetcher import ImagePrefetcher
 from src.pipelines.executor import ComputerUseTool
-from src.types.docker import DockerComputer
+from src.pipelines.scheduler import ScenarioScheduler
+from src.types.docker import DockerComputer, DockerImageBuilder
+from src.types.budget import Budget
+from src.types.image_manager import ImageManager
+from src.types.job_store import JobStore
 from src.utils.claude_util import ClaudeUtil
 from src.utils.file_util import FileUtil
 from src.utils.gpt_util import GPTUtil
 from src.utils.path_util import PathUtil
 from config import APP_NAME_FIREFOX, OUTPUT_DIR, DATA_DIR, APP_NAME_DESKTOP, APP_NAME_VSCODE, APP_NAME_ZETTLR, \
-    APP_NAME_GODOT, APP_NAME_JABREF
+    APP_NAME_GODOT, APP_NAME_JABREF, MAX_PARALLEL_SCENARIOS, WARM_POOL_SIZE, PREFETCH_LOOKAHEAD, \
+    USE_IMAGE_GC, COMPUTER_BACKEND, USE_JOB_STORE
 from datetime import datetime
 
 
@@ -46,6 +52,14 @@ if __name__ == "__main__":
     use_extracted_executor_memory = True
     # use_extracted_executor_memory = False
     include_executor_history_image = False  # only applies when using conversation history (i.e., messages)
+    max_parallel_scenarios = MAX_PARALLEL_SCENARIOS  # > 1: run test scenarios at the same time over a container pool
+    lockstep = False  # True: drive before/after builds side by side instead of Play then Replay
+    warm_pool_size = WARM_POOL_SIZE  # > 0: standby containers with the app already launched, per version
+    fast_reset = False  # True: keep containers between scenarios of a PR, reset only the app state
+    work_queue = None  # WORK_QUEUE_DIR: multi-host mode, scenarios are run by scripts/worker.py on other hosts
+    prefetch_lookahead = PREFETCH_LOOKAHEAD  # > 0: build the images of the next k PRs while the current one runs
+    computer_backend = COMPUTER_BACKEND  # "xdotool", "vnc" or "xtest": how the computers drive their display
+    use_job_store = USE_JOB_STORE  # False: no resume, finished PRs/stages of earlier runs are run again
 
     # detector ##########################################
     detector_model = GPTUtil.GPT5_2
@@ -55,6 +69,19 @@ if __name__ == "__main__":
     # detector_reasoning_level = "low"
     # detector_reasoning_level = "minimal"
     with_detector_response = True
+    overlap_detection = False  # True: detect scenario i while scenario i+1 is being executed
+    early_stop_patience = None  # k: skip the rest of a PR after k scenarios in a row without new bug reports
+    early_stop_min_new_bug_reports = 1
+
+    # budget ##########################################
+    # None: unlimited; once a budget is 80% used, the degraded models below take over
+    pr_max_cost, pr_max_minutes, pr_max_llm_calls = None, None, None
+    batch_max_cost, batch_max_minutes, batch_max_llm_calls = None, None, None
+    degraded_executor_model = ClaudeUtil.CLAUDE_SONNET_4_5
+    degraded_detector_model = GPTUtil.GPT5_MINI
+    degraded_detector_reasoning_level = "low"
+    batch_budget = Budget(max_cost=batch_max_cost, max_minutes=batch_max_minutes, max_llm_calls=batch_max_llm_calls,
+                          name="batch")
 
     # files_filename = "files"
     file_content_filename = "file_contents"
@@ -76,13 +103,53 @@ if __name__ == "__main__":
         bug_report_tool = BugReportTool().to_params()
 
     bugs = sorted(bugs, key=lambda bug: bug.id, reverse=True)
-
-    for bug in bugs[0:]:
+    DockerComputer.backend = computer_backend
+
+    # resumable batch run: finished PRs/stages are skipped when the script is restarted
+    job_store = JobStore(Path(OUTPUT_DIR, reponame, "jobs.sqlite")) if use_job_store else None
+
+    # image GC: the diff images of PRs still to run are protected from eviction
+    image_manager = None
+    pending_images = {}
+    if USE_IMAGE_GC and reponame != APP_NAME_FIREFOX and work_queue is None:
+        image_manager = ImageManager.get_shared()
+        image_manager.sync()
+        for pending_bug in bugs:
+            pending_bug_id = pending_bug.extract_number_from_github_url()
+            if job_store is not None and job_store.is_pr_done(pending_bug_id):
+                continue
+            try:
+                pending_build_info = pending_bug.get_build_info_for_testing(reponame)
+            except Exception as e:
+                print(f"[!] No build info for PR {pending_bug_id}: {e}")
+                continue
+            pending_images[pending_bug_id] = DockerImageBuilder.get_diff_image_name(
+                reponame, pending_build_info[Placeholder.PARENT_COMMIT_ID], pending_build_info[Placeholder.COMMIT_ID])
+        image_manager.set_protected(pending_images.values())
+        print(f"[=] Images: {image_manager.get_report()}")
+
+    prefetcher = None
+    if prefetch_lookahead and work_queue is None:
+        prefetcher = ImagePrefetcher(lookahead=prefetch_lookahead)
+
+    for bug_index, bug in enumerate(bugs[0:]):
         if reponame == APP_NAME_FIREFOX:
             bug_id = bug.id
             input_filepath = Path(DATA_DIR, reponame, test_bugs_foldername, f"{bug.id}")
         else:
             bug_id = bug.extract_number_from_github_url()
+        if job_store is not None and job_store.is_pr_done(bug_id):
+            print(f"[=] PR {bug_id} already done, skip")
+            continue
+        if not batch_budget.can_afford():
+            print(f"[!] Batch budget exhausted, stop before PR {bug_id}: {batch_budget}")
+            break
+        scheduler = ScenarioScheduler(pr_budget=Budget(max_cost=pr_max_cost, max_minutes=pr_max_minutes,
+                                                       max_llm_calls=pr_max_llm_calls, name=f"PR {bug_id}"),
+                                      batch_budget=batch_budget,
+                                      degraded_executor_model=degraded_executor_model,
+                                      degraded_detector_model=degraded_detector_model,
+                                      degraded_detector_reasoning_level=degraded_detector_reasoning_level)
         input_filepath = Path(DATA_DIR, reponame, test_bugs_foldername, f"{bug_id}")
 
         if with_file_content:
@@ -109,15 +176,34 @@ if __name__ == "__main__":
         if with_cochange_file_content:
             foldername += f"_{Placeholder.COCHANGE_FILE_CONTENT}"
 
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        foldername = foldername + f"_{timestamp}"
-
-        output_filepath = Path(OUTPUT_DIR, reponame, f"{bug_id}", foldername)
+        output_filepath = job_store.get_pr_output_path(bug_id) if job_store is not None else None
+        if output_filepath is None:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            foldername = foldername + f"_{timestamp}"
+            output_filepath = Path(OUTPUT_DIR, reponame, f"{bug_id}", foldername)
+            if job_store is not None:
+                job_store.register_pr(bug_id, output_filepath)
         # Check if the folder exists
         if not os.path.exists(output_filepath):
             # If it doesn't exist, create itv
             os.makedirs(output_filepath)
 
+        if prefetcher is not None:
+            # firefox: the current PR's builds too, its containers start right away and all launch the same builds
+            next_bugs = bugs[bug_index:] if reponame == APP_NAME_FIREFOX else bugs[bug_index + 1:]
+            next_build_infos = []
+            for next_bug in next_bugs:
+                if len(next_build_infos) >= prefetch_lookahead:
+                    break
+                next_bug_id = next_bug.id if reponame == APP_NAME_FIREFOX else next_bug.extract_number_from_github_url()
+                if next_bug_id != bug_id and job_store is not None and job_store.is_pr_done(next_bug_id):
+                    continue
+                try:
+                    next_build_infos.append(next_bug.get_build_info_for_testing(reponame))
+                except Exception as e:
+                    print(f"[!] No build info to prefetch for {next_bug_id}: {e}")
+            prefetcher.prefetch(next_build_infos)
+
         App.pipeline(bug, with_change_desc, with_change_intent, with_file_content, with_relevant_scenarios, generator_model,
                      with_path_enhancement, with_path_file_search, with_data_enhancement,
                      executor_model, instruction_reuse_tool_model,
@@ -128,7 +214,33 @@ if __name__ == "__main__":
                      use_extracted_executor_memory=use_extracted_executor_memory,
                      include_executor_history_image=include_executor_history_image,
                      with_detector_response=with_detector_response,
-                     detector_reasoning_level=detector_reasoning_level)
+                     detector_reasoning_level=detector_reasoning_level,
+                     max_parallel_scenarios=max_parallel_scenarios,
+                     overlap_detection=overlap_detection,
+                     lockstep=lockstep,
+                     job_store=job_store, pr_id=bug_id,
+                     work_queue=work_queue,
+                     scheduler=scheduler,
+                     early_stop_patience=early_stop_patience,
+                     early_stop_min_new_bug_reports=early_stop_min_new_bug_reports,
+                     warm_pool_size=warm_pool_size,
+                     fast_reset=fast_reset)
+
+        # without a job store a PR counts as done once its pipeline returns
+        if image_manager is not None and (job_store is None or job_store.is_pr_done(bug_id)):
+            pending_images.pop(bug_id, None)
+            image_manager.set_protected(pending_images.values())
+
+    if prefetcher is not None:
+        prefetcher.close()
+    if image_manager is not None:
+        print(f"[=] Images: {image_manager.get_report()}")
+    if job_store is not None:
+        total_cost, total_duration_mins = job_store.get_cost_and_duration()
+        print(f"[✓] Batch done, total cost: ${total_cost:.2f}, total duration: {total_duration_mins:.2f} mins")
+        job_store.close()
+    else:
+        print("[✓] Batch done")
 
 
 
@@ -0,0 +1,16 @@
+import socket
+from pathlib import Path
+
+from src.pipelines.worker import Worker
+from config import OUTPUT_DIR, WORK_QUEUE_DIR, MAX_PARALLEL_SCENARIOS
+
+
+if __name__ == "__main__":
+    # run on each host with Docker, next to a coordinator running scripts/app.py with work_queue = WORK_QUEUE_DIR
+    work_queue_dir = WORK_QUEUE_DIR
+    work_dir = Path(OUTPUT_DIR, "worker", socket.gethostname())
+    max_parallel_scenarios = MAX_PARALLEL_SCENARIOS
+    exit_when_empty = False
+
+    worker = Worker(work_queue_dir, work_dir, max_parallel_scenarios=max_parallel_scenarios)
+    worker.run(exit_when_empty=exit_when_empty)
@@ -1,11 +1,20 @@
 import logging
 import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from tqdm import tqdm
+from src.pipelines.coordinator import Coordinator
 from src.pipelines.detector import Detector
+from src.pipelines.early_stopper import EarlyStopper
 from src.pipelines.executor import Executor
 from src.pipelines.generator import Generator
 from src.pipelines.placeholder import Placeholder
+from src.types.docker import DockerComputerPool, WarmComputerPool
+from src.types.job_store import JobStore
+from src.utils.file_util import FileUtil
+from config import DETECTION_QUEUE_SIZE, WARM_POOL_SIZE
 
 
 class App:
@@ -22,7 +31,35 @@ class App:
                  use_instruction_reuse_tool=False,
                  use_extracted_executor_memory=True,
                  include_executor_history_image=False, with_detector_response=True,
-                 detector_reasoning_level='medium'):
+                 detector_reasoning_level='medium',
+                 max_parallel_scenarios=1,
+                 overlap_detection=False, detection_queue_size=DETECTION_QUEUE_SIZE, detector_workers=1,
+                 lockstep=False,
+                 job_store=None, pr_id=None,
+                 work_queue=None,
+                 scheduler=None,
+                 early_stop_patience=None, early_stop_min_new_bug_reports=1,
+                 warm_pool_size=WARM_POOL_SIZE,
+                 fast_reset=False):
+        """
+        max_parallel_scenarios: > 1 -> execute test scenarios at the same time over a DockerComputerPool
+                                of that size (each scenario leases its own container, VNC port and display)
+        overlap_detection: run the detector in background workers fed by a bounded queue,
+                           so the executor moves on to the next scenario while the previous one is being detected
+        lockstep: drive the before- and after-change builds at the same time instead of Play then Replay
+                  (each scenario then occupies two containers)
+        job_store: JobStore; skip the stages (generate/execute/replay/detect) of pr_id that are already done,
+                   and record status, output and cost of the others
+        work_queue: WorkQueue or its folder; hand the test scenarios out to workers on other hosts
+                    (scripts/worker.py) instead of executing them here
+        scheduler: ScenarioScheduler; run the test scenarios by expected value within the PR/batch budgets,
+                   with cheaper models once a budget runs low
+        early_stop_patience: skip the remaining test scenarios once this many consecutive scenarios
+                             bring fewer than early_stop_min_new_bug_reports non-duplicate bug reports
+        warm_pool_size: > 0 -> keep that many containers per version standing by with the app already launched
+        fast_reset: reuse containers across Play/Replay and scenarios of this PR (same build),
+                    resetting only the app and its state folders
+        """
 
         logging.basicConfig(
             level=logging.INFO,
@@ -31,18 +68,37 @@ class App:
 
         # generator ################################################################################################
         logging.info("**Generator**************************************")
-        generator_messages, generator_output = (
-            Generator.generate_test_scenarios(bug,
-                                              with_change_desc=with_change_desc,
-                                              with_change_intent=with_change_intent,
-                                              with_file_content=with_file_content,
-                                              with_relevant_scenarios=with_relevant_scenarios,
-                                              model=generator_model,
-                                              with_path_enhancement=with_path_enhancement,
-                                              with_path_file_search=with_path_file_search,
-                                              with_data_enhancement=with_data_enhancement,
-                                              output_filepath=output_filepath,
-                                              reponame=reponame, ))
+        generator_filepath = Path(output_filepath, f"{Placeholder.SCENARIOS}.json")
+        if (job_store is not None and generator_filepath.exists()
+                and job_store.is_done(pr_id, JobStore.PR_LEVEL_INDEX, JobStore.STAGE_GENERATE)):
+            print(f"[=] Test scenarios already generated, resume from: {generator_filepath}")
+            generator_result = FileUtil.load_json(generator_filepath)
+            generator_messages = generator_result[Placeholder.GENERATOR]
+            generator_output = generator_result[Placeholder.OUTPUT]
+        else:
+            if job_store is not None:
+                job_store.start(pr_id, JobStore.PR_LEVEL_INDEX, JobStore.STAGE_GENERATE)
+            generator_messages, generator_output = (
+                Generator.generate_test_scenarios(bug,
+                                                  with_change_desc=with_change_desc,
+                                                  with_change_intent=with_change_intent,
+                                                  with_file_content=with_file_content,
+                                                  with_relevant_scenarios=with_relevant_scenarios,
+                                                  model=generator_model,
+                                                  with_path_enhancement=with_path_enhancement,
+                                                  with_path_file_search=with_path_file_search,
+                                                  with_data_enhancement=with_data_enhancement,
+                                                  output_filepath=output_filepath,
+                                                  reponame=reponame, ))
+            generation_cost, generation_duration_mins = App.calculate_generation_cost_and_duration(output_filepath)
+            if scheduler is not None:
+                scheduler.charge(cost=generation_cost)
+            if job_store is not None:
+                FileUtil.dump_json(generator_filepath, {Placeholder.GENERATOR: generator_messages,
+                                                        Placeholder.OUTPUT: generator_output})
+                job_store.done(pr_id, JobStore.PR_LEVEL_INDEX, JobStore.STAGE_GENERATE,
+                               output_path=generator_filepath, cost=generation_cost,
+                               duration_mins=generation_duration_mins)
 
         # executor and detector ################################################################################################
         # *********************
@@ -58,28 +114,261 @@ class App:
             code_change_intent += f"{one_content[Placeholder.SUMMARY]}\n"
         change_intent_explanation = generator_messages[2]["content"][Placeholder.CHANGE_INTENT_EXPLANATION]
 
-        for index, test_scenario in tqdm(enumerate(test_scenarios[test_scenario_index:])):
-            index = test_scenario_index + index
-            index_output_filepath = Path(output_filepath, f"{index}")
-            if not os.path.exists(index_output_filepath):
-                # If it doesn't exist, create itv
-                os.makedirs(index_output_filepath)
-            logging.info(f"**Executor for test scenario {index} **************************************")
-            replay_output = Executor.execute_test_scenario(build_info, test_scenario, index_output_filepath,
-                                                           computer_use_tool=computer_use_tool,
-                                                           use_instruction_reuse_tool=use_instruction_reuse_tool,
-                                                           use_extracted_executor_memory=use_extracted_executor_memory,
-                                                           include_executor_history_image=include_executor_history_image,
-                                                           instruction_reuse_tool_model=instruction_reuse_tool_model,
-                                                           executor_model=executor_model,
-                                                           replay_wait_time=replay_wait_time)
-
-            logging.info(f"**Detector for test scenario {index} **************************************")
-            if replay_output is None:
+        executor_kwargs = dict(build_info=build_info,
+                               output_filepath=output_filepath,
+                               computer_use_tool=computer_use_tool,
+                               use_instruction_reuse_tool=use_instruction_reuse_tool,
+                               use_extracted_executor_memory=use_extracted_executor_memory,
+                               include_executor_history_image=include_executor_history_image,
+                               instruction_reuse_tool_model=instruction_reuse_tool_model,
+                               executor_model=executor_model,
+                               replay_wait_time=replay_wait_time,
+                               lockstep=lockstep,
+                               fast_reset=fast_reset)
+        detector_kwargs = dict(code_change_intent=code_change_intent,
+                               change_intent_explanation=change_intent_explanation,
+                               detector_model=detector_model,
+                               bug_report_tool=bug_report_tool,
+                               with_detector_response=with_detector_response,
+                               detector_reasoning_level=detector_reasoning_level)
+
+        if work_queue is not None:
+            Coordinator(work_queue).run_test_scenarios(pr_id, test_scenarios[test_scenario_index:],
+                                                       executor_kwargs, detector_kwargs, job_store=job_store)
+            App.set_pr_done(job_store, pr_id, test_scenarios)
+            return
+
+        # executor -> bounded queue -> detector workers, so the next scenario's GUI execution
+        # overlaps with the current scenario's detection
+        detection_queue = None
+        detector_threads = []
+        if overlap_detection:
+            detection_queue = queue.Queue(maxsize=detection_queue_size)
+            for _ in range(detector_workers):
+                detector_thread = threading.Thread(target=App.run_detector_worker, args=(detection_queue,),
+                                                   daemon=True)
+                detector_thread.start()
+                detector_threads.append(detector_thread)
+
+        if scheduler is not None:
+            indexed_test_scenarios = scheduler.order(test_scenarios)
+        else:
+            indexed_test_scenarios = list(enumerate(test_scenarios))
+        indexed_test_scenarios = [(index, test_scenario) for index, test_scenario in indexed_test_scenarios
+                                  if index >= test_scenario_index]
+
+        early_stopper = None
+        if early_stop_patience:
+            early_stopper = EarlyStopper(patience=early_stop_patience,
+                                         min_new_bug_reports=early_stop_min_new_bug_reports)
+
+        computer_pool = None
+        warm_pool = None
+        if warm_pool_size > 0:
+            warm_pool = WarmComputerPool(size=warm_pool_size * max(max_parallel_scenarios, 1))
+            executor_kwargs["warm_pool"] = warm_pool
+        try:
+            if max_parallel_scenarios <= 1:
+                for index, test_scenario in tqdm(indexed_test_scenarios):
+                    App.run_test_scenario(index, test_scenario, executor_kwargs, detector_kwargs,
+                                          detection_queue=detection_queue,
+                                          job=App.get_scenario_job(job_store, pr_id, index),
+                                          scheduler=scheduler, early_stopper=early_stopper)
+            else:
+                computer_pool = DockerComputerPool(size=max_parallel_scenarios * (2 if lockstep else 1))
+                with ThreadPoolExecutor(max_workers=max_parallel_scenarios) as pool_executor:
+                    futures = {}
+                    for index, test_scenario in indexed_test_scenarios:
+                        future = pool_executor.submit(App.run_test_scenario, index, test_scenario,
+                                                      executor_kwargs, detector_kwargs,
+                                                      computer_pool=computer_pool,
+                                                      detection_queue=detection_queue,
+                                                      job=App.get_scenario_job(job_store, pr_id, index),
+                                                      scheduler=scheduler, early_stopper=early_stopper)
+                        futures[future] = index
+                    for future in tqdm(as_completed(futures), total=len(futures)):
+                        try:
+                            future.result()
+                        except Exception as e:
+                            logging.error(f"Test scenario {futures[future]} failed: {e}")
+        finally:
+            if detection_queue is not None:
+                # one sentinel per worker: drain what is queued, then stop
+                for _ in detector_threads:
+                    detection_queue.put(None)
+                for detector_thread in detector_threads:
+                    detector_thread.join()
+            Executor.release_reusable_computers()
+            if computer_pool is not None:
+                computer_pool.close()
+            if warm_pool is not None:
+                warm_pool.close()
+
+        App.set_pr_done(job_store, pr_id, test_scenarios,
+                        stopped_early=early_stopper is not None and early_stopper.should_stop())
+
+    @staticmethod
+    def set_pr_done(job_store, pr_id, test_scenarios, stopped_early=False):
+        """
+        stopped_early: the skipped test scenarios are not worth a rerun, unlike the ones skipped for budget
+        """
+        if job_store is None:
+            return
+        if stopped_early or all(job_store.is_finished(pr_id, index, JobStore.STAGE_DETECT)
+                                for index in range(len(test_scenarios))):
+            job_store.set_pr_status(pr_id, JobStore.STATUS_DONE)
+
+    @staticmethod
+    def get_scenario_job(job_store, pr_id, index):
+        return job_store.scenario_job(pr_id, index) if job_store is not None else None
+
+    @staticmethod
+    def calculate_generation_cost_and_duration(output_filepath):
+        """
+        generator + path/data enhancer cost and duration, from their message dumps
+        """
+        total_cost = 0
+        total_duration_mins = 0
+        for name in [Placeholder.GENERATOR, Placeholder.PATH_ENHANCER, Placeholder.DATA_ENHANCER]:
+            filepath = Path(output_filepath, f"{name}.json")
+            if not filepath.exists():
                 continue
-            Detector.detect_bugs(code_change_intent=code_change_intent, change_intent_explanation=change_intent_explanation,
-                                 replay_output=replay_output,
-                                 detector_model=detector_model, index_output_filepath=index_output_filepath,
-                                 bug_report_tool=bug_report_tool, with_response=with_detector_response,
-                                 reasoning=detector_reasoning_level)
+            output = FileUtil.load_json(filepath)[2]["content"]
+            total_cost += output[Placeholder.COST][Placeholder.TOTAL_COST]
+            total_duration_mins += output[Placeholder.DURATION_MINS]
+        return total_cost, total_duration_mins
 
+    @staticmethod
+    def run_test_scenario(index, test_scenario, executor_kwargs, detector_kwargs,
+                          computer_pool=None, detection_queue=None, job=None, scheduler=None,
+                          early_stopper=None):
+        """
+        executor + detector for one test scenario, output into output_filepath/index
+        detection_queue: if given, hand the replay output over to the detector workers instead of detecting here
+        job: ScenarioJob; finished stages are skipped
+        scheduler: ScenarioScheduler; checked right before the scenario starts, so parallel scenarios see
+                   the budget spent by the ones before them
+        early_stopper: EarlyStopper; fed with the bug reports of each detection, skip once it says stop
+        """
+        if job is not None and job.is_finished(JobStore.STAGE_DETECT):
+            logging.info(f"**Test scenario {index} already done, skip **************************************")
+            if early_stopper is not None:
+                detector_filepath = job.get_output_path(JobStore.STAGE_DETECT)
+                if detector_filepath is not None and detector_filepath.exists():
+                    early_stopper.record(index, EarlyStopper.load_bug_reports(detector_filepath))
+            return None
+        if early_stopper is not None and early_stopper.should_stop():
+            print(f"[!] Skip test scenario {index}, no new bug reports in the last {early_stopper.patience} scenarios")
+            return None
+        if scheduler is not None:
+            if not scheduler.admit(index):
+                return None
+            executor_kwargs, detector_kwargs = scheduler.adjust(executor_kwargs, detector_kwargs)
+        replayer_filepath = Path(executor_kwargs["output_filepath"], f"{index}", f"{Placeholder.REPLAYER}.json")
+        if job is not None and job.is_done(JobStore.STAGE_REPLAY) and replayer_filepath.exists():
+            index_output_filepath = replayer_filepath.parent
+            replay_output = FileUtil.load_json(replayer_filepath)
+        else:
+            try:
+                index_output_filepath, replay_output = App.execute_test_scenario(index, test_scenario,
+                                                                                 computer_pool=computer_pool,
+                                                                                 job=job,
+                                                                                 **executor_kwargs)
+            except Exception as e:
+                if job is not None:
+                    stage = JobStore.STAGE_REPLAY if job.is_done(JobStore.STAGE_EXECUTE) else JobStore.STAGE_EXECUTE
+                    job.fail(stage, e)
+                raise
+            if scheduler is not None and replay_output is not None:
+                scheduler.record_execution(index, replay_output)
+        if replay_output is None:
+            # the app did not start or the replay failed: nothing to detect on, and nothing a rerun would fix
+            if job is not None:
+                job.skip(JobStore.STAGE_DETECT, "no replay output")
+            return None
+        if detection_queue is not None:
+            # blocks while the detector is detection_queue_size scenarios behind
+            detection_queue.put((index, index_output_filepath, replay_output, job, detector_kwargs, scheduler,
+                                 early_stopper))
+        else:
+            App.detect_bugs(index, index_output_filepath, replay_output, job=job, scheduler=scheduler,
+                            early_stopper=early_stopper, **detector_kwargs)
+        return replay_output
+
+    @staticmethod
+    def execute_test_scenario(index, test_scenario, build_info, output_filepath,
+                              computer_use_tool, use_instruction_reuse_tool, use_extracted_executor_memory,
+                              include_executor_history_image, instruction_reuse_tool_model, executor_model,
+                              replay_wait_time, lockstep=False,
+                              fast_reset=False, computer_pool=None, job=None, warm_pool=None):
+        index_output_filepath = Path(output_filepath, f"{index}")
+        if not os.path.exists(index_output_filepath):
+            # If it doesn't exist, create itv
+            os.makedirs(index_output_filepath, exist_ok=True)
+        logging.info(f"**Executor for test scenario {index} **************************************")
+        replay_output = Executor.execute_test_scenario(build_info, test_scenario, index_output_filepath,
+                                                       computer_use_tool=computer_use_tool,
+                                                       use_instruction_reuse_tool=use_instruction_reuse_tool,
+                                                       use_extracted_executor_memory=use_extracted_executor_memory,
+                                                       include_executor_history_image=include_executor_history_image,
+                                                       instruction_reuse_tool_model=instruction_reuse_tool_model,
+                                                       executor_model=executor_model,
+                                                       replay_wait_time=replay_wait_time,
+                                                       computer_pool=computer_pool,
+                                                       lockstep=lockstep,
+                                                       job=job,
+                                                       warm_pool=warm_pool,
+                                                       fast_reset=fast_reset)
+        return index_output_filepath, replay_output
+
+    @staticmethod
+    def detect_bugs(index, index_output_filepath, replay_output,
+                    code_change_intent, change_intent_explanation,
+                    detector_model, bug_report_tool, with_detector_response, detector_reasoning_level,
+                    job=None, scheduler=None, early_stopper=None):
+        logging.info(f"**Detector for test scenario {index} **************************************")
+        if job is not None:
+            job.start(JobStore.STAGE_DETECT)
+        try:
+            detector_output = Detector.detect_bugs(code_change_intent=code_change_intent,
+                                                   change_intent_explanation=change_intent_explanation,
+                                                   replay_output=replay_output,
+                                                   detector_model=detector_model,
+                                                   index_output_filepath=index_output_filepath,
+                                                   bug_report_tool=bug_report_tool, with_response=with_detector_response,
+                                                   reasoning=detector_reasoning_level)
+        except Exception as e:
+            if job is not None:
+                job.fail(JobStore.STAGE_DETECT, e)
+            raise
+        total_cost, total_duration_mins = Detector.calculate_cost_and_duration_time(detector_output)
+        if scheduler is not None:
+            scheduler.record_detection(index, detector_output, total_cost, total_duration_mins)
+        if early_stopper is not None:
+            early_stopper.record(index, EarlyStopper.get_bug_reports(detector_output))
+        if job is not None:
+            job.done(JobStore.STAGE_DETECT,
+                     output_path=Path(index_output_filepath,
+                                      f'{Placeholder.DETECTOR}_{detector_model[Placeholder.MODEL_NAME]}.json'),
+                     cost=total_cost, duration_mins=total_duration_mins)
+        return detector_output
+
+    @staticmethod
+    def run_detector_worker(detection_queue):
+        """
+        detector stage: take (index, index_output_filepath, replay_output, job, detector_kwargs, scheduler,
+        early_stopper) from the queue until a None sentinel
+        """
+        while True:
+            item = detection_queue.get()
+            try:
+                if item is None:
+                    return
+                index, index_output_filepath, replay_output, job, detector_kwargs, scheduler, early_stopper = item
+                try:
+                    App.detect_bugs(index, index_output_filepath, replay_output, job=job, scheduler=scheduler,
+                                    early_stopper=early_stopper, **detector_kwargs)
+                except Exception as e:
+                    logging.error(f"Detector for test scenario {index} failed: {e}")
+            finally:
+                detection_queue.task_done()
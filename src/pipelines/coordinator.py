@@ -0,0 +1,132 @@
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+
+from src.pipelines.placeholder import Placeholder
+from src.types.job_store import JobStore
+from src.types.work_queue import WorkQueue
+from src.utils.file_util import FileUtil
+from config import WORKER_POLL_INTERVAL, WORKER_LEASE_TIMEOUT
+
+
+class Coordinator:
+    """
+    Multi-host mode, coordinator side: hand the test scenarios of a PR out to the workers (scripts/worker.py)
+    through a WorkQueue, and collect their artifacts into output_filepath/index.
+    """
+
+    def __init__(self, work_queue, poll_interval=WORKER_POLL_INTERVAL, lease_timeout=WORKER_LEASE_TIMEOUT):
+        self.work_queue = work_queue if isinstance(work_queue, WorkQueue) else WorkQueue(work_queue)
+        self.poll_interval = poll_interval
+        self.lease_timeout = lease_timeout
+
+    @staticmethod
+    def get_task_id(pr_id, index):
+        return f"{pr_id}_{index}"
+
+    def run_test_scenarios(self, pr_id, test_scenarios, executor_kwargs, detector_kwargs, job_store=None):
+        """
+        one task per test scenario, block until every task is done or failed
+        executor_kwargs[output_filepath] stays on the coordinator, workers write into their own folder
+        """
+        output_filepath = executor_kwargs["output_filepath"]
+        task_executor_kwargs = {key: value for key, value in executor_kwargs.items() if key != "output_filepath"}
+        task_ids = {}
+        for index, test_scenario in enumerate(test_scenarios):
+            if job_store is not None and job_store.is_finished(pr_id, index, JobStore.STAGE_DETECT):
+                logging.info(f"**Test scenario {index} already done, skip **************************************")
+                continue
+            task_id = self.get_task_id(pr_id, index)
+            self.work_queue.put(task_id, {"pr_id": f"{pr_id}",
+                                          "index": index,
+                                          "test_scenario": test_scenario,
+                                          "executor_kwargs": task_executor_kwargs,
+                                          "detector_kwargs": detector_kwargs})
+            if job_store is not None:
+                job_store.start(pr_id, index, JobStore.STAGE_EXECUTE)
+            task_ids[task_id] = index
+        print(f"[+] Submitted {len(task_ids)} test scenarios of PR {pr_id} to {self.work_queue.root}")
+
+        while task_ids:
+            for task_id, index in list(task_ids.items()):
+                state, result = self.work_queue.get_result(task_id)
+                if state is None:
+                    continue
+                del task_ids[task_id]
+                if state == WorkQueue.DONE:
+                    index_output_filepath = self.collect_artifacts(task_id, output_filepath, index,
+                                                                   result["result"].get("artifacts_path"))
+                    print(f"[✓] Test scenario {index} done by {result['worker_id']}")
+                    if job_store is not None:
+                        job = job_store.scenario_job(pr_id, index)
+                        self.record_jobs(job, index_output_filepath, detector_kwargs["detector_model"])
+                        if result["result"].get("no_replay_output"):
+                            # as App.run_test_scenario does locally
+                            job.skip(JobStore.STAGE_DETECT, "no replay output")
+                else:
+                    error = result["result"]["error"]
+                    print(f"[!] Test scenario {index} failed on {result['worker_id']}: {error}")
+                    if job_store is not None:
+                        job_store.fail(pr_id, index, JobStore.STAGE_EXECUTE, error)
+            if task_ids:
+                for task_id in self.work_queue.requeue_stale(self.lease_timeout):
+                    print(f"[!] Worker lost, requeue: {task_id}")
+                time.sleep(self.poll_interval)
+
+    def collect_artifacts(self, task_id, output_filepath, index, worker_artifacts_path=None):
+        """
+        worker_artifacts_path: the scenario folder on the worker, replayer.json points at the screenshots in it
+        """
+        index_output_filepath = Path(output_filepath, f"{index}")
+        artifacts_path = self.work_queue.get_artifacts_path(task_id)
+        if artifacts_path.exists():
+            shutil.copytree(artifacts_path, index_output_filepath, dirs_exist_ok=True)
+        replayer_filepath = Path(index_output_filepath, f"{Placeholder.REPLAYER}.json")
+        if worker_artifacts_path is not None and replayer_filepath.exists():
+            replay_output = self.rewrite_paths(FileUtil.load_json(replayer_filepath),
+                                               str(worker_artifacts_path), str(index_output_filepath))
+            FileUtil.dump_json(replayer_filepath, replay_output)
+        return index_output_filepath
+
+    @staticmethod
+    def rewrite_paths(data, old_root, new_root):
+        """
+        replace the old_root prefix of every path string nested in data
+        """
+        if isinstance(data, dict):
+            return {key: Coordinator.rewrite_paths(value, old_root, new_root) for key, value in data.items()}
+        if isinstance(data, list):
+            return [Coordinator.rewrite_paths(value, old_root, new_root) for value in data]
+        if isinstance(data, str) and (data == old_root or data.startswith(old_root + os.sep)):
+            return new_root + data[len(old_root):]
+        return data
+
+    @staticmethod
+    def record_jobs(job, index_output_filepath, detector_model):
+        """
+        the worker has no JobStore, so record its stages from the uploaded artifacts
+        """
+        player_filepath = Path(index_output_filepath, f"{Placeholder.PLAYER}.json")
+        replayer_filepath = Path(index_output_filepath, f"{Placeholder.REPLAYER}.json")
+        detector_filepath = Path(index_output_filepath,
+                                 f"{Placeholder.DETECTOR}_{detector_model[Placeholder.MODEL_NAME]}.json")
+        if player_filepath.exists():
+            player_output = FileUtil.load_json(player_filepath)
+            job.done(JobStore.STAGE_EXECUTE, output_path=player_filepath,
+                     cost=player_output[Placeholder.TOTAL_COST],
+                     duration_mins=player_output[Placeholder.DURATION_MINS])
+        if replayer_filepath.exists():
+            replay_output = FileUtil.load_json(replayer_filepath)
+            job.done(JobStore.STAGE_REPLAY, output_path=replayer_filepath, cost=0,
+                     duration_mins=replay_output[f"{Placeholder.DURATION_MINS}_BEFORE_CHANGE"])
+        if detector_filepath.exists():
+            # detector_*.json holds inputs and outputs, the totals are on the last output
+            detector_input_output = FileUtil.load_json(detector_filepath)
+            total_cost, total_duration_mins = 0, 0
+            if detector_input_output:
+                total_cost = detector_input_output[-1][Placeholder.TOTAL_COST]
+                total_duration_mins = detector_input_output[-1][Placeholder.TOTAL_DURATION_MINS]
+            job.done(JobStore.STAGE_DETECT, output_path=detector_filepath, cost=total_cost,
+                     duration_mins=total_duration_mins)
@@ -389,6 +389,7 @@ class Detector:
         #                    detector_input_output)
 
         Detector.create_pdf(replay_output, detector_output, index_output_filepath)
+        return detector_output
 
     @staticmethod
     def calculate_cost_and_duration_time(detector_output):
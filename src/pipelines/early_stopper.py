@@ -0,0 +1,73 @@
+import threading
+from difflib import SequenceMatcher
+
+from src.utils.file_util import FileUtil
+
+
+class EarlyStopper:
+    """
+    Adaptive early stopping over the test scenarios of one PR.
+    After each detection, count the bug reports whose summary is not a near-duplicate of an earlier one;
+    once patience consecutive scenarios bring fewer than min_new_bug_reports, the remaining scenarios are skipped.
+    """
+
+    def __init__(self, patience=2, min_new_bug_reports=1, duplicate_similarity=0.8):
+        self.patience = patience
+        self.min_new_bug_reports = min_new_bug_reports
+        self.duplicate_similarity = duplicate_similarity
+        # executor and detector threads share the stopper
+        self.lock = threading.Lock()
+        self.seen_summaries = []
+        self.low_yield_count = 0
+        self.new_bug_report_counts = {}
+
+    @staticmethod
+    def normalize(summary):
+        return " ".join(summary.lower().split())
+
+    def is_duplicate(self, summary):
+        summary = self.normalize(summary)
+        for seen_summary in self.seen_summaries:
+            if SequenceMatcher(None, summary, seen_summary).ratio() >= self.duplicate_similarity:
+                return True
+        return False
+
+    @staticmethod
+    def get_bug_reports(detector_output):
+        bug_reports = []
+        for one_output in detector_output or []:
+            if one_output:
+                bug_reports.extend(one_output.get("bug_reports", []))
+        return bug_reports
+
+    @staticmethod
+    def load_bug_reports(detector_filepath):
+        """
+        bug reports from a detector_*.json, where inputs and outputs alternate (outputs at odd positions)
+        """
+        detector_input_output = FileUtil.load_json(detector_filepath)
+        return EarlyStopper.get_bug_reports(
+            [one_output for index, one_output in enumerate(detector_input_output) if index % 2 == 1])
+
+    def record(self, index, bug_reports):
+        """
+        marginal yield of test scenario index: how many of its bug reports are new
+        """
+        with self.lock:
+            new_count = 0
+            for bug_report in bug_reports:
+                if not self.is_duplicate(bug_report["summary"]):
+                    self.seen_summaries.append(self.normalize(bug_report["summary"]))
+                    new_count += 1
+            self.new_bug_report_counts[index] = new_count
+            if new_count < self.min_new_bug_reports:
+                self.low_yield_count += 1
+            else:
+                self.low_yield_count = 0
+        print(f"[=] Test scenario {index}: {new_count}/{len(bug_reports)} new bug reports, "
+              f"low-yield streak {self.low_yield_count}/{self.patience}")
+        return new_count
+
+    def should_stop(self):
+        with self.lock:
+            return self.patience is not None and self.low_yield_count >= self.patience
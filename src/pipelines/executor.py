@@ -2,6 +2,9 @@ import copy
 import json
 import logging
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from fpdf import FPDF
@@ -9,7 +12,9 @@ from fpdf import FPDF
 from src.pipelines.detector import Detector
 from src.pipelines.instruction_use_tool import InstructionReuseTool
 from src.pipelines.placeholder import Placeholder
-from src.types.docker import DockerImageBuilder, DockerComputer
+from src.types.docker import DockerImageBuilder, DockerComputer, DockerComputerSlot
+from src.types.job_store import JobStore
+from src.types.settle_profile import SettleProfile
 from src.utils.decorators import timing
 from src.utils.file_util import FileUtil
 from src.utils.gpt_util import GPTUtil
@@ -22,7 +27,7 @@ from src.utils.claude_util import ClaudeUtil
 from pydantic import BaseModel, Field
 
 from src.utils.llm_util import LLMUtil
-from config import OUTPUT_DIR, PROMPT_DIR, MAX_EXECUTION_COUNT, APP_NAME_FIREFOX, MAX_UI_INSTRUCTION_COUNT
+from config import OUTPUT_DIR, PROMPT_DIR, MAX_EXECUTION_COUNT, APP_NAME_FIREFOX, MAX_UI_INSTRUCTION_COUNT, DOCKER_COMPUTER_NAME
 
 ActionType = Literal[
     "click", "right_click", "long_click", "double_click", "triple_click",
@@ -104,6 +109,7 @@ class ComputerUseTool:
         element_input   -> string to type (if action == 'type')
         scroll_direction-> e.g. 'up' or 'down' (if action == 'scroll')
         """
+        start_time = time.time()
         if element_coord:
             x = element_coord[0]
             y = element_coord[1]
@@ -133,8 +139,8 @@ class ComputerUseTool:
         elif action == "type" or action == "input":
             if element_coord:
                 computer.move(x, y)
-            # Type the given input text
-            computer.type(element_input)
+            # Type the given input text, long ones pasted where the app allows it
+            computer.enter_text(element_input, app=app)
 
         elif action == "scroll":
             """
@@ -202,32 +208,136 @@ class ComputerUseTool:
         else:
             print(f"Unknown action: {action}")
 
+        if action != "wait":
+            # input latency of the computer's backend, settling is reported separately
+            computer.record_action(action, (time.time() - start_time) * 1000)
+        # the next settle learns how long this kind of action takes on this app and build
+        computer.set_settle_context(app, commit_id, SettleProfile.get_action_kind(action, keys))
+
 
 class Executor:
     def __init__(self):
         pass
 
+    # scenarios running in parallel must not build the same image twice
+    image_lock = threading.Lock()
+    # fast reset: (container name, display) -> DockerComputer kept alive between Play, Replay and the next scenarios
+    reusable_computers = {}
+
     @staticmethod
-    def setup_docker_computer(build_info):
-        # setup docker computer #########################################
+    def ensure_image(build_info):
+        """
+        return the image to run for build_info, building the base/diff image if missing
+        """
         reponame = build_info[Placeholder.SOFTWARE_NAME]
-        if reponame == APP_NAME_FIREFOX:
-            base_image = f"{reponame.lower()}:{DockerImageBuilder.BASE_ENV_TAG}"
-            if not DockerImageBuilder.docker_image_exists(base_image):
-                print(f"[!] Base image missing, building: {base_image}")
-                base_image = DockerImageBuilder.build_base_image(reponame=reponame)
-            image_name = base_image
+        with Executor.image_lock:
+            if reponame == APP_NAME_FIREFOX:
+                base_image = f"{reponame.lower()}:{DockerImageBuilder.BASE_ENV_TAG}"
+                if not DockerImageBuilder.docker_image_exists(base_image):
+                    print(f"[!] Base image missing, building: {base_image}")
+                    base_image = DockerImageBuilder.build_base_image(reponame=reponame)
+                image_name = base_image
+            else:
+                diff_image = DockerImageBuilder.ensure_diff_image(
+                    reponame=reponame,
+                    before_commit=build_info[Placeholder.PARENT_COMMIT_ID],
+                    after_commit=build_info[Placeholder.COMMIT_ID],
+                )
+                image_name = diff_image
+        return image_name
+
+    @staticmethod
+    def setup_docker_computer(build_info, slot=None, image_name=None, warm_pool=None, before_change=False,
+                              fast_reset=False):
+        """
+        slot: DockerComputerSlot (container name, VNC port, display) leased from a DockerComputerPool;
+              None -> the single default container on port 5900
+        warm_pool: WarmComputerPool; take a container whose app (before- or after-change version) is already
+                   launched, fall back to a cold start if none is ready
+        fast_reset: reuse the slot's container if it runs the same image (same build), only killing the app
+                    and restoring its state folders, instead of `docker run` + GUI probing
+        """
+        # setup docker computer #########################################
+        if image_name is None:
+            image_name = Executor.ensure_image(build_info)
+        if warm_pool is not None:
+            commit_id = build_info[Placeholder.PARENT_COMMIT_ID] if before_change else build_info[Placeholder.COMMIT_ID]
+            computer = warm_pool.take(image_name, commit_id)
+            if computer is not None:
+                DockerComputer.open_vnc_gui(port=warm_pool.slots[computer.container_name].vnc_port)
+                return computer
+        app = build_info[Placeholder.SOFTWARE_NAME]
+        if fast_reset:
+            # several slots can share a container (one display each)
+            slot_key = (slot.container_name, slot.display) if slot is not None else (DOCKER_COMPUTER_NAME, ":99")
+            computer = Executor.reusable_computers.get(slot_key)
+            if computer is not None and computer.image == image_name and computer.is_running():
+                computer.reset_app_state(app)
+                return computer
+        if slot is None:
+            computer = DockerComputer.get_class().run_from_image(image=image_name)
+            DockerComputer.open_vnc_gui()
         else:
-            diff_image = DockerImageBuilder.ensure_diff_image(
-                reponame=reponame,
-                before_commit=build_info[Placeholder.PARENT_COMMIT_ID],
-                after_commit=build_info[Placeholder.COMMIT_ID],
-            )
-            image_name = diff_image
-        computer = DockerComputer.run_from_image(image=image_name)
-        DockerComputer.open_vnc_gui()
+            computer = slot.run_from_image(image_name)
+            DockerComputer.open_vnc_gui(port=slot.vnc_port)
+        if fast_reset:
+            computer.snapshot_app_state(app)
+            Executor.reusable_computers[(computer.container_name, computer.display)] = computer
         return computer
 
+    @staticmethod
+    def prewarm(build_info, warm_pool, image_name=None):
+        """
+        let the warm pool stand by with both versions of build_info
+        """
+        if image_name is None:
+            image_name = Executor.ensure_image(build_info)
+        warm_pool.prewarm(image_name,
+                          [(build_info[Placeholder.COMMIT_ID], build_info[Placeholder.BUILD_ID_FIRST_WITH]),
+                           (build_info[Placeholder.PARENT_COMMIT_ID], build_info[Placeholder.BUILD_ID_LAST_WITHOUT])],
+                          app=build_info[Placeholder.SOFTWARE_NAME])
+
+    @staticmethod
+    def release_docker_computer(computer, warm_pool=None):
+        """
+        a warm container is not reused after a scenario, its app state is dirty
+        """
+        if warm_pool is not None and warm_pool.owns(computer):
+            warm_pool.discard(computer)
+
+    @staticmethod
+    def release_reusable_computers():
+        """
+        stop the containers kept alive for fast reset, at the end of a PR (the next one runs another image)
+        """
+        reusable_computers = list(Executor.reusable_computers.values())
+        Executor.reusable_computers.clear()
+        for computer in reusable_computers:
+            computer.close_agent()
+        # several displays can share a container
+        for container_name in {computer.container_name for computer in reusable_computers}:
+            DockerComputer.stop_and_remove(container_name)
+
+    @staticmethod
+    def start_version(computer, build_info, before_change=False):
+        """
+        launch the before- or after-change version on computer, unless it is already running there
+        """
+        if before_change:
+            commit_id = build_info[Placeholder.PARENT_COMMIT_ID]
+            build_id = build_info[Placeholder.BUILD_ID_LAST_WITHOUT]
+        else:
+            commit_id = build_info[Placeholder.COMMIT_ID]
+            build_id = build_info[Placeholder.BUILD_ID_FIRST_WITH]
+        if computer.running_commit_id == commit_id:
+            print(f"[=] {build_info[Placeholder.SOFTWARE_NAME]} {commit_id} already running on {computer.container_name}")
+            return True
+        is_version_started = computer.run_single_build(commit_id=commit_id, build_id=build_id,
+                                                       app=build_info[Placeholder.SOFTWARE_NAME])
+        if is_version_started:
+            computer.running_commit_id = commit_id
+        return is_version_started
+
     @staticmethod
     def execute_test_scenario(build_info, test_scenario, index_output_filepath,
                               computer_use_tool=None, use_instruction_reuse_tool=False,
@@ -235,51 +345,146 @@ class Executor:
                               include_executor_history_image=False,
                               instruction_reuse_tool_model=GPTUtil.GPT5_2,
                               executor_model=ClaudeUtil.CLAUDE_SONNET_4_5,
-                              replay_wait_time=3000):
+                              replay_wait_time=3000,
+                              computer_pool=None, slot=None,
+                              lockstep=False, mirror_slot=None,
+                              job=None, warm_pool=None, fast_reset=False):
         """
         include Play + Replay
+        computer_pool: DockerComputerPool; if given, lease a slot for the whole scenario (Play + Replay)
+                       so that several scenarios can be executed at the same time
+        lockstep: launch the before- and after-change builds at the same time in two containers
+                  (slot, mirror_slot) and apply every UI instruction to both, so the before/after
+                  screenshot pairs are captured in a single pass without a separate Replay
+        job: ScenarioJob; records execute/replay in the JobStore and resumes from player.json if Play is done
+        warm_pool: WarmComputerPool; Play and Replay start from containers with the app already launched
+        fast_reset: keep the container between Play, Replay and the next scenario of the same build,
+                    resetting only the app state (see setup_docker_computer)
         """
+        if computer_pool is not None:
+            with computer_pool.lease(count=2 if lockstep else 1) as leased:
+                if lockstep:
+                    slot, mirror_slot = leased
+                else:
+                    slot = leased
+                return Executor.execute_test_scenario(build_info, test_scenario, index_output_filepath,
+                                                      computer_use_tool=computer_use_tool,
+                                                      use_instruction_reuse_tool=use_instruction_reuse_tool,
+                                                      use_extracted_executor_memory=use_extracted_executor_memory,
+                                                      include_executor_history_image=include_executor_history_image,
+                                                      instruction_reuse_tool_model=instruction_reuse_tool_model,
+                                                      executor_model=executor_model,
+                                                      replay_wait_time=replay_wait_time,
+                                                      slot=slot, lockstep=lockstep, mirror_slot=mirror_slot,
+                                                      job=job, warm_pool=warm_pool, fast_reset=fast_reset)
         if computer_use_tool is None:
             computer_use_tool = ComputerUseTool().to_params()
 
-        computer = Executor.setup_docker_computer(build_info)
         # index_output_filepath = Path(output_filepath, f"{index}")
         index_output_filepath = Path(index_output_filepath)
         if not os.path.exists(index_output_filepath):
             os.makedirs(index_output_filepath)
-        execution_memory_for_reuse = None
-        if use_instruction_reuse_tool:
-            index = int(index_output_filepath.name) if index_output_filepath.name.isdigit() else None
-            prev_path = index_output_filepath.parent / str(index - 1) if index and index > 0 else None
-            if prev_path:
-                last_player_output = FileUtil.load_json(Path(prev_path, f"{Placeholder.PLAYER}.json"))
-                execution_memory_for_reuse = Executor.extract_execution_memory_from_player_output(last_player_output)
-
-        (player_output, messages), duration_mins_after_change = Executor.execute_after_code_change_version(build_info, test_scenario, computer, computer_use_tool,
-                                                                                                           execution_memory_for_reuse=execution_memory_for_reuse,
-                                                                                                           use_extracted_executor_memory=use_extracted_executor_memory,
-                                                                                                           include_executor_history_image=include_executor_history_image,
-                                                                                                           instruction_reuse_tool_model=instruction_reuse_tool_model,
-                                                                                                           executor_model=executor_model)
-        if player_output is None and messages is None:
-            return None
-        player_output[f"{Placeholder.DURATION_MINS}"] = duration_mins_after_change
-        total_cost = Executor.calculate_total_cost(player_output)
-        player_output[Placeholder.TOTAL_COST] = total_cost
-        FileUtil.dump_json(Path(index_output_filepath, f"{Placeholder.PLAYER}.json"), player_output)
+        player_filepath = Path(index_output_filepath, f"{Placeholder.PLAYER}.json")
+        # Play checkpoint, removed once player.json is written
+        checkpoint_filepath = Path(index_output_filepath, f"{Placeholder.PLAYER}_checkpoint.jsonl")
+        if warm_pool is not None:
+            Executor.prewarm(build_info, warm_pool)
+
+        if job is not None and job.is_done(JobStore.STAGE_EXECUTE) and player_filepath.exists():
+            # resume: Play is already paid for, go straight to Replay
+            print(f"[=] Play already done, resume from: {player_filepath}")
+            player_output = FileUtil.load_json(player_filepath)
+            duration_mins_after_change = player_output[Placeholder.DURATION_MINS]
+            total_cost = player_output[Placeholder.TOTAL_COST]
+            # before-change screenshots are not kept in player.json, so they need a real Replay
+            lockstep = False
+        else:
+            if job is not None:
+                job.start(JobStore.STAGE_EXECUTE)
+            mirror_computer = None
+            if lockstep:
+                slot = slot or DockerComputerSlot(0)
+                mirror_slot = mirror_slot or DockerComputerSlot(slot.index + 1)
+                image_name = Executor.ensure_image(build_info)
+                with ThreadPoolExecutor(max_workers=2) as setup_executor:
+                    computer_future = setup_executor.submit(Executor.setup_docker_computer, build_info, slot, image_name,
+                                                            warm_pool, False, fast_reset)
+                    mirror_computer_future = setup_executor.submit(Executor.setup_docker_computer, build_info, mirror_slot,
+                                                                   image_name, warm_pool, True, fast_reset)
+                    computer = computer_future.result()
+                    mirror_computer = mirror_computer_future.result()
+            else:
+                computer = Executor.setup_docker_computer(build_info, slot=slot, warm_pool=warm_pool,
+                                                          fast_reset=fast_reset)
+            execution_memory_for_reuse = None
+            if use_instruction_reuse_tool:
+                index = int(index_output_filepath.name) if index_output_filepath.name.isdigit() else None
+                prev_path = index_output_filepath.parent / str(index - 1) if index and index > 0 else None
+                # with a computer pool the previous scenario may still be running
+                if prev_path and Path(prev_path, f"{Placeholder.PLAYER}.json").exists():
+                    last_player_output = FileUtil.load_json(Path(prev_path, f"{Placeholder.PLAYER}.json"))
+                    execution_memory_for_reuse = Executor.extract_execution_memory_from_player_output(last_player_output)
+
+            (player_output, messages), duration_mins_after_change = Executor.execute_after_code_change_version(build_info, test_scenario, computer, computer_use_tool,
+                                                                                                               execution_memory_for_reuse=execution_memory_for_reuse,
+                                                                                                               use_extracted_executor_memory=use_extracted_executor_memory,
+                                                                                                               include_executor_history_image=include_executor_history_image,
+                                                                                                               instruction_reuse_tool_model=instruction_reuse_tool_model,
+                                                                                                               executor_model=executor_model,
+                                                                                                               mirror_computer=mirror_computer,
+                                                                                                               checkpoint_filepath=checkpoint_filepath)
+            settle_report = computer.pop_settle_report()
+            action_latency_report = computer.pop_action_report()
+            if mirror_computer is not None:
+                mirror_computer.pop_settle_report()
+                mirror_computer.pop_action_report()
+            Executor.release_docker_computer(computer, warm_pool)
+            Executor.release_docker_computer(mirror_computer, warm_pool)
+            if player_output is None and messages is None:
+                if job is not None:
+                    job.fail(JobStore.STAGE_EXECUTE, "after-change version failed to start")
+                return None
+            if lockstep and not Executor.has_before_change_screenshots(player_output):
+                # the mirror did not start: sequential Replay on the parent build
+                lockstep = False
+            player_output[f"{Placeholder.DURATION_MINS}"] = duration_mins_after_change
+            player_output[f"{Placeholder.SETTLE_REPORT}_AFTER_CHANGE"] = settle_report
+            player_output[f"{Placeholder.ACTION_LATENCY_REPORT}_AFTER_CHANGE"] = action_latency_report
+            total_cost = Executor.calculate_total_cost(player_output)
+            player_output[Placeholder.TOTAL_COST] = total_cost
+            FileUtil.dump_json(player_filepath,
+                               Executor.get_player_output_without_before_change_screenshots(player_output))
+            checkpoint_filepath.unlink(missing_ok=True)
+            if job is not None:
+                job.done(JobStore.STAGE_EXECUTE, output_path=player_filepath, cost=total_cost,
+                         duration_mins=duration_mins_after_change)
 
         # Replayer ################################################################################################
-        computer = Executor.setup_docker_computer(build_info)
-        replay_output, duration_mins_before_change = Executor.execute_before_code_change_version(build_info, player_output, computer, wait_time=replay_wait_time)
+        if job is not None:
+            job.start(JobStore.STAGE_REPLAY)
+        if lockstep:
+            # before-change screenshots were already captured side by side during Play
+            replay_output, duration_mins_before_change = player_output, 0.0
+            replay_output[Placeholder.LOCKSTEP] = True
+        else:
+            computer = Executor.setup_docker_computer(build_info, slot=slot, warm_pool=warm_pool, before_change=True,
+                                                      fast_reset=fast_reset)
+            replay_output, duration_mins_before_change = Executor.execute_before_code_change_version(build_info, player_output, computer, wait_time=replay_wait_time)
+            replay_output[f"{Placeholder.SETTLE_REPORT}_BEFORE_CHANGE"] = computer.pop_settle_report()
+            replay_output[f"{Placeholder.ACTION_LATENCY_REPORT}_BEFORE_CHANGE"] = computer.pop_action_report()
+            Executor.release_docker_computer(computer, warm_pool)
         replay_output[f"{Placeholder.DURATION_MINS}_AFTER_CHANGE"] = duration_mins_after_change
         replay_output[f"{Placeholder.DURATION_MINS}_BEFORE_CHANGE"] = duration_mins_before_change
         if len(replay_output[Placeholder.OUTPUT]) > 1:
             replay_output[Placeholder.OUTPUT][-2][Placeholder.ANSWER][Placeholder.TOTAL_DURATION_MINS] = duration_mins_before_change + duration_mins_after_change
             replay_output[Placeholder.OUTPUT][-2][Placeholder.ANSWER][Placeholder.TOTAL_COST] = total_cost
         replay_output = Replayer.annotate_screenshots_by_pixel(replay_output, index_output_filepath)
-        FileUtil.dump_json(Path(index_output_filepath,
-                                f"{Placeholder.REPLAYER}.json"), replay_output)
+        replayer_filepath = Path(index_output_filepath, f"{Placeholder.REPLAYER}.json")
+        FileUtil.dump_json(replayer_filepath, replay_output)
         Replayer.create_pdf_with_annotated_screenshot(replay_output, index_output_filepath)
+        if job is not None:
+            job.done(JobStore.STAGE_REPLAY, output_path=replayer_filepath, cost=0,
+                     duration_mins=duration_mins_before_change)
         return replay_output
 
     @staticmethod
@@ -295,6 +500,35 @@ class Executor:
             total_cost += play_output[Placeholder.REUSABLE_INSTRUCTIONS][Placeholder.COST][Placeholder.TOTAL_COST]
         return total_cost
 
+    @staticmethod
+    def get_player_output_without_before_change_screenshots(player_output):
+        """
+        player.json keeps the same shape in lockstep mode: before-change screenshots belong to replayer.json
+        """
+        return {
+            **player_output,
+            Placeholder.OUTPUT: [
+                {k: v for k, v in one_output.items() if k != Placeholder.SCREENSHOT_BEFORE_CHANGE}
+                for one_output in player_output[Placeholder.OUTPUT]
+            ]
+        }
+
+    @staticmethod
+    def has_before_change_screenshots(player_output):
+        return all(Placeholder.SCREENSHOT_BEFORE_CHANGE in one_output for one_output in player_output[Placeholder.OUTPUT])
+
+    @staticmethod
+    def start_both_versions(build_info, computer, mirror_computer):
+        """
+        launch the after-change build on computer and the before-change build on mirror_computer at the same time,
+        return (is_after_started, is_before_started)
+        """
+        with ThreadPoolExecutor(max_workers=2) as launch_executor:
+            after_future = launch_executor.submit(Executor.start_version, computer, build_info)
+            before_future = launch_executor.submit(Executor.start_version, mirror_computer, build_info,
+                                                   before_change=True)
+            return after_future.result(), before_future.result()
+
     @staticmethod
     @timing
     def execute_after_code_change_version(build_info, test_scenario, computer, computer_use_tool,
@@ -302,13 +536,27 @@ class Executor:
                                           use_extracted_executor_memory=True,
                                           include_executor_history_image=False,
                                           instruction_reuse_tool_model=GPTUtil.GPT5_2,
-                                          executor_model=ClaudeUtil.CLAUDE_SONNET_4_5):
-        is_version_started= computer.run_single_build(commit_id=build_info[Placeholder.COMMIT_ID],
-                                  build_id=build_info[Placeholder.BUILD_ID_FIRST_WITH],
-                                  app=build_info[Placeholder.SOFTWARE_NAME])
+                                          executor_model=ClaudeUtil.CLAUDE_SONNET_4_5,
+                                          mirror_computer=None,
+                                          checkpoint_filepath=None):
+        """
+        mirror_computer: if given (lockstep), runs the before-change version and receives every UI instruction too
+        checkpoint_filepath: see run_loop
+        """
+        if mirror_computer is not None:
+            is_version_started, is_mirror_started = Executor.start_both_versions(build_info, computer,
+                                                                                 mirror_computer)
+            if is_version_started and not is_mirror_started:
+                # no before-change screenshots rather than empty ones, execute_test_scenario replays afterwards
+                print("[!] Before-change version failed to start, Play without lockstep")
+                mirror_computer = None
+        else:
+            is_version_started = Executor.start_version(computer, build_info)
         if is_version_started:
             reusable_instructions = None
-            if execution_memory_for_reuse:
+            # a resumed run takes the reusable instructions from its checkpoint
+            is_resumed = checkpoint_filepath is not None and Path(checkpoint_filepath).exists()
+            if execution_memory_for_reuse and not is_resumed:
                 test_scenario_without_oracles = {
                     "summary": test_scenario.get("summary"),
                     "steps": [
@@ -322,16 +570,16 @@ class Executor:
             player_output, messages = Executor.run_loop(test_scenario, build_info=build_info, computer=computer, tools=[computer_use_tool],
                                                         model=executor_model, reusable_instructions=reusable_instructions,
                                                         use_extracted_executor_memory=use_extracted_executor_memory,
-                                                        include_executor_history_image=include_executor_history_image)
+                                                        include_executor_history_image=include_executor_history_image,
+                                                        mirror_computer=mirror_computer,
+                                                        checkpoint_filepath=checkpoint_filepath)
             return player_output, messages
         return None, None
 
     @staticmethod
     @timing
     def execute_before_code_change_version(build_info, player_output, computer, wait_time=3000):
-        computer.run_single_build(commit_id=build_info[Placeholder.PARENT_COMMIT_ID],
-                                  build_id=build_info[Placeholder.BUILD_ID_LAST_WITHOUT],
-                                  app=build_info[Placeholder.SOFTWARE_NAME])
+        Executor.start_version(computer, build_info, before_change=True)
         replay_output = Replayer.replay(player_output, computer=computer, wait_time=wait_time,
                                         commit_id=build_info[Placeholder.PARENT_COMMIT_ID],
                                         app=build_info[Placeholder.SOFTWARE_NAME])
@@ -352,22 +600,27 @@ class Executor:
                  use_extracted_executor_memory=True,
                  include_executor_history_image=False,
                  max_ui_instruction_count=MAX_UI_INSTRUCTION_COUNT,
+                 mirror_computer=None,
+                 checkpoint_filepath=None,
                  ):
         """
         run loop -> the whole interactions for the test scenario
+        mirror_computer: before-change version driven in lockstep; its screenshots go into SCREENSHOT_BEFORE_CHANGE
+        checkpoint_filepath: JSONL trace, one line per LLM answer (with the messages it appended) and per executed
+                             UI instruction (with its screenshot);
+                             if it already exists, the recorded instructions are replayed without LLM calls first
         """
         player_output = {
             Placeholder.SCENARIO: input_content,
             # Placeholder.REUSABLE_INSTRUCTIONS: reusable_instructions,
             Placeholder.OUTPUT: []
         }
-        if reusable_instructions:
-            player_output[Placeholder.REUSABLE_INSTRUCTIONS] = reusable_instructions
-            reusable_instructions = reusable_instructions["steps"]
 
         i = 0
         ui_instruction_count = 0
         messages = []
+        # messages already in the checkpoint, each answer record only holds the ones after them
+        checkpoint_message_count = 0
         tool_use_id = None
         # test_scenario only input summary and steps (without oracles) into executor
         input_content_without_oracles = {
@@ -379,20 +632,71 @@ class Executor:
             }
 
         step = input_content_without_oracles
+        base64_image = None
+        # (answer, index of its next UI instruction) left half-done by the crashed run
+        pending_answer = None
+
+        checkpoint = None
+        if checkpoint_filepath is not None and Path(checkpoint_filepath).exists():
+            checkpoint = Executor.load_checkpoint(checkpoint_filepath)
+        if checkpoint and checkpoint[Placeholder.ANSWER]:
+            print(f"[=] Resume Play from checkpoint: {checkpoint_filepath}")
+            reusable_instructions = checkpoint[Placeholder.REUSABLE_INSTRUCTIONS]
+            player_output[Placeholder.OUTPUT] = checkpoint[Placeholder.OUTPUT]
+            ui_instruction_count = len(player_output[Placeholder.OUTPUT])
+            last_answer = checkpoint[Placeholder.ANSWER][-1]
+            messages = checkpoint[Placeholder.CHECKPOINT_MESSAGES]
+            checkpoint_message_count = len(messages)
+            tool_use_id = last_answer[Placeholder.CHECKPOINT_TOOL_USE_ID]
+            i = last_answer[Placeholder.CHECKPOINT_LOOP_INDEX] + 1
+            Executor.replay_checkpoint(player_output[Placeholder.OUTPUT], build_info, computer,
+                                       mirror_computer=mirror_computer, wait_time=wait_time)
+            try:
+                parsed_ans = ComputerUseToolInput.model_validate(last_answer[Placeholder.ANSWER])
+                step = parsed_ans.step
+                if last_answer[Placeholder.CHECKPOINT_DONE_INSTRUCTION_COUNT] < len(parsed_ans.ui_instructions):
+                    pending_answer = (last_answer[Placeholder.ANSWER], last_answer[Placeholder.CHECKPOINT_DONE_INSTRUCTION_COUNT])
+                    i = last_answer[Placeholder.CHECKPOINT_LOOP_INDEX]
+            except Exception as e:
+                logging.warn(f"ComputerUseToolInput.model_validate: {e}")
+            base64_image = computer.wait_and_screenshot(wait_time)
+            if mirror_computer is not None:
+                mirror_base64_image = mirror_computer.wait_and_screenshot(wait_time)
+        elif checkpoint_filepath is not None:
+            Executor.append_checkpoint(checkpoint_filepath, {Placeholder.CHECKPOINT_KIND: Placeholder.CHECKPOINT_START,
+                                                             Placeholder.REUSABLE_INSTRUCTIONS: reusable_instructions})
 
-        while step != '' and i < max_loop_count and ui_instruction_count < max_ui_instruction_count:
-            if i == 0:
-                computer.wait(wait_time)
-                base64_image = computer.screenshot()
-
-            answer, messages, tool_use_id = Executor.run_once(input_content_without_oracles, base64_image,
-                                                              prompt_folder=prompt_folder,
-                                                              system_prompt=system_prompt,
-                                                              tools=tools, model=model,
-                                                              messages=messages, tool_use_id=tool_use_id,
-                                                              reusable_instructions=reusable_instructions,
-                                                              use_extracted_executor_memory=use_extracted_executor_memory,
-                                                              include_executor_history_image=include_executor_history_image)
+        if reusable_instructions:
+            player_output[Placeholder.REUSABLE_INSTRUCTIONS] = reusable_instructions
+            reusable_instructions = reusable_instructions["steps"]
+
+        while (pending_answer is not None or step != '') and i < max_loop_count \
+                and ui_instruction_count < max_ui_instruction_count:
+            if base64_image is None:
+                base64_image = computer.wait_and_screenshot(wait_time)
+                if mirror_computer is not None:
+                    mirror_base64_image = mirror_computer.wait_and_screenshot(wait_time)
+
+            if pending_answer is not None:
+                answer, start_instruction_index = pending_answer
+                pending_answer = None
+            else:
+                answer, messages, tool_use_id = Executor.run_once(input_content_without_oracles, base64_image,
+                                                                  prompt_folder=prompt_folder,
+                                                                  system_prompt=system_prompt,
+                                                                  tools=tools, model=model,
+                                                                  messages=messages, tool_use_id=tool_use_id,
+                                                                  reusable_instructions=reusable_instructions,
+                                                                  use_extracted_executor_memory=use_extracted_executor_memory,
+                                                                  include_executor_history_image=include_executor_history_image)
+                start_instruction_index = 0
+                if checkpoint_filepath is not None:
+                    Executor.append_checkpoint(checkpoint_filepath, {Placeholder.CHECKPOINT_KIND: Placeholder.ANSWER,
+                                                                     Placeholder.CHECKPOINT_LOOP_INDEX: i,
+                                                                     Placeholder.ANSWER: answer,
+                                                                     Placeholder.CHECKPOINT_NEW_MESSAGES: messages[checkpoint_message_count:],
+                                                                     Placeholder.CHECKPOINT_TOOL_USE_ID: tool_use_id})
+                    checkpoint_message_count = len(messages)
             # print(tool_use_id)
             # print(messages)
             try:
@@ -400,13 +704,13 @@ class Executor:
                 cots = parsed_ans.chain_of_thoughts
                 step = parsed_ans.step
                 for instruction_index, instruction in enumerate(parsed_ans.ui_instructions):
+                    if instruction_index < start_instruction_index:
+                        continue
                     ui_instruction_count = ui_instruction_count + 1
                     # element_coord =
                     # if with_image_scale:
                     #     element_coord = ImgUtil.scale_coordinates(element_coord, with_image_scale)
-                    ComputerUseTool.perform_action(instruction.action, instruction.coordinates, instruction.input_text,
-                                            instruction.scroll_direction, instruction.keys, computer,
-                                                   commit_id=build_info[Placeholder.COMMIT_ID], app=build_info[Placeholder.SOFTWARE_NAME])
+                    Executor.perform_ui_instruction(instruction, build_info, computer, mirror_computer=mirror_computer)
                     if instruction_index != 0:
                         cots = ""
                     one_output_pair = {
@@ -419,22 +723,93 @@ class Executor:
                             Placeholder.DURATION_MINS: answer[Placeholder.DURATION_MINS]
                         }
                     }
+                    if mirror_computer is not None:
+                        one_output_pair[Placeholder.SCREENSHOT_BEFORE_CHANGE] = mirror_base64_image
                     player_output[Placeholder.OUTPUT].append(one_output_pair)
-                    computer.wait(wait_time)
-                    base64_image = computer.screenshot()
+                    if checkpoint_filepath is not None:
+                        Executor.append_checkpoint(checkpoint_filepath, {Placeholder.CHECKPOINT_KIND: Placeholder.UI_INSTRUCTION,
+                                                                         Placeholder.OUTPUT: one_output_pair})
+                    base64_image = computer.wait_and_screenshot(wait_time)
+                    if mirror_computer is not None:
+                        mirror_base64_image = mirror_computer.wait_and_screenshot(wait_time)
             except Exception as e:
                 logging.warn(f"ComputerUseToolInput.model_validate: {e}")
                 pass
             # step = answer[Placeholder.STEP]
             i = i + 1
+        if base64_image is None:
+            base64_image = computer.screenshot()
+            if mirror_computer is not None:
+                mirror_base64_image = mirror_computer.screenshot()
         one_output_pair = {
             Placeholder.SCREENSHOT: base64_image,
             Placeholder.ANSWER: None
         }
+        if mirror_computer is not None:
+            one_output_pair[Placeholder.SCREENSHOT_BEFORE_CHANGE] = mirror_base64_image
         player_output[Placeholder.OUTPUT].append(one_output_pair)
 
         return player_output, messages
 
+    @staticmethod
+    def perform_ui_instruction(instruction, build_info, computer, mirror_computer=None):
+        """
+        instruction: UIInstruction, performed on the after-change version (and on the before-change mirror)
+        """
+        ComputerUseTool.perform_action(instruction.action, instruction.coordinates, instruction.input_text,
+                                       instruction.scroll_direction, instruction.keys, computer,
+                                       commit_id=build_info[Placeholder.COMMIT_ID],
+                                       app=build_info[Placeholder.SOFTWARE_NAME])
+        if mirror_computer is not None:
+            ComputerUseTool.perform_action(instruction.action, instruction.coordinates, instruction.input_text,
+                                           instruction.scroll_direction, instruction.keys, mirror_computer,
+                                           commit_id=build_info[Placeholder.PARENT_COMMIT_ID],
+                                           app=build_info[Placeholder.SOFTWARE_NAME])
+
+    @staticmethod
+    def append_checkpoint(checkpoint_filepath, record):
+        # one line per record, flushed right away so a crash loses at most the current instruction
+        with open(checkpoint_filepath, "a") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def load_checkpoint(checkpoint_filepath):
+        """
+        {REUSABLE_INSTRUCTIONS, ANSWER: [answer records + done_instruction_count], OUTPUT: [one_output_pair],
+         messages: the conversation up to the last answer, rebuilt from the new_messages of each answer record}
+        a torn last line (crash while writing) is ignored
+        """
+        checkpoint = {Placeholder.REUSABLE_INSTRUCTIONS: None, Placeholder.ANSWER: [], Placeholder.OUTPUT: [],
+                      Placeholder.CHECKPOINT_MESSAGES: []}
+        with open(checkpoint_filepath, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                if record[Placeholder.CHECKPOINT_KIND] == Placeholder.CHECKPOINT_START:
+                    checkpoint[Placeholder.REUSABLE_INSTRUCTIONS] = record[Placeholder.REUSABLE_INSTRUCTIONS]
+                elif record[Placeholder.CHECKPOINT_KIND] == Placeholder.ANSWER:
+                    checkpoint[Placeholder.CHECKPOINT_MESSAGES].extend(record.pop(Placeholder.CHECKPOINT_NEW_MESSAGES))
+                    record[Placeholder.CHECKPOINT_DONE_INSTRUCTION_COUNT] = 0
+                    checkpoint[Placeholder.ANSWER].append(record)
+                elif record[Placeholder.CHECKPOINT_KIND] == Placeholder.UI_INSTRUCTION and checkpoint[Placeholder.ANSWER]:
+                    checkpoint[Placeholder.ANSWER][-1][Placeholder.CHECKPOINT_DONE_INSTRUCTION_COUNT] += 1
+                    checkpoint[Placeholder.OUTPUT].append(record[Placeholder.OUTPUT])
+        return checkpoint
+
+    @staticmethod
+    def replay_checkpoint(outputs, build_info, computer, mirror_computer=None, wait_time=3000):
+        """
+        bring the freshly launched app back to the checkpoint by performing the recorded UI instructions again
+        """
+        for one_output in outputs:
+            computer.settle(wait_time)
+            instruction = UIInstruction.model_validate(one_output[Placeholder.ANSWER][Placeholder.UI_INSTRUCTION])
+            Executor.perform_ui_instruction(instruction, build_info, computer, mirror_computer=mirror_computer)
+
     @staticmethod
     def run_once(step, base64_image,
                  prompt_folder="executor",
@@ -593,10 +968,11 @@ class Replayer(Executor):
 
     # with (DockerComputer() as computer):
         for one_output in player_output[Placeholder.OUTPUT]:
-            # sleep 3000/1000 seconds
-            computer.wait(wait_time)
-            base64_image = computer.screenshot()
-            one_output[Placeholder.SCREENSHOT_BEFORE_CHANGE] = one_output.get(Placeholder.SCREENSHOT_BEFORE_CHANGE, base64_image)
+            # wait until the UI settles, at most 3000/1000 seconds
+            frame = computer.settle(wait_time)
+            if Placeholder.SCREENSHOT_BEFORE_CHANGE not in one_output:
+                # PNG-encode only the frames that are kept
+                one_output[Placeholder.SCREENSHOT_BEFORE_CHANGE] = frame.to_base64()
             one_output_ans = one_output[Placeholder.ANSWER]
             if one_output_ans:
                 action = one_output_ans[Placeholder.UI_INSTRUCTION][Placeholder.ACTION]
@@ -156,6 +156,16 @@ class Placeholder:
 
     DURATION_MINS = 'DURATION_MINS'
     TOTAL_DURATION_MINS = 'TOTAL_DURATION_MINS'
+    SETTLE_REPORT = 'SETTLE_REPORT'
+    ACTION_LATENCY_REPORT = 'ACTION_LATENCY_REPORT'
+    # Play checkpoint records, see Executor.append_checkpoint
+    CHECKPOINT_KIND = 'kind'
+    CHECKPOINT_START = 'start'
+    CHECKPOINT_LOOP_INDEX = 'loop_index'
+    CHECKPOINT_NEW_MESSAGES = 'new_messages'
+    CHECKPOINT_MESSAGES = 'messages'
+    CHECKPOINT_TOOL_USE_ID = 'tool_use_id'
+    CHECKPOINT_DONE_INSTRUCTION_COUNT = 'done_instruction_count'
 
     SUB_STEP = 'SUB_STEP'
     SUB_STEPS = 'SUB_STEPS'
@@ -169,6 +179,7 @@ class Placeholder:
     PARSED_ = 'PARSED_'
     PARSED_INFO = 'PARSED_INFO'
     SCREENSHOT_BEFORE_CHANGE = 'SCREENSHOT_BEFORE_CHANGE'
+    LOCKSTEP = 'LOCKSTEP'
     SCALE = 'SCALE'
     WITH_NUMS = '_with_nums'
     SCREENSHOT_WITH_NUMS = 'SCREENSHOT_WITH_NUMS'
@@ -0,0 +1,108 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.pipelines.placeholder import Placeholder
+from src.types.docker import DockerImageBuilder
+from src.types.moz_build_cache import MozBuildCache
+from config import APP_NAME_FIREFOX, PREFETCH_LOOKAHEAD, PREFETCH_MAX_CONCURRENT_BUILDS, PREFETCH_BUILD_JOBS, \
+    USE_MOZ_BUILD_CACHE
+
+
+class ImagePrefetcher:
+    """
+    Builds the diff images of the next PRs of a batch in the background, while the current PR is in the
+    executor / detector stages, so the next PR finds its image ready.
+    For Firefox, which runs downloaded builds on the base image, the build archives mozregression will launch
+    are downloaded into the MozBuildCache instead.
+    - at most max_concurrent_builds builds at a time, each capped to build_jobs compiler jobs
+    - DockerImageBuilder's per-image locks make the foreground wait for an in-flight prefetch of its image
+      instead of building it a second time
+    - a failed prefetch is only reported; the foreground builds the image again when it needs it
+    """
+
+    def __init__(self, lookahead=PREFETCH_LOOKAHEAD, max_concurrent_builds=PREFETCH_MAX_CONCURRENT_BUILDS,
+                 build_jobs=PREFETCH_BUILD_JOBS):
+        self.lookahead = lookahead
+        self.build_jobs = build_jobs
+        self.pool = ThreadPoolExecutor(max_workers=max(1, max_concurrent_builds),
+                                       thread_name_prefix="image-prefetch")
+        self.lock = threading.Lock()
+        self.futures = {}
+        self.built_count = 0
+        self.failed_count = 0
+
+    def prefetch(self, build_infos):
+        """
+        queue the images of the first lookahead build_infos (the upcoming PRs, in batch order)
+        """
+        for build_info in build_infos[:self.lookahead]:
+            reponame = build_info[Placeholder.SOFTWARE_NAME]
+            if reponame == APP_NAME_FIREFOX:
+                if USE_MOZ_BUILD_CACHE:
+                    self.prefetch_firefox_builds(build_info)
+                continue
+            image_name = DockerImageBuilder.get_diff_image_name(reponame, build_info[Placeholder.PARENT_COMMIT_ID],
+                                                                build_info[Placeholder.COMMIT_ID])
+            with self.lock:
+                if image_name in self.futures:
+                    continue
+                if DockerImageBuilder.docker_image_exists(image_name):
+                    continue
+                print(f"[+] Prefetch image: {image_name}")
+                self.futures[image_name] = self.pool.submit(self.build, build_info, image_name)
+
+    def prefetch_firefox_builds(self, build_info):
+        base_image = f"{APP_NAME_FIREFOX.lower()}:{DockerImageBuilder.BASE_ENV_TAG}"
+        if not DockerImageBuilder.docker_image_exists(base_image):
+            return
+        # after- and before-change version, each the commit first, then its nightly, as they are launched
+        for revs in [[build_info[Placeholder.COMMIT_ID], build_info[Placeholder.BUILD_ID_FIRST_WITH]],
+                     [build_info[Placeholder.PARENT_COMMIT_ID], build_info[Placeholder.BUILD_ID_LAST_WITHOUT]]]:
+            name = f"{APP_NAME_FIREFOX} build {revs[0]}"
+            with self.lock:
+                if name in self.futures:
+                    continue
+                print(f"[+] Prefetch {name}")
+                self.futures[name] = self.pool.submit(self.download, revs, base_image, name)
+
+    def download(self, revs, image, name):
+        rev = MozBuildCache.get_shared().prefetch(revs, image, APP_NAME_FIREFOX)
+        with self.lock:
+            if rev is None:
+                self.failed_count += 1
+            else:
+                self.built_count += 1
+        if rev is None:
+            print(f"[!] Prefetch of {name} failed, it will be downloaded when needed")
+        else:
+            print(f"[✓] Prefetched {name}: {rev}")
+        return rev
+
+    def build(self, build_info, image_name):
+        start_time = time.time()
+        try:
+            DockerImageBuilder.ensure_diff_image(
+                reponame=build_info[Placeholder.SOFTWARE_NAME],
+                before_commit=build_info[Placeholder.PARENT_COMMIT_ID],
+                after_commit=build_info[Placeholder.COMMIT_ID],
+                build_jobs=self.build_jobs,
+            )
+        except Exception as e:
+            with self.lock:
+                self.failed_count += 1
+            print(f"[!] Prefetch of {image_name} failed, it will be built when needed: {e}")
+            return None
+        with self.lock:
+            self.built_count += 1
+        print(f"[✓] Prefetched image: {image_name} ({(time.time() - start_time) / 60:.1f} mins)")
+        return image_name
+
+    def close(self, wait=False):
+        """
+        wait=False: drop queued prefetches, a build already running still finishes in the docker daemon
+        """
+        self.pool.shutdown(wait=wait, cancel_futures=not wait)
+        with self.lock:
+            print(f"[=] Prefetch: {self.built_count} done, {self.failed_count} failed, "
+                  f"{len(self.futures)} queued in total")
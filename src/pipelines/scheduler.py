@@ -0,0 +1,117 @@
+import logging
+import threading
+
+from src.pipelines.placeholder import Placeholder
+
+
+class ScenarioScheduler:
+    """
+    Budget- and deadline-aware scheduling of the test scenarios of one PR.
+    - order: scenarios with more oracles per step first (more checks for the money)
+    - degrade: once any budget is degrade_ratio used, switch to the cheaper executor/detector settings
+    - stop: skip a scenario when its expected cost (mean of the finished ones) no longer fits a budget
+    """
+
+    def __init__(self, pr_budget=None, batch_budget=None, degrade_ratio=0.8,
+                 degraded_executor_model=None, degraded_detector_model=None, degraded_detector_reasoning_level="low"):
+        self.budgets = [budget for budget in [pr_budget, batch_budget] if budget is not None]
+        self.degrade_ratio = degrade_ratio
+        self.degraded_executor_model = degraded_executor_model
+        self.degraded_detector_model = degraded_detector_model
+        self.degraded_detector_reasoning_level = degraded_detector_reasoning_level
+        self.lock = threading.Lock()
+        # by scenario index: with overlap detection or parallel scenarios, detections finish out of order
+        self.scenario_costs = {}
+        self.scenario_minutes = {}
+        self.scenario_llm_calls = {}
+        self.skipped_indexes = []
+
+    @staticmethod
+    def get_expected_value(test_scenario):
+        steps = test_scenario.get("steps", [])
+        oracle_count = sum(len(step.get("oracles") or []) for step in steps)
+        return (oracle_count + 1) / (len(steps) + 1)
+
+    def order(self, test_scenarios):
+        """
+        [(index, test_scenario)] by expected value, ties keep the generator's order
+        """
+        indexed_test_scenarios = list(enumerate(test_scenarios))
+        return sorted(indexed_test_scenarios, key=lambda item: -self.get_expected_value(item[1]))
+
+    def get_expected_cost(self):
+        with self.lock:
+            if not self.scenario_costs:
+                return 0.0, 0.0, 0
+            count = len(self.scenario_costs)
+            return (sum(self.scenario_costs.values()) / count, sum(self.scenario_minutes.values()) / count,
+                    sum(self.scenario_llm_calls.values()) / count)
+
+    def admit(self, index):
+        """
+        whether test scenario index may still run
+        """
+        cost, minutes, llm_calls = self.get_expected_cost()
+        for budget in self.budgets:
+            if not budget.can_afford(cost=cost, minutes=minutes, llm_calls=llm_calls):
+                print(f"[!] Skip test scenario {index}, {budget}")
+                with self.lock:
+                    self.skipped_indexes.append(index)
+                return False
+        return True
+
+    def is_degraded(self):
+        return any(budget.get_used_ratio() >= self.degrade_ratio for budget in self.budgets)
+
+    def adjust(self, executor_kwargs, detector_kwargs):
+        """
+        executor/detector settings for the next scenario, cheaper ones once the budget runs low
+        """
+        if not self.is_degraded():
+            return executor_kwargs, detector_kwargs
+        logging.info(f"**Budget low, degrade: {self.budgets}")
+        executor_kwargs = dict(executor_kwargs)
+        detector_kwargs = dict(detector_kwargs)
+        if self.degraded_executor_model is not None:
+            executor_kwargs["executor_model"] = self.degraded_executor_model
+        if self.degraded_detector_model is not None:
+            detector_kwargs["detector_model"] = self.degraded_detector_model
+        if self.degraded_detector_reasoning_level is not None:
+            detector_kwargs["detector_reasoning_level"] = self.degraded_detector_reasoning_level
+        return executor_kwargs, detector_kwargs
+
+    def charge(self, cost=0.0, llm_calls=0):
+        for budget in self.budgets:
+            budget.charge(cost=cost, llm_calls=llm_calls)
+
+    def record_execution(self, index, replay_output):
+        cost = replay_output.get(Placeholder.TOTAL_COST, 0)
+        llm_calls = ScenarioScheduler.count_llm_calls(replay_output)
+        minutes = (replay_output.get(f"{Placeholder.DURATION_MINS}_AFTER_CHANGE", 0)
+                   + replay_output.get(f"{Placeholder.DURATION_MINS}_BEFORE_CHANGE", 0))
+        self.charge(cost=cost, llm_calls=llm_calls)
+        with self.lock:
+            self.scenario_costs[index] = self.scenario_costs.get(index, 0.0) + cost
+            self.scenario_minutes[index] = self.scenario_minutes.get(index, 0.0) + minutes
+            self.scenario_llm_calls[index] = self.scenario_llm_calls.get(index, 0) + llm_calls
+
+    def record_detection(self, index, detector_output, cost, duration_mins):
+        self.charge(cost=cost, llm_calls=len(detector_output))
+        with self.lock:
+            self.scenario_costs[index] = self.scenario_costs.get(index, 0.0) + cost
+            self.scenario_minutes[index] = self.scenario_minutes.get(index, 0.0) + duration_mins
+            self.scenario_llm_calls[index] = self.scenario_llm_calls.get(index, 0) + len(detector_output)
+
+    @staticmethod
+    def count_llm_calls(play_output):
+        """
+        same rule as Executor.calculate_total_cost: one call per output with a chain of thoughts
+        """
+        llm_calls = 0
+        for one_output in play_output.get(Placeholder.OUTPUT, []):
+            if one_output and one_output[Placeholder.ANSWER] and one_output[Placeholder.ANSWER][Placeholder.CHAIN_OF_THOUGHTS]:
+                llm_calls += 1
+        if Placeholder.REUSABLE_INSTRUCTIONS in play_output.keys():
+            llm_calls += 1
+        return llm_calls
+
@@ -0,0 +1,98 @@
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from src.pipelines.app import App
+from src.types.docker import DockerComputerPool
+from src.types.work_queue import WorkQueue
+from config import WORKER_POLL_INTERVAL, WORKER_LEASE_TIMEOUT
+
+
+class Worker:
+    """
+    Multi-host mode, worker side: claim test scenarios from a WorkQueue, run executor + detector
+    on local Docker containers, upload the scenario folder back to the queue.
+    """
+
+    def __init__(self, work_queue, work_dir, worker_id=None, max_parallel_scenarios=1,
+                 poll_interval=WORKER_POLL_INTERVAL, lease_timeout=WORKER_LEASE_TIMEOUT):
+        self.work_queue = work_queue if isinstance(work_queue, WorkQueue) else WorkQueue(work_queue)
+        self.work_dir = Path(work_dir)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.max_parallel_scenarios = max_parallel_scenarios
+        self.poll_interval = poll_interval
+        self.lease_timeout = lease_timeout
+        self.stop_event = threading.Event()
+
+    def run(self, exit_when_empty=False):
+        """
+        exit_when_empty: return once the queue has no pending task, instead of waiting for more
+        """
+        computer_pool = None
+        if self.max_parallel_scenarios > 1:
+            # room for lockstep tasks, which lease two containers each
+            computer_pool = DockerComputerPool(size=self.max_parallel_scenarios * 2)
+        print(f"[+] Worker {self.worker_id} polling {self.work_queue.root}")
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_parallel_scenarios) as pool_executor:
+                futures = [pool_executor.submit(self.run_loop, computer_pool, exit_when_empty)
+                           for _ in range(self.max_parallel_scenarios)]
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        # run_task already catches per-task errors, this is a broken queue or pool
+                        logging.error(f"Worker {self.worker_id} loop stopped: {e}")
+        finally:
+            if computer_pool is not None:
+                computer_pool.close()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run_loop(self, computer_pool, exit_when_empty):
+        while not self.stop_event.is_set():
+            task = self.work_queue.claim(self.worker_id)
+            if task is None:
+                if exit_when_empty:
+                    return
+                time.sleep(self.poll_interval)
+                continue
+            self.run_task(task, computer_pool)
+
+    def run_task(self, task, computer_pool=None):
+        payload = task["payload"]
+        index = payload["index"]
+        output_filepath = Path(self.work_dir, payload["pr_id"])
+        executor_kwargs = dict(payload["executor_kwargs"], output_filepath=output_filepath)
+        print(f"[+] Worker {self.worker_id} runs test scenario {index} of PR {payload['pr_id']}")
+
+        # keep the lease alive, a long scenario must not be requeued to another worker
+        heartbeat_stop = threading.Event()
+        heartbeat_thread = threading.Thread(target=self.heartbeat, args=(task["task_id"], heartbeat_stop),
+                                            daemon=True)
+        heartbeat_thread.start()
+        try:
+            replay_output = App.run_test_scenario(index, payload["test_scenario"], executor_kwargs,
+                                                  payload["detector_kwargs"], computer_pool=computer_pool)
+            artifacts_path = Path(output_filepath, f"{index}")
+            # the coordinator rewrites this prefix in the collected json files
+            result = {"index": index, "artifacts_path": str(artifacts_path)}
+            if replay_output is None:
+                # nothing to detect on, and nothing a rerun would fix: the coordinator skips the detect stage
+                result["no_replay_output"] = True
+            self.work_queue.complete(task, result, artifacts_path=artifacts_path)
+        except Exception as e:
+            logging.error(f"Test scenario {index} of PR {payload['pr_id']} failed: {e}")
+            self.work_queue.fail(task, e)
+        finally:
+            heartbeat_stop.set()
+            heartbeat_thread.join()
+
+    def heartbeat(self, task_id, heartbeat_stop):
+        while not heartbeat_stop.wait(self.lease_timeout / 3):
+            self.work_queue.heartbeat(task_id)
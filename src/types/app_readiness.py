@@ -0,0 +1,150 @@
+import json
+import shlex
+
+from config import APP_READINESS_RULES
+
+# Runs inside the container (python3 -, script on stdin).
+# Follows `xprop -root -spy _NET_CLIENT_LIST _NET_ACTIVE_WINDOW`, so it wakes up on window-manager events instead of
+# comparing screenshots; without xprop it polls `wmctrl -lx` (installed in every image) every 0.2s.
+# argv: timeout, wm_class regex, title regex, require_active (0/1), pid_file ("" for none)
+# stdout: one JSON line {"ready", "reason", "window", "elapsed"}, ready None if the window cannot be watched
+READINESS_SCRIPT = r'''
+import json, os, re, select, subprocess, sys, time
+
+timeout, wm_class, title, require_active, pid_file = \
+    float(sys.argv[1]), sys.argv[2], sys.argv[3], sys.argv[4] == "1", sys.argv[5]
+start = time.time()
+spy = None
+
+
+def done(ready, reason, window=None):
+    if spy is not None:
+        spy.kill()
+    print(json.dumps({"ready": ready, "reason": reason, "window": window, "elapsed": round(time.time() - start, 2)}))
+    sys.exit(0)
+
+
+def is_process_alive():
+    if not pid_file:
+        return True
+    try:
+        with open(pid_file) as f:
+            os.kill(int(f.read().strip()), 0)
+    except ProcessLookupError:
+        return False
+    except (OSError, ValueError):
+        # not written yet, or owned by another user
+        return True
+    return True
+
+
+def describe(window_id):
+    out = subprocess.run(["xprop", "-id", window_id, "WM_CLASS", "_NET_WM_NAME", "WM_NAME"],
+                         capture_output=True, text=True).stdout
+    info = {"id": window_id, "wm_class": "", "title": ""}
+    for line in out.splitlines():
+        values = " ".join(re.findall(r'"([^"]*)"', line))
+        if line.startswith("WM_CLASS"):
+            info["wm_class"] = values
+        elif line.startswith("_NET_WM_NAME") or (line.startswith("WM_NAME") and not info["title"]):
+            info["title"] = values
+    return info
+
+
+def list_windows_wmctrl():
+    try:
+        out = subprocess.run(["wmctrl", "-lx"], capture_output=True, text=True).stdout
+    except FileNotFoundError:
+        done(None, "neither xprop nor wmctrl")
+    windows = []
+    for line in out.splitlines():
+        parts = line.split(None, 4)
+        if len(parts) >= 3:
+            windows.append({"id": parts[0], "wm_class": parts[2].replace(".", " "),
+                            "title": parts[4] if len(parts) == 5 else ""})
+    return windows
+
+
+def get_active_xdotool():
+    try:
+        out = subprocess.run(["xdotool", "getactivewindow"], capture_output=True, text=True).stdout.strip()
+    except FileNotFoundError:
+        return None
+    return hex(int(out)) if out.isdigit() else None
+
+
+def matches(info):
+    return bool((wm_class and re.search(wm_class, info["wm_class"], re.I))
+                or (title and re.search(title, info["title"], re.I)))
+
+
+def check(windows, active):
+    for info in windows:
+        if matches(info) and (not require_active or (active is not None and int(info["id"], 16) == int(active, 16))):
+            done(True, "window", info)
+
+
+try:
+    spy = subprocess.Popen(["xprop", "-root", "-spy", "_NET_CLIENT_LIST", "_NET_ACTIVE_WINDOW"],
+                           stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0)
+except FileNotFoundError:
+    spy = None
+clients, active, buffer = [], None, b""
+while True:
+    remaining = timeout - (time.time() - start)
+    if remaining <= 0:
+        done(False, "timeout")
+    if not is_process_alive():
+        done(False, "process exited")
+    if spy is None:
+        check(list_windows_wmctrl(), get_active_xdotool())
+        time.sleep(min(0.2, remaining))
+        continue
+    readable, _, _ = select.select([spy.stdout], [], [], min(0.5, remaining))
+    if readable:
+        data = os.read(spy.stdout.fileno(), 65536)
+        if not data:
+            spy = None
+            continue
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line = line.decode(errors="ignore")
+            window_ids = re.findall(r"0x[0-9a-fA-F]+", line)
+            if line.startswith("_NET_CLIENT_LIST"):
+                clients = window_ids
+            elif line.startswith("_NET_ACTIVE_WINDOW"):
+                active = window_ids[0] if window_ids else None
+    # titles change after a window is mapped, so re-read them on every event and tick
+    check([describe(window_id) for window_id in clients], active)
+'''
+
+
+class AppReadiness:
+    """
+    Declarative readiness rule of an app (see APP_READINESS_RULES): the app is up once a top-level window
+    whose WM_CLASS or title matches exists (and is the active window, if "active"), and not ready if the
+    launched process exits first.
+    """
+
+    @staticmethod
+    def get_rule(app):
+        return APP_READINESS_RULES.get(app)
+
+    @staticmethod
+    def get_command(rule, timeout, pid_file=None):
+        args = [str(timeout), rule.get("wm_class", ""), rule.get("title", ""),
+                "1" if rule.get("active", False) else "0", pid_file or ""]
+        return "python3 - " + " ".join(shlex.quote(arg) for arg in args)
+
+    @staticmethod
+    def parse_result(stdout):
+        """
+        the watcher's JSON line, None if it printed none
+        """
+        for line in reversed(stdout.strip().splitlines()):
+            try:
+                return json.loads(line)
+            except json.JSONDecodeError:
+                continue
+        return None
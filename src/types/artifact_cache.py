@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from config import ARTIFACT_CACHE_DIR, ARTIFACT_CACHE_MAX_BYTES
+
+
+class ArtifactCache:
+    """
+    Content-addressed cache of built app trees, keyed by (repo, commit SHA, build recipe hash), so a commit that was
+    the "before" of one PR and is the "after" of another is compiled once.
+
+    root/<repo>/<sha>-<recipe hash>/<artifact path inside the image>   e.g. .../home/myuser/godot/godot-<sha>
+    root/index.json                                                      sizes, last use, hit/miss counts
+
+    An entry is laid out like the image's filesystem, so it can replace a build stage as a BuildKit named
+    context (`--build-context build-before=<entry>`). Least recently used entries are evicted above max_bytes.
+    """
+
+    INDEX_FILENAME = "index.json"
+
+    shared_caches = {}
+    shared_caches_lock = threading.Lock()
+
+    def __init__(self, root=ARTIFACT_CACHE_DIR, max_bytes=ARTIFACT_CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index = {"entries": {}, "hits": 0, "misses": 0}
+        index_filepath = Path(self.root, self.INDEX_FILENAME)
+        if index_filepath.exists():
+            try:
+                with open(index_filepath, "r") as f:
+                    self.index = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"[!] Ignore unreadable artifact cache index {index_filepath}: {e}")
+
+    @staticmethod
+    def get_shared(root=ARTIFACT_CACHE_DIR):
+        with ArtifactCache.shared_caches_lock:
+            key = str(root)
+            if key not in ArtifactCache.shared_caches:
+                ArtifactCache.shared_caches[key] = ArtifactCache(root)
+            return ArtifactCache.shared_caches[key]
+
+    @staticmethod
+    def get_recipe_hash(dockerfile, base_image_id=""):
+        """
+        what a build of one commit depends on besides the commit: the Dockerfile and the base image it starts from
+        """
+        digest = hashlib.sha256()
+        digest.update(Path(dockerfile).read_bytes())
+        digest.update(base_image_id.encode("utf-8"))
+        return digest.hexdigest()[:12]
+
+    @staticmethod
+    def get_key(repo, commit_id, recipe_hash):
+        return f"{repo.lower()}/{commit_id}-{recipe_hash}"
+
+    def _save_index(self):
+        index_filepath = Path(self.root, self.INDEX_FILENAME)
+        tmp_filepath = index_filepath.with_name(f".{index_filepath.name}.{os.getpid()}.tmp")
+        with open(tmp_filepath, "w") as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(tmp_filepath, index_filepath)
+
+    def lookup(self, repo, commit_id, recipe_hash):
+        """
+        entry folder of the cached build, None on a miss
+        """
+        key = self.get_key(repo, commit_id, recipe_hash)
+        with self.lock:
+            entry = self.index["entries"].get(key)
+            if entry is not None and not Path(self.root, key).exists():
+                # removed behind our back
+                del self.index["entries"][key]
+                entry = None
+            if entry is None:
+                self.index["misses"] += 1
+                self._save_index()
+                print(f"[=] Artifact cache miss: {key}")
+                return None
+            entry["last_used"] = time.time()
+            entry["hits"] = entry.get("hits", 0) + 1
+            self.index["hits"] += 1
+            self._save_index()
+        print(f"[✓] Artifact cache hit: {key}")
+        return Path(self.root, key)
+
+    def store_from_image(self, image_name, repo, commit_id, recipe_hash, artifact_path):
+        """
+        copy artifact_path (absolute, inside image_name) into the cache
+        """
+        key = self.get_key(repo, commit_id, recipe_hash)
+        entry_path = Path(self.root, key)
+        if entry_path.exists():
+            return entry_path
+        staging_path = Path(self.root, f".staging-{uuid.uuid4().hex[:8]}")
+        target_path = Path(staging_path, artifact_path.lstrip("/"))
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        container_name = f"artifact-cache-{uuid.uuid4().hex[:8]}"
+        try:
+            subprocess.run(["docker", "create", "--name", container_name, image_name],
+                           check=True, stdout=subprocess.DEVNULL)
+            subprocess.run(["docker", "cp", f"{container_name}:{artifact_path}", str(target_path)], check=True)
+            entry_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(staging_path, entry_path)
+        except (subprocess.CalledProcessError, OSError) as e:
+            print(f"[!] Could not cache {artifact_path} of {image_name}: {e}")
+            return None
+        finally:
+            subprocess.run(["docker", "rm", "-f", container_name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            shutil.rmtree(staging_path, ignore_errors=True)
+        size = self.get_size(entry_path)
+        with self.lock:
+            self.index["entries"][key] = {"size": size, "created": time.time(), "last_used": time.time(), "hits": 0}
+            self._save_index()
+        print(f"[+] Artifact cached: {key} ({size / 1024 ** 2:.0f} MB)")
+        self.evict()
+        return entry_path
+
+    @staticmethod
+    def get_size(path):
+        size = 0
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                filepath = Path(dirpath, filename)
+                if not filepath.is_symlink():
+                    size += filepath.stat().st_size
+        return size
+
+    def evict(self, protected_keys=()):
+        """
+        drop least recently used entries until the cache fits max_bytes
+        """
+        with self.lock:
+            entries = self.index["entries"]
+            total_size = sum(entry["size"] for entry in entries.values())
+            for key in sorted(entries, key=lambda one_key: entries[one_key]["last_used"]):
+                if total_size <= self.max_bytes:
+                    break
+                if key in protected_keys:
+                    continue
+                total_size -= entries[key]["size"]
+                del entries[key]
+                shutil.rmtree(Path(self.root, key), ignore_errors=True)
+                print(f"[-] Artifact cache evicted: {key}")
+            self._save_index()
+
+    def get_stats(self):
+        with self.lock:
+            lookup_count = self.index["hits"] + self.index["misses"]
+            return {
+                "entries": len(self.index["entries"]),
+                "size_bytes": sum(entry["size"] for entry in self.index["entries"].values()),
+                "hits": self.index["hits"],
+                "misses": self.index["misses"],
+                "hit_ratio": self.index["hits"] / lookup_count if lookup_count else 0.0,
+            }
@@ -0,0 +1,59 @@
+import threading
+import time
+
+
+class Budget:
+    """
+    Spending limits of one PR or of a whole batch: dollars, wall-clock minutes and LLM calls.
+    None means unlimited. The clock starts when the Budget is created.
+    """
+
+    def __init__(self, max_cost=None, max_minutes=None, max_llm_calls=None, name="budget"):
+        self.name = name
+        self.max_cost = max_cost
+        self.max_minutes = max_minutes
+        self.max_llm_calls = max_llm_calls
+        self.started_at = time.time()
+        self.cost = 0.0
+        self.llm_calls = 0
+        # executor and detector threads charge the same budget
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return (f"{self.name}: ${self.cost:.2f}/{self.max_cost}, {self.get_elapsed_minutes():.1f}/{self.max_minutes} mins, "
+                f"{self.llm_calls}/{self.max_llm_calls} LLM calls")
+
+    def get_elapsed_minutes(self):
+        return (time.time() - self.started_at) / 60
+
+    def charge(self, cost=0.0, llm_calls=0):
+        with self.lock:
+            self.cost += cost
+            self.llm_calls += llm_calls
+
+    def get_used_ratio(self):
+        """
+        the largest used/limit fraction over the three limits, 0 if nothing is limited
+        """
+        with self.lock:
+            ratios = []
+            if self.max_cost:
+                ratios.append(self.cost / self.max_cost)
+            if self.max_minutes:
+                ratios.append(self.get_elapsed_minutes() / self.max_minutes)
+            if self.max_llm_calls:
+                ratios.append(self.llm_calls / self.max_llm_calls)
+        return max(ratios) if ratios else 0.0
+
+    def can_afford(self, cost=0.0, minutes=0.0, llm_calls=0):
+        """
+        whether another unit of work with this expected cost still fits
+        """
+        with self.lock:
+            if self.max_cost is not None and self.cost + cost > self.max_cost:
+                return False
+            if self.max_minutes is not None and self.get_elapsed_minutes() + minutes > self.max_minutes:
+                return False
+            if self.max_llm_calls is not None and self.llm_calls + llm_calls > self.max_llm_calls:
+                return False
+        return True
@@ -0,0 +1,135 @@
+import json
+import os
+import select
+import subprocess
+import threading
+import time
+
+from config import CONTAINER_AGENT_TIMEOUT
+
+# Runs inside the container: one JSON request per stdin line, one JSON response per stdout line.
+# Started once through a login shell, so every command inherits its environment (PATH, DISPLAY, nvm)
+# without paying for `docker exec` + `bash -l` again.
+AGENT_SCRIPT = r'''
+import json, subprocess, sys
+for line in sys.stdin:
+    request = json.loads(line)
+    try:
+        result = subprocess.run(request["cmd"], shell=True, executable="/bin/bash", input=request.get("stdin"),
+                                capture_output=True, text=True)
+        response = {"id": request["id"], "returncode": result.returncode,
+                    "stdout": result.stdout, "stderr": result.stderr}
+    except Exception as e:
+        response = {"id": request["id"], "returncode": -1, "stdout": "", "stderr": str(e)}
+    sys.stdout.write(json.dumps(response) + "\n")
+    sys.stdout.flush()
+'''
+
+
+class ContainerAgentError(RuntimeError):
+    """
+    The agent process itself is gone or answered garbage (not a failing command).
+    """
+
+
+class ContainerAgent:
+    """
+    Long-lived command channel into a container: one `docker exec -i` for the whole session
+    instead of one per click, keypress or screenshot.
+    """
+
+    def __init__(self, container_name: str, display: str = ":99", env: dict[str, str] | None = None):
+        self.container_name = container_name
+        self.display = display
+        # extra environment (e.g., per-display XDG folders), DISPLAY always included
+        self.env = dict(env or {}, DISPLAY=display)
+        self.process = None
+        self.buffer = b""
+        self.request_id = 0
+        # no answer yet: an agent that fails before its first answer cannot run in this container
+        self.has_answered = False
+        # several threads (e.g., settle polling and actions) may share one computer
+        self.lock = threading.Lock()
+
+    def start(self) -> None:
+        # unbuffered bytes: _read_line selects on the pipe, a buffered reader could hide a line from select
+        self.process = subprocess.Popen(
+            ["docker", "exec", "-i", *[arg for key, value in self.env.items() for arg in ["-e", f"{key}={value}"]],
+             self.container_name, "bash", "-lc", 'exec python3 -u -c "$0"', AGENT_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=0,
+        )
+        self.buffer = b""
+        print(f"[+] Agent started in {self.container_name}")
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def run(self, cmd: str, stdin: str | None = None, check: bool = True,
+            timeout: float = CONTAINER_AGENT_TIMEOUT) -> str:
+        """
+        Run cmd with bash inside the container and return its stdout, like DockerComputer._exec.
+        timeout: seconds to wait for the answer; a stuck agent is killed and raises ContainerAgentError
+        """
+        with self.lock:
+            self.request_id += 1
+            request = {"id": self.request_id, "cmd": cmd, "stdin": stdin}
+            try:
+                if not self.is_alive():
+                    self.start()
+                self.process.stdin.write((json.dumps(request) + "\n").encode())
+                self.process.stdin.flush()
+                response = self._read_response(time.monotonic() + timeout)
+            except (BrokenPipeError, OSError) as e:
+                self._stop()
+                raise ContainerAgentError(f"Agent in {self.container_name} is gone: {e}")
+            except ContainerAgentError:
+                self._stop()
+                raise
+            self.has_answered = True
+        if check and response["returncode"] != 0:
+            raise subprocess.CalledProcessError(response["returncode"], cmd,
+                                                output=response["stdout"], stderr=response["stderr"])
+        return response["stdout"]
+
+    def _read_response(self, deadline: float) -> dict:
+        while True:
+            line = self._read_line(deadline)
+            try:
+                response = json.loads(line)
+            except json.JSONDecodeError:
+                # login-shell profile chatter printed before the agent took over stdout
+                continue
+            if isinstance(response, dict) and response.get("id") == self.request_id:
+                return response
+
+    def _read_line(self, deadline: float) -> bytes:
+        fd = self.process.stdout.fileno()
+        while b"\n" not in self.buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                raise ContainerAgentError(f"Agent in {self.container_name} did not answer in time")
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise ContainerAgentError(f"Agent in {self.container_name} exited")
+            self.buffer += chunk
+        line, self.buffer = self.buffer.split(b"\n", 1)
+        return line
+
+    def _stop(self) -> None:
+        if self.is_alive():
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+    def close(self) -> None:
+        with self.lock:
+            if self.is_alive():
+                self.process.stdin.close()
+                try:
+                    self.process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+            self.process = None
@@ -0,0 +1,118 @@
+import json
+import shlex
+
+# Runs inside the container (python3 -, script on stdin).
+# Brings up one more X display next to the container's own: Xvfb, a window manager (xfwm4, under dbus-launch when
+# available) and an x11vnc server, all detached from this process. A display that is already up is left as is.
+# With reset, what the previous scenario launched on the display (every process whose XDG_CONFIG_HOME is the
+# display's home, see DockerComputer.get_env) is killed and the display's home folder is wiped, so the next app
+# instance starts from a clean profile; the desktop session of the container's own display is left alone.
+# argv: display number, VNC port, screen ("1280x800x24"), start (0: only wait for the container's own Xvfb),
+#       display home ("" for none), reset (0/1)
+# stdout: one JSON line {"ok", "started", "killed"} or {"ok": false, "error"}
+DISPLAY_SCRIPT = r'''
+import json, os, shutil, signal, subprocess, sys, time
+
+num, vnc_port, screen, start, display_home, reset = \
+    sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4] == "1", sys.argv[5], sys.argv[6] == "1"
+display = f":{num}"
+socket_path = f"/tmp/.X11-unix/X{num}"
+env = dict(os.environ, DISPLAY=display)
+started, killed = [], []
+
+
+def spawn(cmd, name):
+    with open(f"/tmp/{name}_{num}.log", "ab") as log:
+        subprocess.Popen(cmd, env=env, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                         start_new_session=True)
+    started.append(name)
+
+
+def wait_for_socket(timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if os.path.exists(socket_path):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def get_ancestors():
+    pids, pid = set(), os.getpid()
+    while pid > 1:
+        pids.add(pid)
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                pid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            break
+    return pids
+
+
+def kill_display_processes():
+    marker = f"XDG_CONFIG_HOME={display_home}/.config".encode()
+    ancestors = get_ancestors()
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit() or int(entry) in ancestors:
+            continue
+        try:
+            with open(f"/proc/{entry}/environ", "rb") as f:
+                environ = f.read().split(b"\0")
+            with open(f"/proc/{entry}/comm") as f:
+                name = f.read().strip()
+        except OSError:
+            continue
+        if marker in environ:
+            try:
+                os.kill(int(entry), signal.SIGKILL)
+                killed.append(name)
+            except OSError:
+                pass
+
+
+if not os.path.exists(socket_path):
+    if not start:
+        if not wait_for_socket(20):
+            print(json.dumps({"ok": False, "error": f"display {display} did not come up"}))
+            sys.exit(0)
+    else:
+        spawn(["Xvfb", display, "-screen", "0", screen], "Xvfb")
+        if not wait_for_socket(10):
+            print(json.dumps({"ok": False, "error": f"Xvfb {display} did not start, see /tmp/Xvfb_{num}.log"}))
+            sys.exit(0)
+        if shutil.which("xfwm4"):
+            spawn((["dbus-launch", "--exit-with-session"] if shutil.which("dbus-launch") else []) + ["xfwm4"], "xfwm4")
+        spawn(["x11vnc", "-display", display, "-forever", "-rfbauth", os.path.expanduser("~/.vncpass"),
+               "-listen", "0.0.0.0", "-rfbport", vnc_port], "x11vnc")
+if reset and display_home:
+    kill_display_processes()
+    shutil.rmtree(display_home, ignore_errors=True)
+if display_home:
+    os.makedirs(display_home, exist_ok=True)
+print(json.dumps({"ok": True, "started": started, "killed": killed}))
+'''
+
+
+class DisplayServer:
+    """
+    Extra X displays inside one container (see DISPLAY_SCRIPT), so several DockerComputer share a container
+    instead of each starting its own desktop session.
+    """
+
+    @staticmethod
+    def get_command(display_num, vnc_port, screen, start=True, display_home=None, reset=False):
+        args = [str(display_num), str(vnc_port), screen, "1" if start else "0", display_home or "",
+                "1" if reset else "0"]
+        return "python3 - " + " ".join(shlex.quote(arg) for arg in args)
+
+    @staticmethod
+    def parse_result(stdout):
+        """
+        the script's JSON line, None if it printed none
+        """
+        for line in reversed(stdout.strip().splitlines()):
+            try:
+                return json.loads(line)
+            except json.JSONDecodeError:
+                continue
+        return None
@@ -1,26 +1,135 @@
+import gzip
+import json
+import logging
 import os
 import re
 import shlex
 import socket
 import string
+import struct
 import subprocess
 import sys
-
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from src.types.app_readiness import AppReadiness, READINESS_SCRIPT
+from src.types.artifact_cache import ArtifactCache
+from src.types.container_agent import ContainerAgent, ContainerAgentError
+from src.types.display_server import DisplayServer, DISPLAY_SCRIPT
+from src.types.docker_engine import DockerEngine
+from src.types.frame import Frame
+from src.types.image_manager import ImageManager
+from src.types.keysyms import Keysyms
+from src.types.moz_build_cache import MozBuildCache
+from src.types.rfb_client import RfbClient, RfbError
+from src.types.settle_profile import SettleProfile
+from src.types.xtest_input import XTestInput, XTestInputError
 from src.utils.path_util import PathUtil
 from config import APP_NAME_FIREFOX, APP_NAME_DESKTOP, APP_NAME_VSCODE, APP_NAME_ZETTLR, APP_NAME_GODOT, \
-    APP_NAME_JABREF, APP_OWNER_NAME_GODOT, APP_OWNER_NAME_JABREF
+    APP_NAME_JABREF, APP_OWNER_NAME_GODOT, APP_OWNER_NAME_JABREF, DOCKER_COMPUTER_NAME, DOCKER_COMPUTER_VNC_PORT, \
+    DOCKER_COMPUTER_DISPLAY_NUM, WARM_POOL_VNC_PORT, WARM_POOL_WAIT_TIMEOUT, APP_PROCESS_PATTERNS, APP_STATE_DIRS, \
+    USE_CONTAINER_AGENT, USE_RAW_FRAMES, USE_SETTLE_DETECTION, SETTLE_STABLE_MS, SETTLE_POLL_MS, SETTLE_MIN_MS, \
+    SETTLE_DIFF_THRESHOLD_PCT, SETTLE_IGNORE_TOP, SETTLE_LAUNCH_STABLE_MS, USE_SETTLE_PROFILES, SETTLE_PROFILE_FILEPATH, \
+    USE_DOCKER_ENGINE_API, DOCKER_PARALLEL_DIFF_BUILD, BUILD_METRICS_FILEPATH, USE_ARTIFACT_CACHE, APP_ARTIFACT_PATHS, USE_IMAGE_GC, \
+    USE_MOZ_BUILD_CACHE, MOZ_BUILD_CACHE_OFFLINE, DISPLAYS_PER_CONTAINER, DOCKER_DISPLAY_SCREEN, COMPUTER_BACKEND, \
+    VNC_HOST, VNC_PASSWORD, VNC_CONNECT_TIMEOUT, XTEST_KEY_DELAY_MS, USE_CLIPBOARD_PASTE, CLIPBOARD_PASTE_MIN_CHARS, \
+    CLIPBOARD_PASTE_VERIFY_MS, CLIPBOARD_PASTE_KEYS, USE_APP_READINESS
 from PIL import Image
 import io, base64, numpy as np, time
 import uuid
 
 
+def get_docker_engine() -> DockerEngine | None:
+    """
+    The shared Docker Engine API client, None to use the docker CLI (disabled, or no daemon on the socket).
+    """
+    if not USE_DOCKER_ENGINE_API:
+        return None
+    engine = DockerEngine.get_shared()
+    return engine if engine.is_available() else None
+
+
 class DockerImageBuilder:
 
     BASE_ENV_TAG = 'base-env'
+    PARALLEL_SUFFIX = 'Parallel'
+
+    # image name -> lock, so the foreground pipeline and the background prefetcher never build the same image twice
+    image_locks = {}
+    image_locks_lock = threading.Lock()
+
+    @staticmethod
+    def get_image_lock(image_name: str) -> threading.Lock:
+        with DockerImageBuilder.image_locks_lock:
+            return DockerImageBuilder.image_locks.setdefault(image_name, threading.Lock())
+
+    @staticmethod
+    def get_diff_image_name(reponame: str, before_commit: str, after_commit: str) -> str:
+        return (
+            f"{reponame.lower()}:diff-"
+            f"{before_commit[:8]}-"
+            f"{after_commit[:8]}"
+        )
+
+    # BuildKit plain progress: "#12 [build-before 4/6] RUN yarn package", "#12 DONE 81.3s", "#12 CACHED"
+    STEP_PATTERN = re.compile(r"^#(\d+) \[([^\]]+?)(?: \d+/\d+)?\] (.*)$")
+    DONE_PATTERN = re.compile(r"^#(\d+) DONE (\d+(?:\.\d+)?)s$")
+    CACHED_PATTERN = re.compile(r"^#(\d+) CACHED$")
+
+    @staticmethod
+    def run_build(cmd: list[str], image_name: str, dockerfile) -> dict:
+        """
+        Run the parallel diff `docker build` with BuildKit and plain progress, echoing the output and timing every
+        stage (wall clock per stage = sum of its steps; parallel stages overlap). Appends the metrics to
+        BUILD_METRICS_FILEPATH.
+        """
+        cmd = cmd[:2] + ["--progress=plain"] + cmd[2:]
+        env = dict(os.environ, DOCKER_BUILDKIT="1")
+        start_time = time.time()
+        step_stages = {}
+        stage_secs = {}
+        cached_step_count = 0
+        process = subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+        for line in process.stdout:
+            sys.stdout.write(line)
+            line = line.rstrip()
+            step_match = DockerImageBuilder.STEP_PATTERN.match(line)
+            if step_match:
+                step_stages[step_match.group(1)] = step_match.group(2).split(" ")[0]
+                continue
+            done_match = DockerImageBuilder.DONE_PATTERN.match(line)
+            if done_match and done_match.group(1) in step_stages:
+                stage = step_stages[done_match.group(1)]
+                stage_secs[stage] = round(stage_secs.get(stage, 0.0) + float(done_match.group(2)), 1)
+            elif DockerImageBuilder.CACHED_PATTERN.match(line):
+                cached_step_count += 1
+        return_code = process.wait()
+        metrics = {
+            "image": image_name,
+            "dockerfile": str(dockerfile),
+            "succeeded": return_code == 0,
+            "total_secs": round(time.time() - start_time, 1),
+            "stage_secs": stage_secs,
+            "cached_steps": cached_step_count,
+            "finished_at": time.time(),
+        }
+        print(f"[=] Build metrics: {metrics}")
+        Path(BUILD_METRICS_FILEPATH).parent.mkdir(parents=True, exist_ok=True)
+        with open(BUILD_METRICS_FILEPATH, "a") as f:
+            f.write(json.dumps(metrics) + "\n")
+        if return_code != 0:
+            raise subprocess.CalledProcessError(return_code, cmd)
+        return metrics
 
     @staticmethod
     def docker_image_exists(image_name: str) -> bool:
         image_name = image_name.strip()
+        engine = get_docker_engine()
+        if engine is not None:
+            # one inspect (cached once found) instead of listing every image
+            return engine.image_exists(image_name)
         # repo, tag = image_name.split(":", 1)
         result = subprocess.run(
             [
@@ -38,6 +147,18 @@ class DockerImageBuilder:
         images = {line.strip() for line in result.stdout.splitlines()}
         return image_name in images
 
+    @staticmethod
+    def get_image_id(image_name: str) -> str:
+        result = subprocess.run(["docker", "image", "inspect", "-f", "{{.Id}}", image_name],
+                                capture_output=True, text=True)
+        return result.stdout.strip()
+
+    @staticmethod
+    def remember_image(image_name: str) -> None:
+        engine = get_docker_engine()
+        if engine is not None:
+            engine.add_image(image_name)
+
     @staticmethod
     def build_base_image(
         reponame: str,
@@ -74,6 +195,9 @@ class DockerImageBuilder:
 
         print(f"[+] Building base env image: {image_name}")
         subprocess.run(cmd, check=True)
+        DockerImageBuilder.remember_image(image_name)
+        if USE_IMAGE_GC:
+            ImageManager.get_shared().record_build(image_name)
         print(f"[✓] Base env ready: {image_name}")
 
         return image_name
@@ -85,18 +209,19 @@ class DockerImageBuilder:
         after_commit: str,
         dockerfile_name: str = "DockerfileDiff",
         platform: str | None = None,
+        parallel: bool = DOCKER_PARALLEL_DIFF_BUILD,
+        build_jobs: int | None = None,
     ) -> str:
         """
         Build a single image that contains:
           - /before : build at before_commit
           - /after  : build at after_commit
+        parallel: use {dockerfile_name}Parallel if the app has one, where the two commits are separate
+                  BuildKit stages built concurrently with dependency/compiler cache mounts
+        build_jobs: compiler jobs per commit (BUILD_JOBS build arg of the parallel Dockerfiles), None: all cores
         """
 
-        image_name = (
-            f"{reponame.lower()}:diff-"
-            f"{before_commit[:8]}-"
-            f"{after_commit[:8]}"
-        )
+        image_name = DockerImageBuilder.get_diff_image_name(reponame, before_commit, after_commit)
 
         if DockerImageBuilder.docker_image_exists(image_name):
             print(f"[=] Image exists, skip build: {image_name}")
@@ -109,24 +234,57 @@ class DockerImageBuilder:
 
         if not dockerfile.exists():
             raise FileNotFoundError(dockerfile)
+        parallel_dockerfile = dockerfile.with_name(f"{dockerfile.name}{DockerImageBuilder.PARALLEL_SUFFIX}")
+        if parallel and parallel_dockerfile.exists():
+            dockerfile = parallel_dockerfile
 
         context_dir = dockerfile.parent
 
+        # commits built before (for another PR) replace their build stage with the cached tree
+        artifact_cache = None
+        missed_commits = []
+        build_contexts = []
+        artifact_path = APP_ARTIFACT_PATHS.get(reponame)
+        if USE_ARTIFACT_CACHE and artifact_path and dockerfile == parallel_dockerfile:
+            artifact_cache = ArtifactCache.get_shared()
+            recipe_hash = ArtifactCache.get_recipe_hash(dockerfile, DockerImageBuilder.get_image_id(
+                f"{reponame.lower()}:{DockerImageBuilder.BASE_ENV_TAG}"))
+            for stage, commit_id in [("build-before", before_commit), ("build-after", after_commit)]:
+                entry_path = artifact_cache.lookup(reponame, commit_id, recipe_hash)
+                if entry_path is None:
+                    missed_commits.append(commit_id)
+                else:
+                    build_contexts.extend(["--build-context", f"{stage}={entry_path}"])
+
         cmd = [
             "docker", "build",
             "-t", image_name,
             "--build-arg", f"BEFORE_COMMIT={before_commit}",
             "--build-arg", f"AFTER_COMMIT={after_commit}",
             "-f", str(dockerfile),
+            *build_contexts,
         ]
+        if build_jobs and dockerfile == parallel_dockerfile:
+            cmd.extend(["--build-arg", f"BUILD_JOBS={build_jobs}"])
 
         if platform:
             cmd.extend(["--platform", platform])
 
         cmd.append(str(context_dir))
 
-        print(f"[+] Building diff image: {image_name}")
-        subprocess.run(cmd, check=True)
+        print(f"[+] Building diff image: {image_name} ({dockerfile.name})")
+        if dockerfile == parallel_dockerfile:
+            DockerImageBuilder.run_build(cmd, image_name, dockerfile)
+        else:
+            subprocess.run(cmd, check=True)
+        DockerImageBuilder.remember_image(image_name)
+        if USE_IMAGE_GC:
+            ImageManager.get_shared().record_build(image_name)
+        if artifact_cache is not None:
+            for commit_id in missed_commits:
+                artifact_cache.store_from_image(image_name, reponame, commit_id, recipe_hash,
+                                                artifact_path.format(commit_id=commit_id))
+            print(f"[=] Artifact cache: {artifact_cache.get_stats()}")
         print(f"[✓] Diff image ready: {image_name}")
 
         return image_name
@@ -141,6 +299,7 @@ class DockerImageBuilder:
         diff_dockerfile: str = "DockerfileDiff",
         base_tag: str = BASE_ENV_TAG,
         platform: str | None = None,
+        build_jobs: int | None = None,
     ) -> str:
         """
         Ensure that:
@@ -153,41 +312,50 @@ class DockerImageBuilder:
         base_image = f"{reponame.lower()}:{base_tag}"
 
         # ---- Step 1: ensure base image ----
-        if not DockerImageBuilder.docker_image_exists(base_image):
-            print(f"[!] Base image missing, building: {base_image}")
-            DockerImageBuilder.build_base_image(
+        # a background prefetch may be building the same image: wait for it instead of building it twice
+        with DockerImageBuilder.get_image_lock(base_image):
+            if not DockerImageBuilder.docker_image_exists(base_image):
+                print(f"[!] Base image missing, building: {base_image}")
+                DockerImageBuilder.build_base_image(
+                    reponame=reponame,
+                    dockerfile_name=base_dockerfile,
+                    platform=platform,
+                    tag=base_tag,
+                )
+            else:
+                print(f"[✓] Base image exists: {base_image}")
+
+        # ---- Step 2: ensure diff image ----
+        diff_image = DockerImageBuilder.get_diff_image_name(reponame, before_commit, after_commit)
+
+        with DockerImageBuilder.get_image_lock(diff_image):
+            if DockerImageBuilder.docker_image_exists(diff_image):
+                print(f"[✓] Diff image exists: {diff_image}")
+                return diff_image
+
+            print(f"[!] Diff image missing, building: {diff_image}")
+            if USE_IMAGE_GC:
+                # make room before `docker build` runs out of disk halfway
+                image_manager = ImageManager.get_shared()
+                image_manager.collect(reserve_bytes=image_manager.get_reserve_bytes(reponame.lower()),
+                                      repo=reponame.lower())
+            return DockerImageBuilder.build_diff_image(
                 reponame=reponame,
-                dockerfile_name=base_dockerfile,
+                before_commit=before_commit,
+                after_commit=after_commit,
+                dockerfile_name=diff_dockerfile,
                 platform=platform,
-                tag=base_tag,
+                build_jobs=build_jobs,
             )
-        else:
-            print(f"[✓] Base image exists: {base_image}")
-
-        # ---- Step 2: ensure diff image ----
-        diff_image = (
-            f"{reponame.lower()}:diff-"
-            f"{before_commit[:8]}-"
-            f"{after_commit[:8]}"
-        )
-
-        if DockerImageBuilder.docker_image_exists(diff_image):
-            print(f"[✓] Diff image exists: {diff_image}")
-            return diff_image
-
-        print(f"[!] Diff image missing, building: {diff_image}")
-        return DockerImageBuilder.build_diff_image(
-            reponame=reponame,
-            before_commit=before_commit,
-            after_commit=after_commit,
-            dockerfile_name=diff_dockerfile,
-            platform=platform,
-        )
 
 
 class DockerComputer:
     environment = "linux"
     dimensions = (1280, 720)  # Default fallback; will be updated in __enter__.
+    # UI backend of the computers started from now on, see get_class
+    backend = COMPUTER_BACKEND
+    # images without a working xwd (built before raw frames), their computers go straight to PNG screenshots
+    images_without_xwd = set()
 
     def __init__(
         self,
@@ -195,11 +363,50 @@ class DockerComputer:
         image="cua-image:latest",  ## <-- Use your local image name
         display=":99",
         port_mapping="5900:5900",
+        display_home=None,
     ):
         self.container_name = container_name
         self.image = image
         self.display = display
         self.port_mapping = port_mapping
+        # per-display config/data/cache folder when the container hosts several displays (see get_env), None: ~
+        self.display_home = display_home
+        # commit of the app already launched in this container (e.g., by a WarmComputerPool), None if not launched
+        self.running_commit_id = None
+        # UI actions and screenshots go through one persistent in-container process instead of a docker exec each
+        self.use_agent = USE_CONTAINER_AGENT
+        self.agent = None
+        # poll raw xwd frames in the settle and GUI check loops instead of PNG screenshots
+        self.use_raw_frames = USE_RAW_FRAMES and image not in DockerComputer.images_without_xwd
+        # return from waits as soon as the screen is stable instead of sleeping the full wait
+        self.use_settle = USE_SETTLE_DETECTION
+        # launch checks watch window-manager events, see wait_for_app_ready
+        self.use_app_readiness = USE_APP_READINESS
+        # (settle_ms, timed_out) per settle since the last pop_settle_report
+        self.settle_times = []
+        # learned settle times, shared by all computers of the process
+        self.settle_profile = SettleProfile.get_shared(SETTLE_PROFILE_FILEPATH) if USE_SETTLE_PROFILES else None
+        self.settle_context = (None, None, None)
+        # (action, ms) per UI action since the last pop_action_report, see ComputerUseTool.perform_action
+        self.action_latencies = []
+        # paste long texts from the clipboard where the app allows it (enter_text)
+        self.use_clipboard_paste = USE_CLIPBOARD_PASTE
+        # how enter_text entered texts since the last pop_action_report: "type", "paste", "paste_failed"
+        self.text_entry_counts = {}
+
+    @staticmethod
+    def get_class(backend: str | None = None) -> type["DockerComputer"]:
+        """
+        DockerComputer class of a UI backend ("xdotool", "vnc", "xtest"), DockerComputer.backend by default
+        """
+        backend = backend or DockerComputer.backend
+        if backend == "xdotool":
+            return DockerComputer
+        if backend == "vnc":
+            return VncDockerComputer
+        if backend == "xtest":
+            return XTestDockerComputer
+        raise ValueError(f"Unknown computer backend: {backend}")
 
     @staticmethod
     def stop_and_remove(name: str) -> None:
@@ -207,6 +414,10 @@ class DockerComputer:
         Stop and remove a container if it exists.
         Safe to call even if container does not exist.
         """
+        engine = get_docker_engine()
+        if engine is not None:
+            engine.remove_container(name, force=True)
+            return
         subprocess.run(
             ["docker", "rm", "-f", name],
             stdout=subprocess.DEVNULL,
@@ -223,19 +434,42 @@ class DockerComputer:
             port_mapping="5900:5900",
             detach: bool = True,
             auto_remove: bool = False,
+            extra_port_mappings: list[str] | None = None,
     ) -> "DockerComputer":
+        """
+        extra_port_mappings: VNC ports of the other displays when the container hosts several
+        """
 
-        container_name = name or "docker-computer"
+        container_name = name or DOCKER_COMPUTER_NAME
 
         # 👇 stop and remove the previous
         cls.stop_and_remove(container_name)
 
+        if USE_IMAGE_GC:
+            ImageManager.get_shared().record_run(image)
+
+        volumes = []
+        if USE_MOZ_BUILD_CACHE and image.split(":", 1)[0] == APP_NAME_FIREFOX.lower():
+            volumes.append(MozBuildCache.get_volume())
+
+        engine = get_docker_engine()
+        if engine is not None and detach:
+            engine.run_container(image, container_name, env={"DISPLAY": display},
+                                 port_mapping=[port_mapping] + list(extra_port_mappings or []),
+                                 auto_remove=auto_remove, volumes=volumes)
+            print(f"[+] Container started: {container_name}")
+            return cls(container_name=container_name, image=image, display=display, port_mapping=port_mapping)
+
         cmd = [
             "docker", "run",
             "--name", container_name,
             "-e", f"DISPLAY={display}",
             "-p", port_mapping,
         ]
+        for extra_port_mapping in extra_port_mappings or []:
+            cmd.extend(["-p", extra_port_mapping])
+        for volume in volumes:
+            cmd.extend(["-v", volume])
 
         if detach:
             cmd.append("-d")
@@ -315,13 +549,7 @@ class DockerComputer:
 
     def __enter__(self):
         # Check if the container is running
-        result = subprocess.run(
-            ["docker", "ps", "-q", "-f", f"name={self.container_name}"],
-            capture_output=True,
-            text=True,
-        )
-
-        if not result.stdout.strip():
+        if not self.is_running():
             # raise RuntimeError(
             #     f"Container {self.container_name} is not running. Build and run with:\n"
             #     f"docker build -t {self.container_name} .\n"
@@ -362,11 +590,75 @@ class DockerComputer:
         # print("Entering DockerComputer context")
         return self
 
+    def close_agent(self) -> None:
+        if self.agent is not None:
+            self.agent.close()
+            self.agent = None
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         # print("Stopping Docker container...")
         # subprocess.check_call(["docker", "stop", self.container_name])
         # print("Exiting DockerComputer context")
-        pass
+        self.close_agent()
+
+    def get_display_num(self) -> int:
+        return int(self.display.lstrip(":").split(".")[0])
+
+    def get_env(self) -> dict[str, str]:
+        """
+        Environment of every command run for this computer: its X display and, with a display_home,
+        per-display config/data/cache folders and Java preferences, so app instances on the other displays
+        of the container do not share profiles or single-instance locks.
+        """
+        env = {"DISPLAY": self.display}
+        if self.display_home:
+            env.update({
+                "XDG_CONFIG_HOME": f"{self.display_home}/.config",
+                "XDG_DATA_HOME": f"{self.display_home}/.local/share",
+                "XDG_CACHE_HOME": f"{self.display_home}/.cache",
+                "JAVA_TOOL_OPTIONS": f"-Djava.util.prefs.userRoot={self.display_home}/.java",
+            })
+        return env
+
+    def _get_env_prefix(self) -> str:
+        return "export " + " ".join(f"{key}={shlex.quote(value)}" for key, value in self.get_env().items()) + "; "
+
+    def get_tmp_filepath(self, filename: str) -> str:
+        """
+        /tmp file of this display, e.g. app_pid.txt -> /tmp/app_pid_99.txt, so the pid files and logs of apps on
+        other displays of the container stay apart
+        """
+        stem, dot, extension = filename.rpartition(".")
+        if not dot:
+            return f"/tmp/{filename}_{self.get_display_num()}"
+        return f"/tmp/{stem}_{self.get_display_num()}.{extension}"
+
+    def start_display(self, vnc_port: int, start: bool = True, reset: bool = False) -> None:
+        """
+        Bring up this computer's display inside a container that hosts several (see DisplayServer);
+        start=False for the container's own display, which its CMD starts.
+        reset: kill what a previous scenario launched on the display and wipe its display_home.
+        """
+        result = DisplayServer.parse_result(self._run(
+            DisplayServer.get_command(self.get_display_num(), vnc_port, DOCKER_DISPLAY_SCREEN, start=start,
+                                      display_home=self.display_home, reset=reset),
+            stdin=DISPLAY_SCRIPT))
+        if result is None or not result["ok"]:
+            raise RuntimeError(f"Display {self.display} of {self.container_name} is not up: "
+                               f"{result['error'] if result else 'no answer'}")
+        print(f"[+] Display {self.display} ready in {self.container_name}"
+              f"{' (started ' + ', '.join(result['started']) + ')' if result['started'] else ''}")
+
+    def kill_app(self, pattern: str) -> None:
+        """
+        Kill the processes matching pattern that run on this computer's display, not the instances
+        on other displays of the container.
+        """
+        # "[J]abRef" matches JabRef but not this command line
+        pgrep_pattern = f"[{pattern[0]}]{pattern[1:]}" if pattern else pattern
+        self._exec(f"for pid in \\$(pgrep -f '{pgrep_pattern}'); do "
+                   f"tr '\\0' '\\n' < /proc/\\$pid/environ 2>/dev/null | grep -qx 'DISPLAY={self.display}' "
+                   f"&& kill \\$pid; done; true")
 
     # def _exec(self, cmd: str) -> str:
     #     """
@@ -417,13 +709,17 @@ class DockerComputer:
         - Safe quoting ensures commands with double quotes won't break.
         """
 
+        engine = get_docker_engine()
+        if engine is not None:
+            return self._exec_engine(engine, cmd, detach=detach)
+
         # Escape double quotes inside the command
         safe_cmd = cmd.replace('"', r'\"')
 
         # Fallback: if node is not available, source NVM manually
         wrapped_cmd = (
             'type node >/dev/null 2>&1 || source ~/.nvm/nvm.sh; '
-            f'{safe_cmd}'
+            f'{self._get_env_prefix()}{safe_cmd}'
         )
 
         docker_cmd = (
@@ -440,7 +736,87 @@ class DockerComputer:
                 docker_cmd, shell=True
             ).decode("utf-8", errors="ignore")
 
+    # what the host shell removes inside "...": \$ \` \\
+    HOST_SHELL_ESCAPE = re.compile(r'\\([$`\\])')
+
+    def _exec_engine(self, engine: DockerEngine, cmd: str, *, detach: bool = False, stdin: str | None = None,
+                     host_shell_escaped: bool = True) -> str | None:
+        """
+        _exec over the Engine API. There is no host shell in between, so the escapes that _exec callers
+        add for it are undone (host_shell_escaped).
+        A non-zero exit raises CalledProcessError like subprocess.check_output.
+        """
+        if host_shell_escaped:
+            cmd = self.HOST_SHELL_ESCAPE.sub(r"\1", cmd)
+        wrapped_cmd = (
+            'type node >/dev/null 2>&1 || source ~/.nvm/nvm.sh; '
+            f'{self._get_env_prefix()}{cmd}'
+        )
+        if detach:
+            engine.exec_detached(self.container_name, ["bash", "-lc", wrapped_cmd])
+            return None
+        exit_code, stdout, stderr = engine.exec_run(self.container_name, ["bash", "-lc", wrapped_cmd], stdin=stdin)
+        if stderr:
+            sys.stderr.write(stderr)
+        if exit_code != 0:
+            raise subprocess.CalledProcessError(exit_code, cmd, output=stdout, stderr=stderr)
+        return stdout
+
+    def _run(self, cmd: str, stdin: str | None = None) -> str:
+        """
+        Run a UI action / screenshot command: through the persistent ContainerAgent if enabled,
+        falling back to a plain docker exec if the agent is gone.
+        """
+        if self.use_agent:
+            try:
+                if self.agent is None:
+                    self.agent = ContainerAgent(self.container_name, display=self.display, env=self.get_env())
+                return self.agent.run(cmd, stdin=stdin)
+            except ContainerAgentError as e:
+                if not self.agent.has_answered:
+                    # e.g., no python3 in the image: do not pay for a failing start on every action
+                    print(f"[!] {e}, stay on docker exec")
+                    self.use_agent = False
+                else:
+                    print(f"[!] {e}, fall back to docker exec")
+                self.close_agent()
+        if stdin is None:
+            return self._exec(cmd)
+        engine = get_docker_engine()
+        if engine is not None:
+            return self._exec_engine(engine, cmd, stdin=stdin, host_shell_escaped=False)
+        return subprocess.run(
+            ["docker", "exec", "-i", self.container_name, "bash", "-lc", f"{self._get_env_prefix()}{cmd}"],
+            input=stdin,
+            text=True,
+            capture_output=True,
+            check=True,
+        ).stdout
+
+    def screenshot_frame(self) -> Frame:
+        """
+        Raw X framebuffer capture with xwd (x11-apps) as a numpy-backed Frame; no PNG encoding on either side.
+        gzip -1 shrinks the mostly flat UI pixels before they cross the docker exec pipe.
+        Falls back to the ImageMagick PNG path if xwd is missing or the dump cannot be parsed.
+        """
+        if self.use_raw_frames:
+            try:
+                b64 = self._run(f"export DISPLAY={self.display} && xwd -root -silent | gzip -1 | base64 -w 0")
+                return Frame.from_xwd(gzip.decompress(base64.b64decode(b64)))
+            except (subprocess.CalledProcessError, OSError, ValueError, struct.error) as e:
+                print(f"[!] Raw frame capture failed ({e}), fall back to PNG screenshots for {self.image}")
+                self.use_raw_frames = False
+                DockerComputer.images_without_xwd.add(self.image)
+        return Frame.from_base64_png(self.screenshot_png())
+
     def screenshot(self) -> str:
+        """
+        Takes a screenshot, returning base64-encoded PNG.
+        The caller needs the PNG anyway, so it is encoded in the container rather than from a raw frame.
+        """
+        return self.screenshot_png()
+
+    def screenshot_png(self) -> str:
         """
         Takes a screenshot with ImageMagick (import), returning base64-encoded PNG.
         Requires 'import'.
@@ -455,12 +831,12 @@ class DockerComputer:
             "import -window root png:- | base64 -w 0"
         )
 
-        return self._exec(cmd)
+        return self._run(cmd)
 
     def click(self, x: int, y: int, button: str = "left") -> None:
         button_map = {"left": 1, "middle": 2, "right": 3}
         b = button_map.get(button, 1)
-        self._exec(f"DISPLAY={self.display} xdotool mousemove {x} {y} click {b}")
+        self._run(f"DISPLAY={self.display} xdotool mousemove {x} {y} click {b}")
 
     def right_click(self, x: int, y: int) -> None:
         self.click(x, y, button="right")
@@ -475,12 +851,12 @@ class DockerComputer:
         """
         button_map = {"left": 1, "middle": 2, "right": 3}
         b = button_map.get(button, 1)
-        self._exec(f"DISPLAY={self.display} xdotool mousemove {x} {y} mousedown {b}")
+        self._run(f"DISPLAY={self.display} xdotool mousemove {x} {y} mousedown {b}")
         time.sleep(duration)
-        self._exec(f"DISPLAY={self.display} xdotool mouseup {b}")
+        self._run(f"DISPLAY={self.display} xdotool mouseup {b}")
 
     def double_click(self, x: int, y: int) -> None:
-        self._exec(
+        self._run(
             f"DISPLAY={self.display} xdotool mousemove {x} {y} click --repeat 2 1"
         )
 
@@ -489,7 +865,7 @@ class DockerComputer:
         Simulate a triple-click at (x, y).
         Commonly used for selecting a full line or paragraph in text editors.
         """
-        self._exec(
+        self._run(
             f"DISPLAY={self.display} xdotool mousemove {x} {y} click --repeat 3 1"
         )
 
@@ -497,11 +873,13 @@ class DockerComputer:
         """
         For simple vertical scrolling: xdotool click 4 (scroll up) or 5 (scroll down).
         """
-        self._exec(f"DISPLAY={self.display} xdotool mousemove {x} {y}")
         clicks = abs(scroll_y)
         button = 4 if scroll_y < 0 else 5
-        for _ in range(clicks):
-            self._exec(f"DISPLAY={self.display} xdotool click {button}")
+        # all wheel ticks in one command instead of one exec per tick
+        cmd = f"DISPLAY={self.display} xdotool mousemove {x} {y}"
+        if clicks:
+            cmd += f" click --repeat {clicks} {button}"
+        self._run(cmd)
 
     # def type(self, text: str) -> None:
     #     """
@@ -521,72 +899,326 @@ class DockerComputer:
     #     self._exec(cmd)
 
     def type(self, text: str) -> None:
-        cmd = [
-            "docker", "exec",
-            "-i",  # ⭐ must：allow stdin
-            self.container_name,
-            "bash", "-lc",
-            "xdotool type --clearmodifiers --delay 1 --file -"
-        ]
+        try:
+            # text over stdin: no quoting of ! $ spaces and quotes
+            self._run("xdotool type --clearmodifiers --delay 1 --file -", stdin=text)
+        except subprocess.CalledProcessError as e:
+            print(f"[!] xdotool type failed: {e}")
+
+    def set_clipboard(self, text: str) -> bool:
+        """
+        put text on the CLIPBOARD selection of the display, served by a background xclip that logs each selection
+        request it answers (get_clipboard_request_count); False if xclip failed or reads back something else
+        """
+        text_filepath = self.get_tmp_filepath("clipboard.txt")
+        log_filepath = self.get_tmp_filepath("xclip.log")
+        try:
+            # -verbose keeps xclip in the foreground; a background job reads /dev/null, hence the text file;
+            # the previous xclip goes first, its log lines must not count for this text
+            # (with stdin, _run has no host shell in between, so $! needs no escape)
+            self._run(f"{self.get_clipboard_kill_command()}; cat > {text_filepath} && "
+                      f"{{ xclip -verbose -selection clipboard -i {text_filepath} > {log_filepath} 2>&1 & "
+                      f"echo $! > {self.get_tmp_filepath('xclip.pid')}; }} && "
+                      f"for i in 1 2 3 4 5 6 7 8 9 10; do "
+                      f"grep -q 'request number 1' {log_filepath} 2>/dev/null && break; sleep 0.05; done",
+                      stdin=text)
+            return self._run("xclip -selection clipboard -o 2>/dev/null") == text
+        except subprocess.CalledProcessError as e:
+            print(f"[!] xclip failed ({e}), type texts key by key from now on")
+            self.use_clipboard_paste = False
+            return False
 
-        env = os.environ.copy()
-        env["DISPLAY"] = self.display
+    def get_clipboard_request_count(self) -> int:
+        """
+        selection requests the xclip of set_clipboard has answered or is waiting for
+        """
+        output = self._run(f"grep -c 'Waiting for selection request number' "
+                           f"{self.get_tmp_filepath('xclip.log')} 2>/dev/null || true")
+        return int(output.strip() or 0)
 
-        subprocess.run(
-            cmd,
-            input=text,
-            text=True,
-            env=env,
-            check=False,
-        )
+    def get_clipboard_kill_command(self) -> str:
+        # no $ here, the command may go through the host shell of _exec
+        pid_filepath = self.get_tmp_filepath("xclip.pid")
+        return f"xargs -r kill < {pid_filepath} 2>/dev/null; rm -f {pid_filepath}"
+
+    def clear_clipboard(self) -> None:
+        """
+        stop serving the text of set_clipboard, so a late paste request gets nothing
+        """
+        self._run(self.get_clipboard_kill_command())
+
+    def enter_text(self, text: str, app: str | None = None) -> str:
+        """
+        Type text, or paste it if it is long and app pastes from the clipboard (CLIPBOARD_PASTE_KEYS): typing key by
+        key takes seconds per paragraph and can drop characters under load. The clipboard is read back before
+        pasting. The paste counts once the app has requested the clipboard from xclip, however the screen looks
+        (text replacing an identical selection, slow rendering); a paste nobody requested is typed instead, after
+        xclip is stopped so that a late request cannot insert the text twice.
+        Returns the path taken, "paste" or "type".
+        """
+        paste_keys = CLIPBOARD_PASTE_KEYS.get(app)
+        if not self.use_clipboard_paste or paste_keys is None or len(text) < CLIPBOARD_PASTE_MIN_CHARS:
+            self.type(text)
+            return self._count_text_entry("type")
+        if not self.set_clipboard(text):
+            self.type(text)
+            return self._count_text_entry("type")
+        request_count = self.get_clipboard_request_count()
+        self.keypress(paste_keys)
+        # also lets the pasted text show before the next screenshot
+        self.settle(CLIPBOARD_PASTE_VERIFY_MS, record=False)
+        if self.get_clipboard_request_count() == request_count:
+            self.clear_clipboard()
+            # a request may have come in right before xclip was stopped
+            if self.get_clipboard_request_count() == request_count:
+                print(f"[!] Nothing requested the {len(text)} pasted chars, type them")
+                self._count_text_entry("paste_failed")
+                self.type(text)
+                return self._count_text_entry("type")
+        return self._count_text_entry("paste")
+
+    def _count_text_entry(self, path: str) -> str:
+        self.text_entry_counts[path] = self.text_entry_counts.get(path, 0) + 1
+        return path
 
     def wait(self, ms: int = 1000) -> None:
         time.sleep(ms / 1000)
 
-    def move(self, x: int, y: int) -> None:
-        self._exec(f"DISPLAY={self.display} xdotool mousemove {x} {y}")
+    def set_settle_context(self, app: str | None, build: str | None, action_kind: str | None) -> None:
+        """
+        the action just performed, so the next settle can use and extend its learned settle profile
+        """
+        self.settle_context = (app, build, action_kind)
 
-    def keypress(self, keys: list[str]) -> None:
-        mapping = {
-            # Modifier and function keys
-            "ENTER": "Return",
-            "LEFT": "Left",
-            "RIGHT": "Right",
-            "UP": "Up",
-            "DOWN": "Down",
-            "ESC": "Escape",
-            "SPACE": "space",
-            "BACKSPACE": "BackSpace",
-            "TAB": "Tab",
-            "CTRL": "ctrl",
-            "ALT": "alt",
-            "SHIFT": "shift",
-
-            # Punctuation keys (important!)
-            ",": "comma",
-            ".": "period",
-            "/": "slash",
-            ";": "semicolon",
-            "'": "apostrophe",
-            "[": "bracketleft",
-            "]": "bracketright",
+    def settle(self, timeout_ms: int, stable_ms: int = SETTLE_STABLE_MS, poll_ms: int = SETTLE_POLL_MS,
+               min_ms: int = SETTLE_MIN_MS, threshold_pct: float = SETTLE_DIFF_THRESHOLD_PCT,
+               ignore_top: int = SETTLE_IGNORE_TOP, record: bool = True) -> Frame:
+        """
+        Wait until the screen has not changed (beyond threshold_pct, e.g. a blinking cursor) for stable_ms,
+        at most timeout_ms, and return the last frame.
+        Polls raw frames like the GUI checks of run_single_build; without settle detection, sleeps timeout_ms.
+        With a settle profile and a known last action, min_ms and timeout_ms come from its learned percentiles.
+        record: count it in the settle report (launch grace periods are not UI actions)
+        """
+        start_time = time.time()
+        if not self.use_settle:
+            self.wait(timeout_ms)
+            return self.screenshot_frame()
+        app, build, action_kind = self.settle_context
+        # each action is measured once, a second settle without a new action has no context
+        self.settle_context = (app, build, None)
+        if record and self.settle_profile is not None and action_kind is not None:
+            min_ms, timeout_ms = self.settle_profile.get_timing(app, build, action_kind, stable_ms, min_ms, timeout_ms)
+        time.sleep(min(min_ms, timeout_ms) / 1000)
+        prev_frame, last_change_at, timed_out = self._wait_for_stable_screen(start_time, timeout_ms, stable_ms,
+                                                                             poll_ms, threshold_pct, ignore_top)
+        settle_ms = int((time.time() - start_time) * 1000)
+        if record:
+            self.settle_times.append((settle_ms, timed_out))
+            if self.settle_profile is not None and action_kind is not None:
+                self.settle_profile.record(app, build, action_kind,
+                                           settle_ms if timed_out else int((last_change_at - start_time) * 1000))
+        logging.debug(f"Settled in {settle_ms} ms (timeout {timeout_ms} ms{', hit' if timed_out else ''})")
+        return prev_frame
+
+    def _wait_for_stable_screen(self, start_time: float, timeout_ms: int, stable_ms: int, poll_ms: int,
+                                threshold_pct: float, ignore_top: int) -> tuple[Frame, float, bool]:
+        """
+        Poll frames until none changed for stable_ms, or timeout_ms after start_time;
+        (last frame, when the screen last changed (start_time if it did not), timed out)
+        """
+        prev_frame = self.screenshot_frame()
+        stable_since = time.time()
+        last_change_at = start_time
+        timed_out = False
+        while (time.time() - stable_since) * 1000 < stable_ms:
+            if (time.time() - start_time) * 1000 >= timeout_ms:
+                timed_out = True
+                break
+            time.sleep(poll_ms / 1000)
+            curr_frame = self.screenshot_frame()
+            if self._diff_ratio_frame(prev_frame, curr_frame, ignore_top=ignore_top) > threshold_pct:
+                stable_since = time.time()
+                last_change_at = stable_since
+            prev_frame = curr_frame
+        return prev_frame, last_change_at, timed_out
+
+    def settle_after_launch(self, gui_grace: float) -> None:
+        """
+        gui_grace (seconds) as an upper bound; a longer stable window so a splash screen does not count as settled
+        """
+        start_time = time.time()
+        self.settle(int(gui_grace * 1000), stable_ms=SETTLE_LAUNCH_STABLE_MS, record=False)
+        print(f"[INFO] GUI settled after {time.time() - start_time:.1f}s (grace {gui_grace}s)")
+
+    def wait_and_screenshot(self, ms: int = 1000) -> str:
+        """
+        screenshot once the UI has settled, at most ms after the last action; base64-encoded PNG
+        """
+        if not self.use_settle:
+            self.wait(ms)
+            return self.screenshot()
+        return self.settle(ms).to_base64()
+
+    def pop_settle_report(self) -> dict:
+        """
+        settle times since the last report (count, p50/p90/max in ms, timeouts), then start over
+        """
+        settle_times, self.settle_times = self.settle_times, []
+        if self.settle_profile is not None:
+            self.settle_profile.save()
+        if not settle_times:
+            return {"count": 0}
+        durations = sorted(settle_ms for settle_ms, _ in settle_times)
+        report = {
+            "count": len(durations),
+            "p50_ms": durations[len(durations) // 2],
+            "p90_ms": durations[min(len(durations) - 1, int(len(durations) * 0.9))],
+            "max_ms": durations[-1],
+            "timeouts": sum(1 for _, timed_out in settle_times if timed_out),
         }
+        print(f"[=] {self.container_name} settle times: {report}")
+        logging.info(f"{self.container_name} settle times: {report}")
+        return report
 
-        mapped_keys = [mapping.get(key.upper(), mapping.get(key, key)) for key in keys]
-        combo = "+".join(mapped_keys)
-        self._exec(f"DISPLAY={self.display} xdotool key {combo}")
+    def record_action(self, action: str, latency_ms: float) -> None:
+        self.action_latencies.append((action, latency_ms))
+
+    def pop_action_report(self) -> dict:
+        """
+        latency per action type since the last report (count, p50/p90/max in ms), the backend and how texts were
+        entered (enter_text), then start over
+        """
+        action_latencies, self.action_latencies = self.action_latencies, []
+        text_entry_counts, self.text_entry_counts = self.text_entry_counts, {}
+        latencies = {}
+        for action, latency_ms in action_latencies:
+            latencies.setdefault(action, []).append(latency_ms)
+        report = {"backend": self.get_backend(), "text_entry": text_entry_counts}
+        for action, durations in sorted(latencies.items()):
+            durations = sorted(durations)
+            report[action] = {
+                "count": len(durations),
+                "p50_ms": round(durations[len(durations) // 2], 1),
+                "p90_ms": round(durations[min(len(durations) - 1, int(len(durations) * 0.9))], 1),
+                "max_ms": round(durations[-1], 1),
+            }
+        print(f"[=] {self.container_name} action latencies: {report}")
+        logging.info(f"{self.container_name} action latencies: {report}")
+        return report
+
+    def get_backend(self) -> str:
+        """
+        the backend that actually drives the display (after any fallback to xdotool)
+        """
+        return "xdotool"
+
+    def move(self, x: int, y: int) -> None:
+        self._run(f"DISPLAY={self.display} xdotool mousemove {x} {y}")
+
+    KEY_MAPPING = {
+        # Modifier and function keys
+        "ENTER": "Return",
+        "LEFT": "Left",
+        "RIGHT": "Right",
+        "UP": "Up",
+        "DOWN": "Down",
+        "ESC": "Escape",
+        "SPACE": "space",
+        "BACKSPACE": "BackSpace",
+        "TAB": "Tab",
+        "CTRL": "ctrl",
+        "ALT": "alt",
+        "SHIFT": "shift",
+
+        # Punctuation keys (important!)
+        ",": "comma",
+        ".": "period",
+        "/": "slash",
+        ";": "semicolon",
+        "'": "apostrophe",
+        "[": "bracketleft",
+        "]": "bracketright",
+    }
+
+    @staticmethod
+    def map_keys(keys: list[str]) -> list[str]:
+        """
+        CUA key names -> xdotool key names
+        """
+        return [DockerComputer.KEY_MAPPING.get(key.upper(), DockerComputer.KEY_MAPPING.get(key, key)) for key in keys]
+
+    def keypress(self, keys: list[str]) -> None:
+        combo = "+".join(self.map_keys(keys))
+        self._run(f"DISPLAY={self.display} xdotool key {combo}")
 
     def drag(self, path: list[dict[str, int]]) -> None:
         if not path:
             return
         start_x = path[0]["x"]
         start_y = path[0]["y"]
-        self._exec(
-            f"DISPLAY={self.display} xdotool mousemove {start_x} {start_y} mousedown 1"
-        )
+        # the whole gesture in one xdotool command
+        cmd = f"DISPLAY={self.display} xdotool mousemove {start_x} {start_y} mousedown 1"
         for point in path[1:]:
-            self._exec(f"DISPLAY={self.display} xdotool mousemove {point['x']} {point['y']}")
-        self._exec(f"DISPLAY={self.display} xdotool mouseup 1")
+            cmd += f" mousemove {point['x']} {point['y']}"
+        cmd += " mouseup 1"
+        self._run(cmd)
+
+    APP_STATE_SNAPSHOT = "app_state_snapshot.tgz"  # in /tmp, per display (get_tmp_filepath)
+
+    def is_running(self) -> bool:
+        engine = get_docker_engine()
+        if engine is not None:
+            return engine.is_container_running(self.container_name)
+        result = subprocess.run(
+            ["docker", "ps", "-q", "-f", f"name=^{self.container_name}$"],
+            capture_output=True,
+            text=True,
+        )
+        return bool(result.stdout.strip())
+
+    # home folder inside the images
+    CONTAINER_HOME = "/home/myuser"
+    # XDG / Java folders, which move into the display_home when there is one
+    DISPLAY_HOME_STATE_PREFIXES = (".config/", ".local/share/", ".cache/", ".java/")
+
+    def _get_state_dirs(self, app: str) -> str:
+        """
+        the app's user-state folders relative to ~; with a display_home, that folder replaces the XDG / Java ones
+        """
+        state_dirs = APP_STATE_DIRS.get(app, [])
+        if self.display_home and state_dirs:
+            shared_state_dirs = [state_dir for state_dir in state_dirs
+                                 if not state_dir.startswith(self.DISPLAY_HOME_STATE_PREFIXES)]
+            state_dirs = [os.path.relpath(self.display_home, self.CONTAINER_HOME)] + shared_state_dirs
+        return " ".join(shlex.quote(state_dir) for state_dir in state_dirs)
+
+    def snapshot_app_state(self, app: str) -> None:
+        """
+        Tar the app's user-state folders (APP_STATE_DIRS) before the first launch,
+        so that reset_app_state can bring a reused container back to a clean state.
+        """
+        state_dirs = self._get_state_dirs(app)
+        if not state_dirs:
+            return
+        # folders that do not exist yet are skipped, and removed again on reset
+        snapshot = self.get_tmp_filepath(self.APP_STATE_SNAPSHOT)
+        self._exec(f"cd ~ && tar czf {snapshot} --ignore-failed-read {state_dirs} 2>/dev/null || true")
+        print(f"[+] App state snapshot taken: {self.container_name} ({app})")
+
+    def reset_app_state(self, app: str) -> None:
+        """
+        Kill the app and restore its user-state folders from the snapshot, in seconds instead of a new container.
+        The caller relaunches the app (run_single_build skips the build, the build folder is already there).
+        """
+        self.kill_app(APP_PROCESS_PATTERNS.get(app, app))
+        time.sleep(1)
+        state_dirs = self._get_state_dirs(app)
+        if state_dirs:
+            snapshot = self.get_tmp_filepath(self.APP_STATE_SNAPSHOT)
+            self._exec(f"cd ~ && rm -rf {state_dirs} && (test -f {snapshot} && tar xzf {snapshot} || true)")
+        self.running_commit_id = None
+        print(f"[+] App state reset: {self.container_name} ({app})")
 
     def run_single_build(
             self,
@@ -645,18 +1277,20 @@ class DockerComputer:
 
         # ── 0. 尝试杀掉旧实例 ─────────────────────────────────────
         try:
-            self._exec(f"pkill -f {app}")
+            self.kill_app(app)
         except subprocess.CalledProcessError:
             pass
 
         # ── 1. 启动 + 同步等待函数 ────────────────────────────────
-        def _start_and_wait(rev: str, tag: str) -> bool:
+        def _start_and_wait(rev: str, tag: str, persist_dir: str | None = None) -> bool:
             print(f"[INFO] Trying {tag}: {rev}")
 
             # ① 后台启动并回显 PID（\$! 防外层展开）
+            # persist_dir: read-only cache folder holding the build archive, mozregression skips the download
+            persist_opt = f"--persist {persist_dir} " if persist_dir else ""
             pid_cmd = (
-                f"nohup mozregression --launch {rev} --app {app} "
-                f">/tmp/mozreg.log 2>&1 & echo \\$!"
+                f"nohup mozregression --launch {rev} --app {app} {persist_opt}"
+                f">{self.get_tmp_filepath('mozreg.log')} 2>&1 & echo \\$!"
             )
             moz_pid = self._exec(pid_cmd).strip()
             if not re.fullmatch(r"\d+", moz_pid):
@@ -686,18 +1320,64 @@ class DockerComputer:
         # ← If the code resumes 1‑2 seconds before the app’s window is fully drawn,
         #    pass gui_grace=1.0 (or any number of seconds) to wait a little longer
         #    after the GUI process is detected.
-        if commit_id and _start_and_wait(commit_id, "commit_id"):
-            if gui_grace:
-                time.sleep(gui_grace)
-            return True
-        if build_id and _start_and_wait(build_id, "build_id"):
-            if gui_grace:
-                time.sleep(gui_grace)
-            return True
+        for rev, tag in [(commit_id, "commit_id"), (build_id, "build_id")]:
+            if not rev:
+                continue
+            persist_dir = None
+            if USE_MOZ_BUILD_CACHE:
+                moz_build_cache = MozBuildCache.get_shared()
+                persist_dir = moz_build_cache.lookup(rev)
+                if persist_dir is None and (MOZ_BUILD_CACHE_OFFLINE or moz_build_cache.is_unavailable(rev)):
+                    # offline: fail fast instead of downloading; unavailable: mozregression knows no such build
+                    print(f"[!] {tag} {rev} not in the mozregression build cache, skip")
+                    continue
+            if _start_and_wait(rev, tag, persist_dir):
+                # the process is up; its window may still be downloading/unpacking
+                if self.wait_for_app_ready(app, wait_sec) is False:
+                    try:
+                        self.kill_app(app)
+                    except subprocess.CalledProcessError:
+                        pass
+                    continue
+                if gui_grace:
+                    self.settle_after_launch(gui_grace)
+                return True
 
         print("[❌] Both commit_id and build_id failed.")
         return False
 
+    def wait_for_app_ready(self, app: str, wait_sec: float, pid_file: str | None = None) -> bool | None:
+        """
+        Event-driven launch check: block until the app's readiness rule (APP_READINESS_RULES) is met,
+        watching window-manager events inside the container instead of screenshots.
+        True: ready; False: timeout or the process in pid_file exited;
+        None: readiness checks off, no rule or no watcher, use the visual diff.
+        """
+        if not self.use_app_readiness:
+            return None
+        rule = AppReadiness.get_rule(app)
+        if rule is None:
+            return None
+        try:
+            result = AppReadiness.parse_result(
+                self._run(AppReadiness.get_command(rule, wait_sec, pid_file), stdin=READINESS_SCRIPT))
+        except subprocess.CalledProcessError as e:
+            print(f"[!] Readiness watcher failed: {e}")
+            return None
+        if result is None or result["ready"] is None:
+            print(f"[!] Readiness watcher unavailable: {result['reason'] if result else 'no output'}")
+            return None
+        if result["ready"]:
+            print(f"[✅] {app} window {result['window']} after {result['elapsed']}s")
+        else:
+            print(f"[❌] {app} not ready ({result['reason']}) after {result['elapsed']}s")
+        return result["ready"]
+
+    @staticmethod
+    def _diff_ratio_frame(frame_a: Frame, frame_b: Frame, ignore_top: int = 0) -> float:
+        """Return % of pixels that changed between two raw frames."""
+        return frame_a.diff_ratio(frame_b, ignore_top=ignore_top)
+
     def _diff_ratio_b64(self, b64_a: str, b64_b: str, ignore_top: int = 0) -> float:
         """Return % of pixels that changed between two base64 PNGs."""
         img_a = Image.open(io.BytesIO(base64.b64decode(b64_a))).convert("RGB")
@@ -753,7 +1433,7 @@ class DockerComputer:
 
         # ---- Step 1: Clean up any old app processes ----
         try:
-            self._exec(f"pkill -f {app}")
+            self.kill_app(app)
         except subprocess.CalledProcessError:
             pass  # Ignore if no process found
 
@@ -777,26 +1457,34 @@ class DockerComputer:
 
         # ---- Step 4: start app + wait for GUI diff ----
         print("[INFO] Capturing baseline screenshot before launching app ...")
-        baseline_b64 = self.screenshot()
+        baseline_frame = self.screenshot_frame()
 
-        pid_file = "/tmp/app_pid.txt"
-        start_cmd = f"cd {project_dir} && nohup yarn start >/tmp/app_run.log 2>&1 & echo $! > {pid_file}"
+        pid_file = self.get_tmp_filepath("app_pid.txt")
+        start_cmd = (f"cd {project_dir} && nohup yarn start >{self.get_tmp_filepath('app_run.log')} 2>&1 "
+                     f"& echo \\$! > {pid_file}")
         self._exec(start_cmd)
 
+        is_ready = self.wait_for_app_ready(app, wait_sec, pid_file=pid_file)
+        if is_ready is not None:
+            if is_ready:
+                self.settle_after_launch(gui_grace)
+                print("[✅] Desktop build and GUI launch completed successfully.")
+            return is_ready
+
         print(f"[INFO] Waiting up to {wait_sec}s for {app} GUI to appear (visual diff)...")
         start_time = time.time()
         threshold_pct = 0.5  # 0.5% 像素变化阈值
         ignore_top_px = 60  # 忽略顶部 60px（时钟/系统栏）
 
         while time.time() - start_time < wait_sec:
-            curr_b64 = self.screenshot()
-            pct = self._diff_ratio_b64(baseline_b64, curr_b64, ignore_top=ignore_top_px)
+            curr_frame = self.screenshot_frame()
+            pct = self._diff_ratio_frame(baseline_frame, curr_frame, ignore_top=ignore_top_px)
 
             if pct >= threshold_pct:
                 elapsed = int(time.time() - start_time)
                 print(f"[✅] Visual change {pct:.3f}% (> {threshold_pct}%) after {elapsed}s — GUI visible.")
-                print(f"[INFO] Waiting {gui_grace}s for stabilization ...")
-                time.sleep(gui_grace)
+                print(f"[INFO] Waiting up to {gui_grace}s for stabilization ...")
+                self.settle_after_launch(gui_grace)
                 print("[✅] Desktop build and GUI launch completed successfully.")
                 return True
 
@@ -842,7 +1530,7 @@ class DockerComputer:
 
         # ---- Step 0: Clean up any old app processes ----
         try:
-            self._exec(f"pkill -f code-oss")
+            self.kill_app("code-oss")
         except subprocess.CalledProcessError:
             pass  # Ignore if no process found
 
@@ -936,7 +1624,7 @@ class DockerComputer:
         # ---- Step 0: Clean up any old app processes ----
         try:
             # Attempt to kill the Zettlr process (or Electron/code-oss fallback)
-            self._exec(f"pkill -f Zettlr")
+            self.kill_app("Zettlr")
             # Delete the main configuration file (config.json)
             # This resets all user settings, window layout, and the workspace list.
             # self._exec("rm -f ~/.config/Zettlr/config.json")
@@ -1041,7 +1729,7 @@ class DockerComputer:
         # ---- Step 0: Clean up any old app processes ----
         try:
             # Kill the running process
-            self._exec(f"pkill -f {app}")
+            self.kill_app(app)
 
             # Remove Godot config folder
             # Clear the specific project list file (project_list.cfg) and the 'projects' directory (where Godot 4+ might store project data).
@@ -1152,7 +1840,7 @@ class DockerComputer:
         # ---- Step 0: Clean up any old app processes ----
         try:
             # Kill the running process
-            self._exec(f"pkill -f JabRef")
+            self.kill_app("JabRef")
 
             # Remove config folder
             # # Clear the specific project list file
@@ -1226,27 +1914,36 @@ class DockerComputer:
     def _run_vscode_gui_check(self, build_dst: str, app: str, wait_sec: int, poll_int: int, gui_grace: float) -> bool:
         """Run visual diff to verify GUI startup."""
         print("[INFO] Capturing baseline screenshot before launch ...")
-        baseline_b64 = self.screenshot()
+        baseline_frame = self.screenshot_frame()
 
-        pid_file = "/tmp/app_pid.txt"
+        pid_file = self.get_tmp_filepath("app_pid.txt")
 
-        start_cmd = f"cd {build_dst} && nohup ./{app} >/tmp/app_run.log 2>&1 & echo $! > {pid_file}"
+        start_cmd = (f"cd {build_dst} && nohup ./{app} >{self.get_tmp_filepath('app_run.log')} 2>&1 "
+                     f"& echo \\$! > {pid_file}")
         self._exec(start_cmd)
 
+        print(f"[INFO] Waiting up to {wait_sec}s for {app} window ...")
+        is_ready = self.wait_for_app_ready(app, wait_sec, pid_file=pid_file)
+        if is_ready is not None:
+            if is_ready:
+                self.settle_after_launch(gui_grace)
+                print(f"[✅] {app} build and GUI launch completed successfully.")
+            return is_ready
+
         print(f"[INFO] Waiting up to {wait_sec}s for {app} GUI to appear (visual diff)...")
         start_time = time.time()
         threshold_pct = 0.5
         ignore_top_px = 60
 
         while time.time() - start_time < wait_sec:
-            curr_b64 = self.screenshot()
-            pct = self._diff_ratio_b64(baseline_b64, curr_b64, ignore_top=ignore_top_px)
+            curr_frame = self.screenshot_frame()
+            pct = self._diff_ratio_frame(baseline_frame, curr_frame, ignore_top=ignore_top_px)
 
             if pct >= threshold_pct:
                 elapsed = int(time.time() - start_time)
                 print(f"[✅] Visual change {pct:.3f}% (> {threshold_pct}%) after {elapsed}s — GUI visible.")
-                print(f"[INFO] Waiting {gui_grace}s for stabilization ...")
-                time.sleep(gui_grace)
+                print(f"[INFO] Waiting up to {gui_grace}s for stabilization ...")
+                self.settle_after_launch(gui_grace)
                 print(f"[✅] {app} build and GUI launch completed successfully.")
                 return True
 
@@ -1256,6 +1953,584 @@ class DockerComputer:
         return False
 
 
+class VncDockerComputer(DockerComputer):
+    """
+    DockerComputer that drives its display through the display's VNC server (RfbClient on the host port of
+    port_mapping) instead of xdotool / xwd in the container: input events go over the protocol, a screenshot is
+    a copy of the client's framebuffer and settle detection counts the pixels the server's updates changed.
+    Launching apps and resetting their state still run as commands in the container.
+    Falls back to the xdotool backend if the VNC server cannot be reached (or no DES library is installed),
+    and per call for what RFB cannot express (keys without a keysym, text outside Latin-1).
+    """
+
+    BUTTON_MASKS = {"left": RfbClient.LEFT_BUTTON, "middle": RfbClient.MIDDLE_BUTTON, "right": RfbClient.RIGHT_BUTTON}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.use_vnc = True
+        self.vnc_client = None
+        self.vnc_lock = threading.Lock()
+
+    def get_vnc_port(self) -> int:
+        return int(self.port_mapping.split(":")[0])
+
+    def get_backend(self) -> str:
+        return "vnc" if self.use_vnc else "xdotool"
+
+    def _get_vnc_client(self) -> RfbClient | None:
+        """
+        the connected client, (re)connecting if needed; None once fallen back to xdotool
+        """
+        with self.vnc_lock:
+            if not self.use_vnc:
+                return None
+            if self.vnc_client is not None and self.vnc_client.is_alive():
+                return self.vnc_client
+            if self.vnc_client is not None:
+                print(f"[!] VNC connection to {self.container_name} lost ({self.vnc_client.error}), reconnect")
+                self.vnc_client.close()
+            try:
+                self.vnc_client = RfbClient.connect(VNC_HOST, self.get_vnc_port(), password=VNC_PASSWORD,
+                                                    timeout=VNC_CONNECT_TIMEOUT)
+                print(f"[+] VNC connected: {self.container_name} {self.display} "
+                      f"({self.vnc_client.width}x{self.vnc_client.height})")
+            except RfbError as e:
+                print(f"[!] {e}, fall back to xdotool")
+                self.use_vnc = False
+                self.vnc_client = None
+            return self.vnc_client
+
+    def close_agent(self) -> None:
+        """
+        also the VNC connection
+        """
+        super().close_agent()
+        with self.vnc_lock:
+            if self.vnc_client is not None:
+                self.vnc_client.close()
+                self.vnc_client = None
+
+    def screenshot_frame(self) -> Frame:
+        client = self._get_vnc_client()
+        if client is None:
+            return super().screenshot_frame()
+        return Frame(client.get_pixels())
+
+    def screenshot(self) -> str:
+        if self._get_vnc_client() is None:
+            return super().screenshot()
+        return self.screenshot_frame().to_base64()
+
+    def _wait_for_stable_screen(self, start_time: float, timeout_ms: int, stable_ms: int, poll_ms: int,
+                                threshold_pct: float, ignore_top: int) -> tuple[Frame, float, bool]:
+        """
+        Same measure as DockerComputer's, from the pixels the VNC updates of each poll interval changed
+        instead of comparing captured frames; only the last frame is copied.
+        """
+        client = self._get_vnc_client()
+        if client is None:
+            return super()._wait_for_stable_screen(start_time, timeout_ms, stable_ms, poll_ms, threshold_pct,
+                                                   ignore_top)
+        serial = client.serial
+        stable_since = time.time()
+        last_change_at = start_time
+        timed_out = False
+        while (time.time() - stable_since) * 1000 < stable_ms:
+            if (time.time() - start_time) * 1000 >= timeout_ms:
+                timed_out = True
+                break
+            time.sleep(poll_ms / 1000)
+            changed_pixels, serial = client.get_changed_pixels(serial, ignore_top=ignore_top)
+            total_pixels = max(client.width * (client.height - ignore_top), 1)
+            if changed_pixels / total_pixels * 100.0 > threshold_pct:
+                stable_since = time.time()
+                last_change_at = stable_since
+        return self.screenshot_frame(), last_change_at, timed_out
+
+    def click(self, x: int, y: int, button: str = "left") -> None:
+        client = self._get_vnc_client()
+        if client is None:
+            return super().click(x, y, button)
+        client.click(x, y, self.BUTTON_MASKS.get(button, RfbClient.LEFT_BUTTON))
+
+    def long_click(self, x: int, y: int, duration: float = 1.0, button: str = "left") -> None:
+        client = self._get_vnc_client()
+        if client is None:
+            return super().long_click(x, y, duration, button)
+        client.send(client.get_pointer_event(x, y),
+                    client.get_pointer_event(x, y, self.BUTTON_MASKS.get(button, RfbClient.LEFT_BUTTON)))
+        time.sleep(duration)
+        client.send(client.get_pointer_event(x, y))
+
+    def double_click(self, x: int, y: int) -> None:
+        client = self._get_vnc_client()
+        if client is None:
+            return super().double_click(x, y)
+        client.click(x, y, repeat=2)
+
+    def triple_click(self, x: int, y: int) -> None:
+        client = self._get_vnc_client()
+        if client is None:
+            return super().triple_click(x, y)
+        client.click(x, y, repeat=3)
+
+    def scroll(self, x: int, y: int, scroll_x: int, scroll_y: int) -> None:
+        """
+        vertical wheel ticks only, as the xdotool backend
+        """
+        client = self._get_vnc_client()
+        if client is None:
+            return super().scroll(x, y, scroll_x, scroll_y)
+        client.click(x, y, RfbClient.WHEEL_UP if scroll_y < 0 else RfbClient.WHEEL_DOWN, repeat=abs(scroll_y))
+
+    def move(self, x: int, y: int) -> None:
+        client = self._get_vnc_client()
+        if client is None:
+            return super().move(x, y)
+        client.send(client.get_pointer_event(x, y))
+
+    def drag(self, path: list[dict[str, int]]) -> None:
+        client = self._get_vnc_client()
+        if client is None or not path:
+            return super().drag(path)
+        start_x, start_y = path[0]["x"], path[0]["y"]
+        events = [client.get_pointer_event(start_x, start_y),
+                  client.get_pointer_event(start_x, start_y, RfbClient.LEFT_BUTTON)]
+        for point in path[1:]:
+            events.append(client.get_pointer_event(point["x"], point["y"], RfbClient.LEFT_BUTTON))
+        events.append(client.get_pointer_event(path[-1]["x"], path[-1]["y"]))
+        client.send(*events)
+
+    def keypress(self, keys: list[str]) -> None:
+        client = self._get_vnc_client()
+        keysyms = [Keysyms.get_keysym(key) for key in self.map_keys(keys)]
+        if client is None or None in keysyms:
+            return super().keypress(keys)
+        client.key_combo(keysyms)
+
+    def type(self, text: str) -> None:
+        """
+        Latin-1 text (x11vnc has a keycode for each of its keysyms), anything else through xdotool,
+        which remaps keycodes for the characters the keyboard map lacks
+        """
+        client = self._get_vnc_client()
+        if client is None or any(ord(char) >= 0x100 for char in text):
+            return super().type(text)
+        client.type_keysyms([Keysyms.get_char_keysym(char) for char in text])
+
+
+class XTestDockerComputer(DockerComputer):
+    """
+    DockerComputer that injects input with the XTest extension from one persistent process per display
+    (XTestInput, python-xlib in the container) instead of an xdotool process per action: a click is one line
+    over a pipe, and a long text is typed by the same process without a spawn per chunk.
+    Screenshots and app launch are unchanged. Falls back to xdotool if the process cannot run (e.g. an image
+    built before python3-xlib was added to the base images).
+    """
+
+    BUTTONS = {"left": 1, "middle": 2, "right": 3}
+    WHEEL_UP = 4
+    WHEEL_DOWN = 5
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.use_xtest = True
+        self.xtest = None
+
+    def get_backend(self) -> str:
+        return "xtest" if self.use_xtest else "xdotool"
+
+    def _send_input(self, events: list[list]) -> bool:
+        """
+        inject events, False (caller uses xdotool) once XTest is unavailable
+        an action that failed halfway is not replayed with xdotool, that would repeat the events already injected
+        """
+        if not self.use_xtest:
+            return False
+        try:
+            if self.xtest is None:
+                self.xtest = XTestInput(self.container_name, self.get_env())
+            self.xtest.send(events)
+            return True
+        except XTestInputError as e:
+            self.use_xtest = False
+            self.close_xtest()
+            if e.injected == 0:
+                print(f"[!] {e}, fall back to xdotool")
+                return False
+            print(f"[!] {e} after {'some' if e.injected is None else e.injected} input events, "
+                  f"xdotool from the next action on")
+            return True
+
+    def close_xtest(self) -> None:
+        if self.xtest is not None:
+            self.xtest.close()
+            self.xtest = None
+
+    def close_agent(self) -> None:
+        """
+        also the XTest input process
+        """
+        super().close_agent()
+        self.close_xtest()
+
+    @staticmethod
+    def get_click_events(x: int, y: int, button: int, repeat: int = 1) -> list[list]:
+        return [["move", x, y]] + [["button", button, down] for _ in range(repeat) for down in (1, 0)]
+
+    def click(self, x: int, y: int, button: str = "left") -> None:
+        if not self._send_input(self.get_click_events(x, y, self.BUTTONS.get(button, 1))):
+            super().click(x, y, button)
+
+    def long_click(self, x: int, y: int, duration: float = 1.0, button: str = "left") -> None:
+        b = self.BUTTONS.get(button, 1)
+        if not self._send_input([["move", x, y], ["button", b, 1], ["sleep", int(duration * 1000)], ["button", b, 0]]):
+            super().long_click(x, y, duration, button)
+
+    def double_click(self, x: int, y: int) -> None:
+        if not self._send_input(self.get_click_events(x, y, 1, repeat=2)):
+            super().double_click(x, y)
+
+    def triple_click(self, x: int, y: int) -> None:
+        if not self._send_input(self.get_click_events(x, y, 1, repeat=3)):
+            super().triple_click(x, y)
+
+    def scroll(self, x: int, y: int, scroll_x: int, scroll_y: int) -> None:
+        """
+        vertical wheel ticks only, as the xdotool backend
+        """
+        button = self.WHEEL_UP if scroll_y < 0 else self.WHEEL_DOWN
+        if not self._send_input(self.get_click_events(x, y, button, repeat=abs(scroll_y))):
+            super().scroll(x, y, scroll_x, scroll_y)
+
+    def move(self, x: int, y: int) -> None:
+        if not self._send_input([["move", x, y]]):
+            super().move(x, y)
+
+    def drag(self, path: list[dict[str, int]]) -> None:
+        if not path:
+            return
+        events = [["move", path[0]["x"], path[0]["y"]], ["button", 1, 1]]
+        events += [["move", point["x"], point["y"]] for point in path[1:]]
+        events.append(["button", 1, 0])
+        if not self._send_input(events):
+            super().drag(path)
+
+    def keypress(self, keys: list[str]) -> None:
+        keysyms = [Keysyms.get_keysym(key) for key in self.map_keys(keys)]
+        if None in keysyms or not self._send_input([["key", keysym, 1] for keysym in keysyms]
+                                                   + [["key", keysym, 0] for keysym in reversed(keysyms)]):
+            super().keypress(keys)
+
+    def type(self, text: str) -> None:
+        if not self._send_input([["text", [Keysyms.get_char_keysym(char) for char in text], XTEST_KEY_DELAY_MS]]):
+            super().type(text)
+
+
+class DockerComputerSlot:
+    """
+    One isolated place to run a DockerComputer: its own container name, host VNC port and X display.
+    With a SharedContainer, the slot is one of several displays of that container instead.
+    """
+
+    def __init__(self, index: int,
+                 name_prefix: str = DOCKER_COMPUTER_NAME,
+                 base_vnc_port: int = DOCKER_COMPUTER_VNC_PORT,
+                 base_display_num: int = DOCKER_COMPUTER_DISPLAY_NUM,
+                 displays_per_container: int = 1,
+                 container: "SharedContainer | None" = None):
+        self.index = index
+        self.container_name = f"{name_prefix}-{index // displays_per_container}"
+        self.vnc_port = base_vnc_port + index
+        self.display = f":{base_display_num + index}"
+        # 0: the container's own display (started by its CMD), else an extra one started by DisplayServer
+        self.display_index = index % displays_per_container
+        self.container = container
+
+    @property
+    def port_mapping(self) -> str:
+        # the VNC server of display k listens on 5900 + k inside the container
+        return f"{self.vnc_port}:{DOCKER_COMPUTER_VNC_PORT + self.display_index}"
+
+    def run_from_image(self, image: str) -> DockerComputer:
+        if self.container is not None:
+            return self.container.run_display(self, image)
+        return DockerComputer.get_class().run_from_image(image=image, name=self.container_name,
+                                                         display=self.display, port_mapping=self.port_mapping)
+
+    def __repr__(self):
+        return f"DockerComputerSlot(container_name={self.container_name}, vnc_port={self.vnc_port}, display={self.display})"
+
+
+class SharedContainer:
+    """
+    One container hosting the displays of several DockerComputerSlot, each with its own Xvfb, window manager,
+    VNC server, app instance and per-display home (XDG / Java folders, see DockerComputer.get_env).
+    The container is (re)created when it is not running or none of its other displays is in use, as a
+    single-display slot would; while one is, a display is reused in the running container (same image only),
+    after killing what the previous scenario launched on it and wiping its home.
+    """
+
+    DISPLAY_HOMES_DIR = f"{DockerComputer.CONTAINER_HOME}/.displays"
+
+    def __init__(self, name: str):
+        self.name = name
+        self.slots = []
+        self.image = None
+        self.leased_indexes = set()
+        # leased slots whose display runs in the current container; a leased slot may not have started yet
+        self.started_indexes = set()
+        self.lock = threading.Lock()
+
+    def lease(self, slot: DockerComputerSlot) -> None:
+        with self.lock:
+            self.leased_indexes.add(slot.index)
+
+    def release(self, slot: DockerComputerSlot) -> None:
+        with self.lock:
+            self.leased_indexes.discard(slot.index)
+            self.started_indexes.discard(slot.index)
+
+    def get_display_home(self, slot: DockerComputerSlot) -> str:
+        return f"{self.DISPLAY_HOMES_DIR}/{slot.display.lstrip(':')}"
+
+    def run_display(self, slot: DockerComputerSlot, image: str) -> DockerComputer:
+        primary_slot = self.slots[0]
+        with self.lock:
+            busy_indexes = self.started_indexes - {slot.index}
+            is_running = DockerComputer(container_name=self.name).is_running()
+            if busy_indexes and is_running and self.image != image:
+                raise RuntimeError(f"{self.name} runs {self.image} for slots {sorted(busy_indexes)}, "
+                                   f"cannot switch it to {image}")
+            is_fresh = not busy_indexes or not is_running
+            if is_fresh:
+                extra_port_mappings = [one_slot.port_mapping for one_slot in self.slots[1:]]
+                DockerComputer.run_from_image(image=image, name=self.name, display=primary_slot.display,
+                                              port_mapping=primary_slot.port_mapping,
+                                              extra_port_mappings=extra_port_mappings)
+                self.image = image
+                self.started_indexes = set()
+            self.started_indexes.add(slot.index)
+        computer = DockerComputer.get_class()(container_name=self.name, image=image, display=slot.display,
+                                              port_mapping=slot.port_mapping, display_home=self.get_display_home(slot))
+        computer.start_display(DOCKER_COMPUTER_VNC_PORT + slot.display_index, start=slot.display_index > 0,
+                               reset=not is_fresh)
+        return computer
+
+
+class DockerComputerPool:
+    """
+    A fixed pool of DockerComputerSlot leased to test scenarios, so that up to `size`
+    scenarios can run at once on a host without fighting over the container name or VNC port.
+    displays_per_container > 1: consecutive slots are displays of one SharedContainer instead of
+    containers of their own (a lockstep lease of 2 can get both builds in one container).
+    """
+
+    def __init__(self, size: int = 1,
+                 name_prefix: str = DOCKER_COMPUTER_NAME,
+                 base_vnc_port: int = DOCKER_COMPUTER_VNC_PORT,
+                 base_display_num: int = DOCKER_COMPUTER_DISPLAY_NUM,
+                 displays_per_container: int = DISPLAYS_PER_CONTAINER):
+        if size < 1:
+            raise ValueError(f"Pool size must be >= 1, got {size}")
+        self.size = size
+        displays_per_container = max(1, min(displays_per_container, size))
+        containers = {}
+        self.all_slots = []
+        for index in range(size):
+            container = None
+            if displays_per_container > 1:
+                container_name = f"{name_prefix}-{index // displays_per_container}"
+                container = containers.setdefault(container_name, SharedContainer(container_name))
+            slot = DockerComputerSlot(index, name_prefix=name_prefix, base_vnc_port=base_vnc_port,
+                                      base_display_num=base_display_num, displays_per_container=displays_per_container,
+                                      container=container)
+            if container is not None:
+                container.slots.append(slot)
+            self.all_slots.append(slot)
+        self.free_slots = list(self.all_slots)
+        self.condition = threading.Condition()
+
+    @contextmanager
+    def lease(self, count: int = 1, timeout: float | None = None):
+        """
+        Block until `count` slots are free, hand them out, and give them back afterwards.
+        Slots are taken all at once, so scenarios that need several slots (e.g., lockstep) never deadlock.
 
+        :return: a DockerComputerSlot if count == 1, else a list of them
+        """
+        if count > self.size:
+            raise ValueError(f"Cannot lease {count} slots from a pool of {self.size}")
+        with self.condition:
+            if not self.condition.wait_for(lambda: len(self.free_slots) >= count, timeout=timeout):
+                raise TimeoutError(f"No {count} free DockerComputer slots after {timeout}s")
+            slots = [self.free_slots.pop(0) for _ in range(count)]
+            for slot in slots:
+                if slot.container is not None:
+                    slot.container.lease(slot)
+        print(f"[+] Leased {slots}")
+        try:
+            yield slots[0] if count == 1 else slots
+        finally:
+            with self.condition:
+                for slot in slots:
+                    if slot.container is not None:
+                        slot.container.release(slot)
+                self.free_slots.extend(slots)
+                self.condition.notify_all()
+            print(f"[-] Released {slots}")
+
+    def close(self) -> None:
+        """
+        Remove every container started by this pool.
+        """
+        for container_name in dict.fromkeys(slot.container_name for slot in self.all_slots):
+            DockerComputer.stop_and_remove(container_name)
+
+
+class WarmComputerPool:
+    """
+    Standby containers with the app already launched to its initial window, per (image, commit).
+    Play and Replay take one in seconds instead of `docker run` + run_single_build; a used container
+    is discarded (its app state is dirty) and a fresh one is warmed up in the background.
+    `docker commit` cannot keep the running Xvfb/app processes, hence standby containers instead of snapshots.
+    """
+
+    def __init__(self, size: int = 1,
+                 name_prefix: str = f"{DOCKER_COMPUTER_NAME}-warm",
+                 base_vnc_port: int = WARM_POOL_VNC_PORT,
+                 base_display_num: int = DOCKER_COMPUTER_DISPLAY_NUM,
+                 capacity: int | None = None,
+                 wait_timeout: float = WARM_POOL_WAIT_TIMEOUT):
+        """
+        size: standby containers per (image, commit)
+        capacity: max containers of this pool, standby + handed out (default: 4 * size, i.e. before/after
+                  versions standing by while the previous ones are still in use)
+        wait_timeout: how long take() waits for a container that is still warming up before giving up
+        """
+        self.size = size
+        self.capacity = capacity or 4 * size
+        self.wait_timeout = wait_timeout
+        self.free_slots = [DockerComputerSlot(index, name_prefix=name_prefix, base_vnc_port=base_vnc_port,
+                                              base_display_num=base_display_num)
+                           for index in range(self.capacity)]
+        self.slots = {}  # container_name -> slot, for every container of this pool
+        self.standby = {}  # (image, commit_id) -> [DockerComputer]
+        self.warming = {}  # (image, commit_id) -> number of containers warming up
+        self.targets = {}  # (image, commit_id) -> (build_id, app)
+        self.condition = threading.Condition()
+        self.warm_executor = ThreadPoolExecutor(max_workers=self.capacity)
+        self.hit_count = 0
+        self.miss_count = 0
+
+    def prewarm(self, image: str, versions: list[tuple[str, str | None]], app: str) -> None:
+        """
+        keep `size` containers standing by for each (commit_id, build_id) of versions,
+        and drop the standby containers of any other target (e.g., the previous PR)
+        """
+        targets = {(image, commit_id): (build_id, app) for commit_id, build_id in versions}
+        with self.condition:
+            stale_computers = []
+            for key in list(self.standby.keys()):
+                if key not in targets:
+                    stale_computers.extend(self.standby.pop(key))
+            self.targets = targets
+        for computer in stale_computers:
+            self.discard(computer)
+        for key in targets:
+            self._top_up(key)
+
+    def _top_up(self, key) -> None:
+        with self.condition:
+            if key not in self.targets:
+                return
+            missing = self.size - len(self.standby.get(key, [])) - self.warming.get(key, 0)
+            slots = []
+            for _ in range(max(missing, 0)):
+                if not self.free_slots:
+                    break
+                slots.append(self.free_slots.pop(0))
+            self.warming[key] = self.warming.get(key, 0) + len(slots)
+        for slot in slots:
+            self.warm_executor.submit(self._warm, key, slot)
+
+    def _warm(self, key, slot: DockerComputerSlot) -> None:
+        image, commit_id = key
+        computer = None
+        try:
+            with self.condition:
+                build_id, app = self.targets.get(key, (None, None))
+            if app is None:
+                return
+            computer = slot.run_from_image(image)
+            with self.condition:
+                self.slots[computer.container_name] = slot
+            if computer.run_single_build(commit_id=commit_id, build_id=build_id, app=app):
+                computer.running_commit_id = commit_id
+                with self.condition:
+                    if key in self.targets:
+                        self.standby.setdefault(key, []).append(computer)
+                        computer = None
+                print(f"[+] Warm container ready: {slot.container_name} ({app} {commit_id})")
+        except Exception as e:
+            print(f"[!] Warm-up failed on {slot.container_name}: {e}")
+        finally:
+            with self.condition:
+                self.warming[key] -= 1
+                if computer is None and slot.container_name not in self.slots:
+                    self.free_slots.append(slot)
+                self.condition.notify_all()
+            if computer is not None:
+                # no refill here, a build that fails to launch would be retried forever
+                self.discard(computer, refill=False)
+
+    def take(self, image: str, commit_id: str) -> DockerComputer | None:
+        """
+        a warm container running commit_id, or None (caller cold-starts) if none is ready in time
+        """
+        key = (image, commit_id)
+        with self.condition:
+            self.condition.wait_for(lambda: self.standby.get(key) or not self.warming.get(key),
+                                    timeout=self.wait_timeout)
+            computer = self.standby[key].pop(0) if self.standby.get(key) else None
+            if computer is None:
+                self.miss_count += 1
+            else:
+                self.hit_count += 1
+        self._top_up(key)
+        if computer is not None:
+            print(f"[+] Warm container taken: {computer.container_name} ({commit_id})")
+        return computer
 
+    def owns(self, computer: DockerComputer) -> bool:
+        with self.condition:
+            return computer is not None and computer.container_name in self.slots
 
+    def discard(self, computer: DockerComputer, refill: bool = True) -> None:
+        """
+        remove a container of this pool and free its slot for the next warm-up
+        """
+        computer.close_agent()
+        DockerComputer.stop_and_remove(computer.container_name)
+        with self.condition:
+            slot = self.slots.pop(computer.container_name, None)
+            if slot is not None:
+                self.free_slots.append(slot)
+                self.condition.notify_all()
+        if refill:
+            with self.condition:
+                keys = list(self.targets.keys())
+            for key in keys:
+                self._top_up(key)
+
+    def close(self) -> None:
+        with self.condition:
+            self.targets = {}
+        self.warm_executor.shutdown(wait=True)
+        with self.condition:
+            container_names = list(self.slots.keys())
+            self.slots = {}
+            self.standby = {}
+        for container_name in container_names:
+            DockerComputer.stop_and_remove(container_name)
+        print(f"[=] Warm pool hits: {self.hit_count}, misses: {self.miss_count}")
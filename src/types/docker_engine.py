@@ -0,0 +1,330 @@
+import http.client
+import json
+import socket
+import struct
+import threading
+import time
+from urllib.parse import quote, urlencode
+
+from config import DOCKER_SOCKET_PATH, DOCKER_ENGINE_API_VERSION
+
+
+class DockerEngineError(RuntimeError):
+    """
+    Non-2xx answer of the Docker Engine API: status code plus the daemon's message.
+    """
+
+    def __init__(self, status, message, method=None, path=None):
+        super().__init__(f"{method} {path}: {status} {message}")
+        self.status = status
+        self.message = message
+        self.method = method
+        self.path = path
+
+
+class DockerEngineNotFound(DockerEngineError):
+    """
+    404: no such image / container / exec instance
+    """
+
+
+class DockerEngineUnavailable(DockerEngineError):
+    """
+    The socket is missing or refuses connections; callers fall back to the docker CLI.
+    """
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, socket_path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class DockerEngine:
+    """
+    Thin Docker Engine API client over the local unix socket, used instead of spawning the docker CLI
+    for image checks, container run/rm and exec.
+    - one keep-alive connection per thread
+    - exec output is demultiplexed from the attach stream, optionally fed with stdin
+    - image existence is cached (positive answers only, images appear but are not removed behind our back)
+    Works against any server on socket_path, e.g. a fake one in a test.
+    """
+
+    # attach stream frame header: stream type (1 stdout, 2 stderr), 3 zero bytes, big-endian payload size
+    STREAM_HEADER = struct.Struct(">BxxxI")
+    STDOUT = 1
+    STDERR = 2
+
+    shared_engines = {}
+    shared_engines_lock = threading.Lock()
+
+    def __init__(self, socket_path=DOCKER_SOCKET_PATH, api_version=DOCKER_ENGINE_API_VERSION, timeout=None):
+        self.socket_path = socket_path
+        self.api_version = api_version
+        self.timeout = timeout
+        self.local = threading.local()
+        self.image_cache = set()
+        self.image_cache_lock = threading.Lock()
+        self.available = None
+
+    @staticmethod
+    def get_shared(socket_path=DOCKER_SOCKET_PATH):
+        with DockerEngine.shared_engines_lock:
+            if socket_path not in DockerEngine.shared_engines:
+                DockerEngine.shared_engines[socket_path] = DockerEngine(socket_path)
+            return DockerEngine.shared_engines[socket_path]
+
+    def is_available(self):
+        """
+        whether the daemon answers on the socket, checked once
+        """
+        if self.available is None:
+            try:
+                self.ping()
+                self.available = True
+            except DockerEngineError as e:
+                print(f"[!] Docker Engine API unavailable, use the docker CLI: {e}")
+                self.available = False
+        return self.available
+
+    # http ############################################################################################################
+    def _get_connection(self):
+        if getattr(self.local, "connection", None) is None:
+            self.local.connection = UnixHTTPConnection(self.socket_path, timeout=self.timeout)
+        return self.local.connection
+
+    def _drop_connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection.close()
+        self.local.connection = None
+
+    def _get_url(self, path, query=None):
+        url = f"/{self.api_version}{path}"
+        if query:
+            url += "?" + urlencode(query)
+        return url
+
+    @staticmethod
+    def _raise_for_status(status, payload, method, path):
+        if status < 400:
+            return
+        try:
+            message = json.loads(payload).get("message", "")
+        except (ValueError, AttributeError):
+            message = payload.decode("utf-8", errors="ignore") if isinstance(payload, bytes) else str(payload)
+        error_class = DockerEngineNotFound if status == 404 else DockerEngineError
+        raise error_class(status, message, method, path)
+
+    def _request(self, method, path, body=None, query=None):
+        """
+        JSON body in, parsed JSON (or None) out; a daemon that closed the keep-alive connection is retried once
+        """
+        url = self._get_url(path, query)
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        for attempt in range(2):
+            connection = self._get_connection()
+            try:
+                connection.request(method, url, body=data, headers=headers)
+                response = connection.getresponse()
+                payload = response.read()
+                break
+            except (http.client.RemoteDisconnected, http.client.CannotSendRequest, BrokenPipeError,
+                    ConnectionResetError) as e:
+                self._drop_connection()
+                if attempt == 1:
+                    raise DockerEngineUnavailable(None, str(e), method, path)
+            except OSError as e:
+                self._drop_connection()
+                raise DockerEngineUnavailable(None, str(e), method, path)
+        self._raise_for_status(response.status, payload, method, path)
+        if not payload:
+            return None
+        if response.getheader("Content-Type", "").startswith("application/json"):
+            return json.loads(payload)
+        return payload.decode("utf-8", errors="ignore")
+
+    # images ##########################################################################################################
+    def ping(self):
+        return self._request("GET", "/_ping")
+
+    def image_exists(self, image_name):
+        with self.image_cache_lock:
+            if image_name in self.image_cache:
+                return True
+        try:
+            self._request("GET", f"/images/{quote(image_name, safe='')}/json")
+        except DockerEngineNotFound:
+            return False
+        self.add_image(image_name)
+        return True
+
+    def add_image(self, image_name):
+        with self.image_cache_lock:
+            self.image_cache.add(image_name)
+
+    def forget_image(self, image_name):
+        with self.image_cache_lock:
+            self.image_cache.discard(image_name)
+
+    def inspect_image(self, image_name):
+        return self._request("GET", f"/images/{quote(image_name, safe='')}/json")
+
+    def list_images(self):
+        return self._request("GET", "/images/json") or []
+
+    def remove_image(self, image_name):
+        """
+        untag / delete image_name; 409 (DockerEngineError) while a container still uses it
+        """
+        self._request("DELETE", f"/images/{quote(image_name, safe='')}")
+        self.forget_image(image_name)
+
+    def list_container_images(self):
+        """
+        image names of all containers, running or stopped
+        """
+        return {container["Image"] for container in self._request("GET", "/containers/json", query={"all": 1}) or []}
+
+    # containers ######################################################################################################
+    @staticmethod
+    def get_port_bindings(port_mapping):
+        """
+        "5901:5900" (host:container), or a list of them -> ExposedPorts, PortBindings
+        """
+        exposed_ports, port_bindings = {}, {}
+        for one_port_mapping in [port_mapping] if isinstance(port_mapping, str) else port_mapping:
+            host_port, container_port = one_port_mapping.split(":")
+            exposed_ports[f"{container_port}/tcp"] = {}
+            port_bindings[f"{container_port}/tcp"] = [{"HostPort": host_port}]
+        return exposed_ports, port_bindings
+
+    def run_container(self, image, name, env=None, port_mapping=None, auto_remove=False, volumes=None):
+        """
+        volumes: bind mounts as for `docker run -v`, "host path:container path[:ro]"
+        """
+        exposed_ports, port_bindings = self.get_port_bindings(port_mapping) if port_mapping else ({}, {})
+        body = {
+            "Image": image,
+            "Env": [f"{key}={value}" for key, value in (env or {}).items()],
+            "ExposedPorts": exposed_ports,
+            "HostConfig": {"PortBindings": port_bindings, "AutoRemove": auto_remove, "Binds": list(volumes or [])},
+        }
+        container_id = self._request("POST", "/containers/create", body=body, query={"name": name})["Id"]
+        self._request("POST", f"/containers/{container_id}/start")
+        return container_id
+
+    def remove_container(self, name, force=True):
+        """
+        True if removed, False if there was no such container
+        """
+        try:
+            self._request("DELETE", f"/containers/{quote(name, safe='')}", query={"force": int(force)})
+        except DockerEngineNotFound:
+            return False
+        return True
+
+    def is_container_running(self, name):
+        try:
+            container = self._request("GET", f"/containers/{quote(name, safe='')}/json")
+        except DockerEngineNotFound:
+            return False
+        return bool(container["State"]["Running"])
+
+    # exec ############################################################################################################
+    def create_exec(self, container, cmd, env=None, attach_stdin=False):
+        body = {
+            "Cmd": cmd,
+            "Env": [f"{key}={value}" for key, value in (env or {}).items()],
+            "AttachStdin": attach_stdin,
+            "AttachStdout": True,
+            "AttachStderr": True,
+            "Tty": False,
+        }
+        return self._request("POST", f"/containers/{quote(container, safe='')}/exec", body=body)["Id"]
+
+    def stream_exec(self, exec_id, stdin=None):
+        """
+        Start an exec and yield (STDOUT/STDERR, bytes) frames as they arrive.
+        The start request hijacks the connection, so it gets its own socket.
+        """
+        path = f"/exec/{exec_id}/start"
+        body = json.dumps({"Detach": False, "Tty": False}).encode("utf-8")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            try:
+                sock.connect(self.socket_path)
+            except OSError as e:
+                raise DockerEngineUnavailable(None, str(e), "POST", path)
+            sock.sendall((f"POST {self._get_url(path)} HTTP/1.1\r\n"
+                          f"Host: localhost\r\n"
+                          f"Content-Type: application/json\r\n"
+                          f"Content-Length: {len(body)}\r\n"
+                          f"Connection: Upgrade\r\n"
+                          f"Upgrade: tcp\r\n\r\n").encode("ascii") + body)
+            buffer = b""
+            while b"\r\n\r\n" not in buffer:
+                data = sock.recv(65536)
+                if not data:
+                    raise DockerEngineError(None, "connection closed before the response", "POST", path)
+                buffer += data
+            head, buffer = buffer.split(b"\r\n\r\n", 1)
+            status = int(head.split(b" ", 2)[1])
+            if status >= 400:
+                while True:
+                    data = sock.recv(65536)
+                    if not data:
+                        break
+                    buffer += data
+                self._raise_for_status(status, buffer, "POST", path)
+            if stdin is not None:
+                sock.sendall(stdin.encode("utf-8") if isinstance(stdin, str) else stdin)
+                sock.shutdown(socket.SHUT_WR)
+            while True:
+                while len(buffer) >= self.STREAM_HEADER.size:
+                    stream_type, size = self.STREAM_HEADER.unpack_from(buffer)
+                    if len(buffer) < self.STREAM_HEADER.size + size:
+                        break
+                    yield stream_type, buffer[self.STREAM_HEADER.size:self.STREAM_HEADER.size + size]
+                    buffer = buffer[self.STREAM_HEADER.size + size:]
+                data = sock.recv(65536)
+                if not data:
+                    return
+                buffer += data
+        finally:
+            sock.close()
+
+    def inspect_exec(self, exec_id):
+        return self._request("GET", f"/exec/{exec_id}/json")
+
+    def exec_run(self, container, cmd, stdin=None, env=None):
+        """
+        (exit code, stdout, stderr) of cmd (a list) run in the container
+        """
+        exec_id = self.create_exec(container, cmd, env=env, attach_stdin=stdin is not None)
+        stdout, stderr = [], []
+        for stream_type, data in self.stream_exec(exec_id, stdin=stdin):
+            (stderr if stream_type == self.STDERR else stdout).append(data)
+        exit_code = None
+        # the exit code can lag a moment behind the end of the stream
+        for _ in range(50):
+            exec_info = self.inspect_exec(exec_id)
+            if not exec_info["Running"] and exec_info["ExitCode"] is not None:
+                exit_code = exec_info["ExitCode"]
+                break
+            time.sleep(0.02)
+        return (exit_code, b"".join(stdout).decode("utf-8", errors="ignore"),
+                b"".join(stderr).decode("utf-8", errors="ignore"))
+
+    def exec_detached(self, container, cmd, env=None):
+        exec_id = self.create_exec(container, cmd, env=env)
+        self._request("POST", f"/exec/{exec_id}/start", body={"Detach": True, "Tty": False})
+        return exec_id
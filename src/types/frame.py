@@ -0,0 +1,96 @@
+import base64
+import io
+import struct
+
+import numpy as np
+from PIL import Image
+
+
+class Frame:
+    """
+    One raw screen capture as an RGB numpy array (height, width, 3).
+    PNG / base64 are only produced when asked for, and then cached: the settle and GUI check loops only compare
+    frames, and only the settled frame is encoded for the LLM.
+    """
+
+    # XWDFileHeader: 25 CARD32 fields, always written MSB first by xwd
+    XWD_HEADER_FIELD_COUNT = 25
+    XWD_FILE_VERSION = 7
+    XWD_Z_PIXMAP = 2
+    XWD_COLOR_SIZE = 12
+
+    def __init__(self, pixels: np.ndarray):
+        self.pixels = pixels
+        self._png = None
+        self._base64 = None
+
+    @property
+    def width(self) -> int:
+        return self.pixels.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.pixels.shape[0]
+
+    @staticmethod
+    def from_xwd(data: bytes) -> "Frame":
+        """
+        Parse an `xwd -root -silent` dump (ZPixmap, 24/32 bits per pixel, TrueColor masks).
+        """
+        fields = struct.unpack(">25I", data[:Frame.XWD_HEADER_FIELD_COUNT * 4])
+        header_size, file_version, pixmap_format = fields[0], fields[1], fields[2]
+        width, height, byte_order = fields[4], fields[5], fields[7]
+        bits_per_pixel, bytes_per_line = fields[11], fields[12]
+        red_mask, green_mask, blue_mask = fields[14], fields[15], fields[16]
+        ncolors = fields[19]
+        if file_version != Frame.XWD_FILE_VERSION or pixmap_format != Frame.XWD_Z_PIXMAP:
+            raise ValueError(f"Unsupported xwd dump: version {file_version}, format {pixmap_format}")
+        if bits_per_pixel not in (24, 32):
+            raise ValueError(f"Unsupported xwd dump: {bits_per_pixel} bits per pixel")
+
+        offset = header_size + ncolors * Frame.XWD_COLOR_SIZE
+        bytes_per_pixel = bits_per_pixel // 8
+        rows = np.frombuffer(data, dtype=np.uint8, count=bytes_per_line * height, offset=offset)
+        rows = rows.reshape(height, bytes_per_line)[:, :width * bytes_per_pixel].reshape(height, width, bytes_per_pixel)
+        # byte_order 0: LSBFirst, the pixel value's lowest byte comes first
+        if byte_order == 0:
+            rows = rows[:, :, ::-1]
+        values = np.zeros((height, width), dtype=np.uint32)
+        for channel in range(bytes_per_pixel):
+            values = (values << 8) | rows[:, :, channel]
+
+        pixels = np.empty((height, width, 3), dtype=np.uint8)
+        for index, mask in enumerate([red_mask, green_mask, blue_mask]):
+            shift = (mask & -mask).bit_length() - 1
+            pixels[:, :, index] = (values & mask) >> shift
+        return Frame(pixels)
+
+    @staticmethod
+    def from_base64_png(b64: str) -> "Frame":
+        frame = Frame(np.array(Image.open(io.BytesIO(base64.b64decode(b64))).convert("RGB")))
+        frame._base64 = b64
+        return frame
+
+    def to_png(self) -> bytes:
+        if self._png is None:
+            buffer = io.BytesIO()
+            # compress_level 1: the LLM and the PDF do not need the smallest file
+            Image.fromarray(self.pixels).save(buffer, format="PNG", compress_level=1)
+            self._png = buffer.getvalue()
+        return self._png
+
+    def to_base64(self) -> str:
+        if self._base64 is None:
+            self._base64 = base64.b64encode(self.to_png()).decode("ascii")
+        return self._base64
+
+    def diff_ratio(self, other: "Frame", ignore_top: int = 0) -> float:
+        """
+        % of pixels that changed between two frames, same measure as DockerComputer._diff_ratio_b64
+        """
+        arr_a, arr_b = self.pixels[ignore_top:], other.pixels[ignore_top:]
+        if arr_a.shape != arr_b.shape:
+            return 100.0
+        diff_pixels = np.count_nonzero(np.any(arr_a != arr_b, axis=2))
+        total_pixels = arr_a.shape[0] * arr_a.shape[1]
+        return diff_pixels / total_pixels * 100.0
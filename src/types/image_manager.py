@@ -0,0 +1,274 @@
+import json
+import os
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+from src.types.docker_engine import DockerEngine, DockerEngineError
+from config import USE_DOCKER_ENGINE_API, IMAGE_USAGE_FILEPATH, IMAGE_DISK_QUOTA_BYTES
+
+
+class ImageManager:
+    """
+    Lifecycle of the base and diff images: usage is tracked (size, build time, last run, run count) in a JSON
+    index, and least recently used images are removed once they exceed the disk quota.
+    - protected: images of pending jobs (the PRs still to run), never removed, nor the base images they build on;
+      nothing is removed before the pending jobs are known (set_protected), e.g. on a worker host
+    - images a container still uses are skipped (docker refuses to remove them anyway)
+    - a base image is only removed once no diff image of its app is left, its layers are shared by all of them
+    Sizes are accounted per image's own layers: a diff image counts its size minus its base image's size.
+
+    {"images": {"<image>": {"kind", "repo", "size", "own_size", "built_at", "last_used", "runs"}},
+     "evicted": [{"image", "own_size", "evicted_at"}]}
+    """
+
+    BASE_KIND = "base"
+    DIFF_KIND = "diff"
+    BASE_TAG = "base-env"  # DockerImageBuilder.BASE_ENV_TAG
+
+    shared_managers = {}
+    shared_managers_lock = threading.Lock()
+
+    def __init__(self, filepath=IMAGE_USAGE_FILEPATH, quota_bytes=IMAGE_DISK_QUOTA_BYTES):
+        self.filepath = Path(filepath)
+        self.quota_bytes = quota_bytes
+        self.lock = threading.Lock()
+        self.protected = None
+        self.index = {"images": {}, "evicted": []}
+        if self.filepath.exists():
+            try:
+                with open(self.filepath, "r") as f:
+                    self.index = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"[!] Ignore unreadable image usage index {self.filepath}: {e}")
+
+    @staticmethod
+    def get_shared(filepath=IMAGE_USAGE_FILEPATH):
+        with ImageManager.shared_managers_lock:
+            key = str(filepath)
+            if key not in ImageManager.shared_managers:
+                ImageManager.shared_managers[key] = ImageManager(filepath)
+            return ImageManager.shared_managers[key]
+
+    @staticmethod
+    def get_kind(image_name):
+        """
+        BASE_KIND / DIFF_KIND for the images DockerImageBuilder names, None for any other image
+        """
+        tag = image_name.split(":", 1)[1] if ":" in image_name else ""
+        if tag.startswith("diff-"):
+            return ImageManager.DIFF_KIND
+        if tag == ImageManager.BASE_TAG:
+            return ImageManager.BASE_KIND
+        return None
+
+    @staticmethod
+    def _get_engine():
+        if not USE_DOCKER_ENGINE_API:
+            return None
+        engine = DockerEngine.get_shared()
+        return engine if engine.is_available() else None
+
+    def _save_index(self):
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        tmp_filepath = self.filepath.with_name(f".{self.filepath.name}.{os.getpid()}.tmp")
+        with open(tmp_filepath, "w") as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(tmp_filepath, self.filepath)
+
+    # docker ##########################################################################################################
+    @staticmethod
+    def get_image_size(image_name):
+        """
+        size in bytes, None if there is no such image
+        """
+        engine = ImageManager._get_engine()
+        if engine is not None:
+            try:
+                return engine.inspect_image(image_name)["Size"]
+            except DockerEngineError:
+                return None
+        result = subprocess.run(["docker", "image", "inspect", "-f", "{{.Size}}", image_name],
+                                capture_output=True, text=True)
+        return int(result.stdout.strip()) if result.returncode == 0 else None
+
+    @staticmethod
+    def list_images():
+        engine = ImageManager._get_engine()
+        if engine is not None:
+            return {tag for image in engine.list_images() for tag in image.get("RepoTags") or []}
+        result = subprocess.run(["docker", "images", "--format", "{{.Repository}}:{{.Tag}}"],
+                                capture_output=True, text=True, check=True)
+        return {line.strip() for line in result.stdout.splitlines()}
+
+    @staticmethod
+    def list_container_images():
+        engine = ImageManager._get_engine()
+        if engine is not None:
+            return engine.list_container_images()
+        result = subprocess.run(["docker", "ps", "-a", "--format", "{{.Image}}"],
+                                capture_output=True, text=True, check=True)
+        return {line.strip() for line in result.stdout.splitlines()}
+
+    @staticmethod
+    def remove_image(image_name):
+        """
+        True if removed, False if docker refused (e.g. a container still uses it)
+        """
+        engine = ImageManager._get_engine()
+        if engine is not None:
+            try:
+                engine.remove_image(image_name)
+            except DockerEngineError as e:
+                print(f"[!] Could not remove image {image_name}: {e}")
+                return False
+            return True
+        result = subprocess.run(["docker", "rmi", image_name], capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"[!] Could not remove image {image_name}: {result.stderr.strip()}")
+            return False
+        return True
+
+    # usage ###########################################################################################################
+    def _add_image(self, image_name, built_at):
+        """
+        index entry of image_name with its sizes; caller holds self.lock
+        """
+        repo = image_name.split(":", 1)[0]
+        size = self.get_image_size(image_name) or 0
+        own_size = size
+        if self.get_kind(image_name) == self.DIFF_KIND:
+            base_size = self.get_image_size(f"{repo}:{self.BASE_TAG}")
+            if base_size:
+                own_size = max(size - base_size, 0)
+        entry = {"kind": self.get_kind(image_name), "repo": repo, "size": size, "own_size": own_size,
+                 "built_at": built_at, "last_used": built_at, "runs": 0}
+        self.index["images"][image_name] = entry
+        return entry
+
+    def record_build(self, image_name):
+        with self.lock:
+            self._add_image(image_name, time.time())
+            self._save_index()
+
+    def record_run(self, image_name):
+        if self.get_kind(image_name) is None:
+            return
+        with self.lock:
+            entry = self.index["images"].get(image_name)
+            if entry is None:
+                entry = self._add_image(image_name, time.time())
+            entry["last_used"] = time.time()
+            entry["runs"] = entry.get("runs", 0) + 1
+            self._save_index()
+
+    def sync(self):
+        """
+        adopt base/diff images built before tracking started, forget the ones removed behind our back
+        """
+        images = {image_name for image_name in self.list_images() if self.get_kind(image_name) is not None}
+        with self.lock:
+            for image_name in list(self.index["images"]):
+                if image_name not in images:
+                    del self.index["images"][image_name]
+            for image_name in images - set(self.index["images"]):
+                # unknown history: oldest possible, evicted first
+                self._add_image(image_name, 0.0)
+            self._save_index()
+
+    def set_protected(self, image_names):
+        """
+        images of pending jobs, replaces the previous set
+        """
+        with self.lock:
+            self.protected = set(image_names)
+
+    # eviction ########################################################################################################
+    def get_used_bytes(self):
+        with self.lock:
+            return sum(entry["own_size"] for entry in self.index["images"].values())
+
+    def get_reserve_bytes(self, repo):
+        """
+        expected own size of the next diff image of repo: mean of the tracked ones
+        """
+        with self.lock:
+            own_sizes = [entry["own_size"] for entry in self.index["images"].values()
+                         if entry["repo"] == repo and entry["kind"] == self.DIFF_KIND]
+        return sum(own_sizes) // len(own_sizes) if own_sizes else 0
+
+    def collect(self, reserve_bytes=0, repo=None):
+        """
+        remove least recently used images until the tracked ones plus reserve_bytes (room for the next build)
+        fit the quota; returns the removed image names
+        repo: app whose diff image is about to be built, its base image is kept
+        """
+        used_bytes = self.get_used_bytes()
+        if used_bytes + reserve_bytes <= self.quota_bytes:
+            return []
+        with self.lock:
+            if self.protected is None:
+                print(f"[!] Images use {used_bytes / 1024 ** 3:.1f} GB of the {self.quota_bytes / 1024 ** 3:.1f} GB "
+                      f"quota, no eviction before the pending jobs are protected")
+                return []
+            entries = self.index["images"]
+            candidates = sorted(entries, key=lambda image_name: entries[image_name]["last_used"])
+            protected = set(self.protected)
+        # a pending diff image may not be built yet, so protect the base images it needs explicitly
+        protected_repos = {image_name.split(":", 1)[0] for image_name in protected}
+        if repo is not None:
+            protected_repos.add(repo)
+        protected |= {f"{protected_repo}:{self.BASE_TAG}" for protected_repo in protected_repos}
+        container_images = self.list_container_images()
+        removed_image_names = []
+        # diff images first: a base image can only go once its app has no diff image left
+        for kind in [self.DIFF_KIND, self.BASE_KIND]:
+            for image_name in candidates:
+                if used_bytes + reserve_bytes <= self.quota_bytes:
+                    break
+                with self.lock:
+                    entry = self.index["images"].get(image_name)
+                    if entry is None or entry["kind"] != kind:
+                        continue
+                    if kind == self.BASE_KIND and any(
+                            one_entry["repo"] == entry["repo"] and one_entry["kind"] == self.DIFF_KIND
+                            for one_entry in self.index["images"].values()):
+                        continue
+                if image_name in protected or image_name in container_images:
+                    continue
+                if not self.remove_image(image_name):
+                    continue
+                used_bytes -= entry["own_size"]
+                removed_image_names.append(image_name)
+                with self.lock:
+                    del self.index["images"][image_name]
+                    self.index["evicted"].append({"image": image_name, "own_size": entry["own_size"],
+                                                  "evicted_at": time.time()})
+                    self._save_index()
+                print(f"[-] Image evicted: {image_name} ({entry['own_size'] / 1024 ** 3:.1f} GB)")
+        if used_bytes + reserve_bytes > self.quota_bytes:
+            print(f"[!] Images still use {used_bytes / 1024 ** 3:.1f} GB of the {self.quota_bytes / 1024 ** 3:.1f} GB "
+                  f"quota, the rest is protected or in use")
+        return removed_image_names
+
+    def get_report(self):
+        """
+        accounting per app: image count and GB, runs, protected images, what eviction freed so far
+        """
+        with self.lock:
+            repos = {}
+            for image_name, entry in self.index["images"].items():
+                repo = repos.setdefault(entry["repo"], {"images": 0, "own_gb": 0.0, "runs": 0, "protected": 0})
+                repo["images"] += 1
+                repo["own_gb"] = round(repo["own_gb"] + entry["own_size"] / 1024 ** 3, 2)
+                repo["runs"] += entry.get("runs", 0)
+                repo["protected"] += image_name in (self.protected or set())
+            used_bytes = sum(entry["own_size"] for entry in self.index["images"].values())
+            return {
+                "used_gb": round(used_bytes / 1024 ** 3, 2),
+                "quota_gb": round(self.quota_bytes / 1024 ** 3, 2),
+                "repos": repos,
+                "evicted_images": len(self.index["evicted"]),
+                "evicted_gb": round(sum(entry["own_size"] for entry in self.index["evicted"]) / 1024 ** 3, 2),
+            }
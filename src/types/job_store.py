@@ -0,0 +1,189 @@
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+
+class JobStore:
+    """
+    Durable record of a multi-PR batch run, one row per (PR, test scenario, stage).
+    A crashed run can be restarted and only picks up the work that is not done yet.
+
+    PR-level stages (generate) use scenario_index = PR_LEVEL_INDEX.
+    """
+
+    STAGE_GENERATE = "generate"
+    STAGE_EXECUTE = "execute"
+    STAGE_REPLAY = "replay"
+    STAGE_DETECT = "detect"
+
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    # nothing left to do for the stage (e.g. no replay output to detect on), not retried by a restarted run
+    STATUS_SKIPPED = "skipped"
+
+    PR_LEVEL_INDEX = -1
+
+    def __init__(self, db_filepath):
+        db_filepath = Path(db_filepath)
+        db_filepath.parent.mkdir(parents=True, exist_ok=True)
+        self.db_filepath = db_filepath
+        # scenarios and detector workers may report from several threads
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(db_filepath), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS prs ("
+                " pr_id TEXT PRIMARY KEY,"
+                " output_path TEXT,"
+                " status TEXT,"
+                " updated_at TEXT)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " pr_id TEXT,"
+                " scenario_index INTEGER,"
+                " stage TEXT,"
+                " status TEXT,"
+                " output_path TEXT,"
+                " cost REAL,"
+                " duration_mins REAL,"
+                " error TEXT,"
+                " updated_at TEXT,"
+                " PRIMARY KEY (pr_id, scenario_index, stage))"
+            )
+
+    @staticmethod
+    def now():
+        return datetime.now().isoformat(timespec="seconds")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # PR ##############################################################################################################
+    def get_pr_output_path(self, pr_id):
+        with self.lock:
+            row = self.conn.execute("SELECT output_path FROM prs WHERE pr_id = ?", (f"{pr_id}",)).fetchone()
+        return Path(row["output_path"]) if row else None
+
+    def register_pr(self, pr_id, output_path):
+        """
+        remember the output folder of a PR, so a restarted run writes into the same folder
+        """
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO prs (pr_id, output_path, status, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(pr_id) DO UPDATE SET output_path = excluded.output_path, updated_at = excluded.updated_at",
+                (f"{pr_id}", str(output_path), self.STATUS_RUNNING, self.now()),
+            )
+
+    def set_pr_status(self, pr_id, status):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE prs SET status = ?, updated_at = ? WHERE pr_id = ?",
+                              (status, self.now(), f"{pr_id}"))
+
+    def is_pr_done(self, pr_id):
+        with self.lock:
+            row = self.conn.execute("SELECT status FROM prs WHERE pr_id = ?", (f"{pr_id}",)).fetchone()
+        return bool(row) and row["status"] == self.STATUS_DONE
+
+    # job #############################################################################################################
+    def get_job(self, pr_id, scenario_index, stage):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT * FROM jobs WHERE pr_id = ? AND scenario_index = ? AND stage = ?",
+                (f"{pr_id}", scenario_index, stage),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def is_done(self, pr_id, scenario_index, stage):
+        job = self.get_job(pr_id, scenario_index, stage)
+        return bool(job) and job["status"] == self.STATUS_DONE
+
+    def is_finished(self, pr_id, scenario_index, stage):
+        """
+        done or skipped: a terminal state
+        """
+        job = self.get_job(pr_id, scenario_index, stage)
+        return bool(job) and job["status"] in (self.STATUS_DONE, self.STATUS_SKIPPED)
+
+    def _upsert(self, pr_id, scenario_index, stage, status, output_path=None, cost=None, duration_mins=None,
+                error=None):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO jobs (pr_id, scenario_index, stage, status, output_path, cost, duration_mins, error, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(pr_id, scenario_index, stage) DO UPDATE SET "
+                " status = excluded.status, output_path = excluded.output_path, cost = excluded.cost,"
+                " duration_mins = excluded.duration_mins, error = excluded.error, updated_at = excluded.updated_at",
+                (f"{pr_id}", scenario_index, stage, status,
+                 str(output_path) if output_path is not None else None,
+                 cost, duration_mins, error, self.now()),
+            )
+
+    def start(self, pr_id, scenario_index, stage):
+        self._upsert(pr_id, scenario_index, stage, self.STATUS_RUNNING)
+
+    def done(self, pr_id, scenario_index, stage, output_path=None, cost=None, duration_mins=None):
+        self._upsert(pr_id, scenario_index, stage, self.STATUS_DONE, output_path=output_path, cost=cost,
+                     duration_mins=duration_mins)
+
+    def fail(self, pr_id, scenario_index, stage, error=None):
+        self._upsert(pr_id, scenario_index, stage, self.STATUS_FAILED, error=f"{error}" if error else None)
+
+    def skip(self, pr_id, scenario_index, stage, reason=None):
+        self._upsert(pr_id, scenario_index, stage, self.STATUS_SKIPPED, error=f"{reason}" if reason else None)
+
+    def scenario_job(self, pr_id, scenario_index):
+        return ScenarioJob(self, pr_id, scenario_index)
+
+    def get_cost_and_duration(self, pr_id=None):
+        """
+        total cost and duration of finished jobs, for one PR or the whole batch
+        """
+        query = "SELECT COALESCE(SUM(cost), 0), COALESCE(SUM(duration_mins), 0) FROM jobs WHERE status = ?"
+        params = [self.STATUS_DONE]
+        if pr_id is not None:
+            query += " AND pr_id = ?"
+            params.append(f"{pr_id}")
+        with self.lock:
+            total_cost, total_duration_mins = self.conn.execute(query, params).fetchone()
+        return total_cost, total_duration_mins
+
+
+class ScenarioJob:
+    """
+    JobStore rows of one (PR, test scenario), handed to the executor and detector.
+    """
+
+    def __init__(self, job_store, pr_id, scenario_index):
+        self.job_store = job_store
+        self.pr_id = pr_id
+        self.scenario_index = scenario_index
+
+    def is_done(self, stage):
+        return self.job_store.is_done(self.pr_id, self.scenario_index, stage)
+
+    def is_finished(self, stage):
+        return self.job_store.is_finished(self.pr_id, self.scenario_index, stage)
+
+    def get_output_path(self, stage):
+        job = self.job_store.get_job(self.pr_id, self.scenario_index, stage)
+        return Path(job["output_path"]) if job and job["output_path"] else None
+
+    def start(self, stage):
+        self.job_store.start(self.pr_id, self.scenario_index, stage)
+
+    def done(self, stage, output_path=None, cost=None, duration_mins=None):
+        self.job_store.done(self.pr_id, self.scenario_index, stage, output_path=output_path, cost=cost,
+                            duration_mins=duration_mins)
+
+    def fail(self, stage, error=None):
+        self.job_store.fail(self.pr_id, self.scenario_index, stage, error=error)
+
+    def skip(self, stage, reason=None):
+        self.job_store.skip(self.pr_id, self.scenario_index, stage, reason=reason)
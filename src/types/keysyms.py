@@ -0,0 +1,46 @@
+class Keysyms:
+    """
+    X keysyms of xdotool key names and characters, for the backends that inject key events themselves
+    instead of running xdotool (VNC, XTest).
+    """
+
+    # the xdotool key names DockerComputer.map_keys produces, and a few more
+    KEYSYMS = {
+        "BackSpace": 0xff08, "Tab": 0xff09, "Return": 0xff0d, "Escape": 0xff1b, "Delete": 0xffff,
+        "Home": 0xff50, "Left": 0xff51, "Up": 0xff52, "Right": 0xff53, "Down": 0xff54,
+        "Page_Up": 0xff55, "Prior": 0xff55, "Page_Down": 0xff56, "Next": 0xff56, "End": 0xff57, "Insert": 0xff63,
+        "Menu": 0xff67,
+        "shift": 0xffe1, "Shift_L": 0xffe1, "Shift_R": 0xffe2, "ctrl": 0xffe3, "Control_L": 0xffe3,
+        "Control_R": 0xffe4, "alt": 0xffe9, "Alt_L": 0xffe9, "Alt_R": 0xffea, "super": 0xffeb, "Super_L": 0xffeb,
+        "Super_R": 0xffec, "meta": 0xffe7, "Meta_L": 0xffe7, "cmd": 0xffeb,
+        "space": 0x20, "exclam": 0x21, "quotedbl": 0x22, "numbersign": 0x23, "dollar": 0x24, "percent": 0x25,
+        "ampersand": 0x26, "apostrophe": 0x27, "parenleft": 0x28, "parenright": 0x29, "asterisk": 0x2a,
+        "plus": 0x2b, "comma": 0x2c, "minus": 0x2d, "period": 0x2e, "slash": 0x2f, "colon": 0x3a,
+        "semicolon": 0x3b, "less": 0x3c, "equal": 0x3d, "greater": 0x3e, "question": 0x3f, "at": 0x40,
+        "bracketleft": 0x5b, "backslash": 0x5c, "bracketright": 0x5d, "asciicircum": 0x5e, "underscore": 0x5f,
+        "grave": 0x60, "braceleft": 0x7b, "bar": 0x7c, "braceright": 0x7d, "asciitilde": 0x7e,
+        **{f"F{number}": 0xffbe + number - 1 for number in range(1, 13)},
+    }
+    LOWER_KEYSYMS = {name.lower(): keysym for name, keysym in KEYSYMS.items()}
+
+    @staticmethod
+    def get_keysym(key: str) -> int | None:
+        """
+        keysym of an xdotool key name or a single character, None if unknown
+        """
+        if key in Keysyms.KEYSYMS:
+            return Keysyms.KEYSYMS[key]
+        if key.lower() in Keysyms.LOWER_KEYSYMS:
+            return Keysyms.LOWER_KEYSYMS[key.lower()]
+        if len(key) == 1:
+            return Keysyms.get_char_keysym(key)
+        return None
+
+    @staticmethod
+    def get_char_keysym(char: str) -> int:
+        if char == "\n":
+            return Keysyms.KEYSYMS["Return"]
+        if char == "\t":
+            return Keysyms.KEYSYMS["Tab"]
+        # Latin-1 keysyms are their code points, the rest of Unicode is offset by 0x01000000
+        return ord(char) if ord(char) < 0x100 else 0x01000000 + ord(char)
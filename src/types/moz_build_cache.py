@@ -0,0 +1,264 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from config import MOZ_BUILD_CACHE_DIR, MOZ_BUILD_CACHE_MAX_BYTES, MOZ_BUILD_CACHE_OFFLINE, MOZ_BUILD_CACHE_MOUNT
+
+# Runs inside a Firefox image (python3 -, script on stdin) with the cache mounted read-write.
+# Resolves a changeset (integration build) or a nightly build id the way `mozregression --launch` does and downloads
+# the archive only, under the same file name, so `mozregression --launch <rev> --persist <dir>` finds it there.
+# argv: rev, destination dir, app
+# stdout: one JSON line {"ok", "filename"} or {"ok": false, "error", "missing"}, missing if there is no such build
+DOWNLOAD_SCRIPT = r'''
+import json, os, sys
+
+rev, dest, app = sys.argv[1], sys.argv[2], sys.argv[3]
+try:
+    import mozinfo
+    from mozregression.dates import parse_date
+    from mozregression.download_manager import BuildDownloadManager
+    from mozregression.fetch_build_info import IntegrationInfoFetcher, NightlyInfoFetcher
+    from mozregression.fetch_configs import create_config
+
+    fetch_config = create_config(app, mozinfo.os, mozinfo.bits, mozinfo.processor)
+    try:
+        # a date or a build id (YYYYMMDDhhmmss) is a nightly, anything else a changeset
+        date = parse_date(rev)
+    except Exception:
+        date = None
+    if date is not None:
+        build_info = NightlyInfoFetcher(fetch_config).find_build_info(date)
+    else:
+        build_info = IntegrationInfoFetcher(fetch_config).find_build_info(rev)
+    os.makedirs(dest, exist_ok=True)
+    filepath = BuildDownloadManager(dest).focus_download(build_info)
+    print(json.dumps({"ok": True, "filename": os.path.basename(filepath)}))
+except Exception as e:
+    print(json.dumps({"ok": False, "error": f"{type(e).__name__}: {e}",
+                      "missing": type(e).__name__ == "BuildInfoNotFound"}))
+'''
+
+
+class MozBuildCache:
+    """
+    Host-side cache of the Firefox build archives mozregression launches, keyed by changeset / nightly build id,
+    so a container starts from a local archive instead of downloading ~100 MB each time.
+
+    root/<rev>/<mozregression persist file name>   one archive per entry
+    root/index.json                                 sha256, size, last use, hits; revs mozregression has no build for
+
+    root is mounted read-only at MOZ_BUILD_CACHE_MOUNT in Firefox containers and passed to mozregression as
+    `--persist <mount>/<rev>` on a hit. Entries are filled ahead of time by prefetch (from the build ids
+    Build.get_first_with_last_without_buildid_by_push_datetime maps a push to), checked against their sha256 before
+    first use, and evicted least recently used above max_bytes. offline: a miss fails fast instead of downloading.
+    """
+
+    INDEX_FILENAME = "index.json"
+
+    shared_caches = {}
+    shared_caches_lock = threading.Lock()
+
+    def __init__(self, root=MOZ_BUILD_CACHE_DIR, max_bytes=MOZ_BUILD_CACHE_MAX_BYTES, offline=MOZ_BUILD_CACHE_OFFLINE):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.lock = threading.Lock()
+        # rev -> lock, so two prefetches never download the same build
+        self.rev_locks = {}
+        # entries whose sha256 was checked by this process
+        self.verified_revs = set()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index = {"entries": {}, "unavailable": {}, "hits": 0, "misses": 0}
+        index_filepath = Path(self.root, self.INDEX_FILENAME)
+        if index_filepath.exists():
+            try:
+                with open(index_filepath, "r") as f:
+                    self.index = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"[!] Ignore unreadable mozregression build cache index {index_filepath}: {e}")
+
+    @staticmethod
+    def get_shared(root=MOZ_BUILD_CACHE_DIR):
+        with MozBuildCache.shared_caches_lock:
+            key = str(root)
+            if key not in MozBuildCache.shared_caches:
+                MozBuildCache.shared_caches[key] = MozBuildCache(root)
+            return MozBuildCache.shared_caches[key]
+
+    @staticmethod
+    def get_volume():
+        """
+        docker bind mount of the cache into a container, read-only
+        """
+        return f"{Path(MOZ_BUILD_CACHE_DIR).resolve()}:{MOZ_BUILD_CACHE_MOUNT}:ro"
+
+    @staticmethod
+    def get_sha256(filepath):
+        digest = hashlib.sha256()
+        with open(filepath, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _save_index(self):
+        index_filepath = Path(self.root, self.INDEX_FILENAME)
+        tmp_filepath = index_filepath.with_name(f".{index_filepath.name}.{os.getpid()}.tmp")
+        with open(tmp_filepath, "w") as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(tmp_filepath, index_filepath)
+
+    def _drop_entry(self, rev):
+        """
+        caller holds self.lock
+        """
+        self.index["entries"].pop(rev, None)
+        self.verified_revs.discard(rev)
+        shutil.rmtree(Path(self.root, rev), ignore_errors=True)
+
+    def is_unavailable(self, rev):
+        """
+        whether a prefetch found no build for rev (e.g. an integration build that was pruned)
+        """
+        with self.lock:
+            return rev in self.index["unavailable"]
+
+    def lookup(self, rev):
+        """
+        --persist folder of rev inside the container, None on a miss or a corrupt entry
+        """
+        with self.lock:
+            entry = self.index["entries"].get(rev)
+            filepath = Path(self.root, rev, entry["filename"]) if entry is not None else None
+            if entry is not None and (not filepath.exists() or filepath.stat().st_size != entry["size"]):
+                print(f"[!] Mozregression build cache entry {rev} is missing or truncated, dropped")
+                self._drop_entry(rev)
+                entry = None
+            if entry is None:
+                self.index["misses"] += 1
+                self._save_index()
+                print(f"[=] Mozregression build cache miss: {rev}")
+                return None
+            must_verify = rev not in self.verified_revs
+        if must_verify:
+            sha256 = self.get_sha256(filepath)
+            with self.lock:
+                if sha256 != entry["sha256"]:
+                    print(f"[!] Mozregression build cache entry {rev} fails its sha256 check, dropped")
+                    self._drop_entry(rev)
+                    self.index["misses"] += 1
+                    self._save_index()
+                    return None
+                self.verified_revs.add(rev)
+        with self.lock:
+            entry["last_used"] = time.time()
+            entry["hits"] = entry.get("hits", 0) + 1
+            self.index["hits"] += 1
+            self._save_index()
+        print(f"[✓] Mozregression build cache hit: {rev}")
+        return f"{MOZ_BUILD_CACHE_MOUNT}/{rev}"
+
+    def fetch(self, rev, image, app):
+        """
+        download the build of rev into the cache with a throwaway container of image; True if cached afterwards
+        """
+        with self.lock:
+            rev_lock = self.rev_locks.setdefault(rev, threading.Lock())
+        with rev_lock:
+            with self.lock:
+                if rev in self.index["entries"]:
+                    return True
+            if self.offline:
+                print(f"[!] Offline, not downloading build {rev}")
+                return False
+            staging_name = f".staging-{uuid.uuid4().hex[:8]}"
+            staging_path = Path(self.root, staging_name)
+            cmd = [
+                "docker", "run", "--rm", "-i",
+                "--user", f"{os.getuid()}:{os.getgid()}",
+                "-e", "HOME=/tmp",
+                "-v", f"{self.root.resolve()}:{MOZ_BUILD_CACHE_MOUNT}",
+                image,
+                "python3", "-", rev, f"{MOZ_BUILD_CACHE_MOUNT}/{staging_name}", app,
+            ]
+            print(f"[+] Downloading build {rev} into the mozregression build cache")
+            start_time = time.time()
+            try:
+                result = subprocess.run(cmd, input=DOWNLOAD_SCRIPT, capture_output=True, text=True)
+                outcome = None
+                for line in reversed(result.stdout.strip().splitlines()):
+                    try:
+                        outcome = json.loads(line)
+                        break
+                    except json.JSONDecodeError:
+                        continue
+                if outcome is None or not outcome["ok"]:
+                    error = outcome["error"] if outcome is not None else result.stderr.strip()[-500:]
+                    print(f"[!] No build for {rev}: {error}")
+                    if outcome is not None and outcome.get("missing"):
+                        # e.g. a pruned integration build: remember, so later runs go straight to the build id
+                        with self.lock:
+                            self.index["unavailable"][rev] = {"error": error, "checked_at": time.time()}
+                            self._save_index()
+                    return False
+                filepath = Path(staging_path, outcome["filename"])
+                size = filepath.stat().st_size
+                sha256 = self.get_sha256(filepath)
+                os.replace(staging_path, Path(self.root, rev))
+            except OSError as e:
+                print(f"[!] Could not cache build {rev}: {e}")
+                return False
+            finally:
+                shutil.rmtree(staging_path, ignore_errors=True)
+            with self.lock:
+                self.index["unavailable"].pop(rev, None)
+                self.index["entries"][rev] = {"filename": outcome["filename"], "size": size, "sha256": sha256,
+                                              "created": time.time(), "last_used": time.time(), "hits": 0}
+                self.verified_revs.add(rev)
+                self._save_index()
+            print(f"[+] Build cached: {rev} ({size / 1024 ** 2:.0f} MB, {time.time() - start_time:.0f}s)")
+        self.evict(protected_revs={rev})
+        return True
+
+    def prefetch(self, revs, image, app):
+        """
+        cache the first rev of revs that has a build, in the order run_single_build_for_firefox tries them
+        """
+        for rev in revs:
+            if rev and not self.is_unavailable(rev) and self.fetch(rev, image, app):
+                return rev
+        return None
+
+    def evict(self, protected_revs=()):
+        """
+        drop least recently used entries until the cache fits max_bytes
+        """
+        with self.lock:
+            entries = self.index["entries"]
+            total_size = sum(entry["size"] for entry in entries.values())
+            for rev in sorted(entries, key=lambda one_rev: entries[one_rev]["last_used"]):
+                if total_size <= self.max_bytes:
+                    break
+                if rev in protected_revs:
+                    continue
+                total_size -= entries[rev]["size"]
+                self._drop_entry(rev)
+                print(f"[-] Mozregression build cache evicted: {rev}")
+            self._save_index()
+
+    def get_stats(self):
+        with self.lock:
+            lookup_count = self.index["hits"] + self.index["misses"]
+            return {
+                "entries": len(self.index["entries"]),
+                "size_bytes": sum(entry["size"] for entry in self.index["entries"].values()),
+                "unavailable": len(self.index["unavailable"]),
+                "hits": self.index["hits"],
+                "misses": self.index["misses"],
+                "hit_ratio": self.index["hits"] / lookup_count if lookup_count else 0.0,
+            }
@@ -0,0 +1,355 @@
+import collections
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+
+class RfbError(RuntimeError):
+    """
+    The VNC server refused the connection or authentication, or sent something this client cannot decode.
+    """
+
+
+class RfbClient:
+    """
+    Minimal RFB (VNC) client: input events go over the protocol, and a local framebuffer is kept up to date
+    by a reader thread that always has an incremental update request outstanding, so the server pushes
+    the dirty rectangles of every change.
+    - encodings: Raw and CopyRect, DesktopSize and Cursor as pseudo-encodings (the cursor shape is dropped,
+      so frames match xwd captures)
+    - per update, the changed pixels of each rectangle are counted row by row (old vs new content), so
+      "did the screen change" is answered from the updates instead of comparing screenshots
+    - security None or VNC authentication; DES from pycryptodome (cryptography as a fallback), imported on first use
+    """
+
+    PROTOCOL_VERSION_3_3 = (3, 3)
+    PROTOCOL_VERSION_3_7 = (3, 7)
+    PROTOCOL_VERSION_3_8 = (3, 8)
+    SECURITY_NONE = 1
+    SECURITY_VNC_AUTH = 2
+
+    RAW_ENCODING = 0
+    COPY_RECT_ENCODING = 1
+    DESKTOP_SIZE_ENCODING = -223
+    CURSOR_ENCODING = -239
+
+    # client -> server
+    SET_PIXEL_FORMAT = 0
+    SET_ENCODINGS = 2
+    FRAMEBUFFER_UPDATE_REQUEST = 3
+    KEY_EVENT = 4
+    POINTER_EVENT = 5
+    # server -> client
+    FRAMEBUFFER_UPDATE = 0
+    SET_COLOUR_MAP_ENTRIES = 1
+    BELL = 2
+    SERVER_CUT_TEXT = 3
+
+    # 32 bits per pixel, depth 24, little endian, true colour, 8 bits per channel: bytes B, G, R, padding
+    PIXEL_FORMAT = struct.pack(">BBBBHHHBBBxxx", 32, 24, 0, 1, 255, 255, 255, 16, 8, 0)
+    BYTES_PER_PIXEL = 4
+
+    # pointer button mask bits
+    LEFT_BUTTON = 1
+    MIDDLE_BUTTON = 2
+    RIGHT_BUTTON = 4
+    WHEEL_UP = 8
+    WHEEL_DOWN = 16
+
+    def __init__(self, host: str, port: int, password: str | None = None):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.sock = None
+        self.rfile = None
+        self.reader = None
+        self.send_lock = threading.Lock()
+        # guards the framebuffer and the change history, notified on every applied update
+        self.condition = threading.Condition()
+        self.width = 0
+        self.height = 0
+        self.name = ""
+        self.framebuffer = None
+        # number of framebuffer updates applied so far
+        self.serial = 0
+        # (serial, top row, changed pixels per row) of every rectangle that changed something
+        self.changes = collections.deque(maxlen=4096)
+        self.last_update_at = None
+        self.cut_text = None
+        self.error = None
+        self.closed = False
+
+    @staticmethod
+    def connect(host: str, port: int, password: str | None = None, timeout: float = 20.0) -> "RfbClient":
+        """
+        handshake (retried until timeout while the server is still starting), then wait for the first full frame
+        """
+        client = RfbClient(host, port, password)
+        deadline = time.time() + timeout
+        while True:
+            try:
+                client.sock = socket.create_connection((host, port), timeout=max(1.0, deadline - time.time()))
+                break
+            except OSError as e:
+                if time.time() >= deadline:
+                    raise RfbError(f"VNC server {host}:{port} not reachable: {e}")
+                time.sleep(0.5)
+        try:
+            client.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client.rfile = client.sock.makefile("rb")
+            client._handshake()
+            client.sock.settimeout(None)
+        except (OSError, struct.error) as e:
+            client.close()
+            raise RfbError(f"VNC handshake with {host}:{port} failed: {e}")
+        except RfbError:
+            client.close()
+            raise
+        client.reader = threading.Thread(target=client._read_loop, name=f"rfb-{port}", daemon=True)
+        client.reader.start()
+        if not client.wait_for_update(0, timeout=max(1.0, deadline - time.time())):
+            client.close()
+            raise RfbError(f"No framebuffer from {host}:{port}: {client.error or 'timeout'}")
+        return client
+
+    @staticmethod
+    def get_vnc_auth_response(password: str, challenge: bytes) -> bytes:
+        """
+        DES-encrypt the 16-byte challenge with the password (8 bytes, zero padded, each byte's bits mirrored,
+        as VNC does); pycryptodome (requirements.txt), else cryptography if installed
+        """
+        key = bytes(int(f"{byte:08b}"[::-1], 2) for byte in password.encode("latin-1")[:8].ljust(8, b"\0"))
+        try:
+            from Crypto.Cipher import DES
+            return DES.new(key, DES.MODE_ECB).encrypt(challenge)
+        except ImportError:
+            pass
+        try:
+            from cryptography.hazmat.primitives.ciphers import Cipher, modes
+        except ImportError:
+            raise RfbError("VNC authentication needs DES: pip install pycryptodome (or cryptography)")
+        try:
+            # cryptography >= 43 moved TripleDES to decrepit, the old name is deprecated and goes away
+            from cryptography.hazmat.decrepit.ciphers.algorithms import TripleDES
+        except ImportError:
+            from cryptography.hazmat.primitives.ciphers.algorithms import TripleDES
+        # 3DES with three equal keys is single DES
+        encryptor = Cipher(TripleDES(key * 3), modes.ECB()).encryptor()
+        return encryptor.update(challenge) + encryptor.finalize()
+
+    # protocol ########################################################################################################
+    def _read(self, size: int) -> bytes:
+        data = self.rfile.read(size) if size else b""
+        if len(data) < size:
+            raise RfbError(f"VNC server {self.host}:{self.port} closed the connection")
+        return data
+
+    def _read_reason(self) -> str:
+        length, = struct.unpack(">I", self._read(4))
+        return self._read(length).decode("utf-8", errors="ignore")
+
+    def _handshake(self) -> None:
+        server_version = self._read(12)
+        if not server_version.startswith(b"RFB "):
+            raise RfbError(f"Not a VNC server: {server_version!r}")
+        major, minor = int(server_version[4:7]), int(server_version[8:11])
+        version = min((major, minor), self.PROTOCOL_VERSION_3_8)
+        if version < self.PROTOCOL_VERSION_3_7:
+            version = self.PROTOCOL_VERSION_3_3
+        self.sock.sendall(f"RFB {version[0]:03d}.{version[1]:03d}\n".encode("ascii"))
+
+        if version == self.PROTOCOL_VERSION_3_3:
+            security_type, = struct.unpack(">I", self._read(4))
+            if security_type == 0:
+                raise RfbError(f"VNC connection refused: {self._read_reason()}")
+        else:
+            count, = struct.unpack(">B", self._read(1))
+            if count == 0:
+                raise RfbError(f"VNC connection refused: {self._read_reason()}")
+            security_types = self._read(count)
+            if self.SECURITY_NONE in security_types:
+                security_type = self.SECURITY_NONE
+            elif self.SECURITY_VNC_AUTH in security_types:
+                security_type = self.SECURITY_VNC_AUTH
+            else:
+                raise RfbError(f"No supported VNC security type in {list(security_types)}")
+            self.sock.sendall(struct.pack(">B", security_type))
+
+        if security_type == self.SECURITY_VNC_AUTH:
+            if self.password is None:
+                raise RfbError("VNC server asks for a password, none given")
+            self.sock.sendall(self.get_vnc_auth_response(self.password, self._read(16)))
+        elif security_type != self.SECURITY_NONE:
+            raise RfbError(f"Unsupported VNC security type {security_type}")
+        if security_type == self.SECURITY_VNC_AUTH or version == self.PROTOCOL_VERSION_3_8:
+            result, = struct.unpack(">I", self._read(4))
+            if result != 0:
+                reason = self._read_reason() if version == self.PROTOCOL_VERSION_3_8 else ""
+                raise RfbError(f"VNC authentication failed {reason}".strip())
+
+        # shared: a human watching the same display is not disconnected
+        self.sock.sendall(b"\x01")
+        self.width, self.height = struct.unpack(">HH", self._read(4))
+        self._read(16)  # the server's pixel format, replaced below
+        self.name = self._read_reason()
+        self.framebuffer = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        encodings = [self.COPY_RECT_ENCODING, self.RAW_ENCODING, self.DESKTOP_SIZE_ENCODING, self.CURSOR_ENCODING]
+        self.send(struct.pack(">Bxxx", self.SET_PIXEL_FORMAT) + self.PIXEL_FORMAT,
+                  struct.pack(f">BxH{len(encodings)}i", self.SET_ENCODINGS, len(encodings), *encodings),
+                  self.get_update_request(incremental=False))
+
+    def get_update_request(self, incremental: bool = True) -> bytes:
+        return struct.pack(">BBHHHH", self.FRAMEBUFFER_UPDATE_REQUEST, int(incremental), 0, 0, self.width, self.height)
+
+    def _read_loop(self) -> None:
+        try:
+            while True:
+                message_type, = struct.unpack(">B", self._read(1))
+                if message_type == self.FRAMEBUFFER_UPDATE:
+                    self._read_update()
+                    # the next request right away: the server answers it as soon as anything changes
+                    self.send(self.get_update_request())
+                elif message_type == self.SET_COLOUR_MAP_ENTRIES:
+                    _, count = struct.unpack(">xHH", self._read(5))
+                    self._read(count * 6)
+                elif message_type == self.BELL:
+                    continue
+                elif message_type == self.SERVER_CUT_TEXT:
+                    length, = struct.unpack(">xxxI", self._read(7))
+                    self.cut_text = self._read(length).decode("latin-1")
+                else:
+                    raise RfbError(f"Unknown VNC server message type {message_type}")
+        except (RfbError, OSError, struct.error, ValueError) as e:
+            with self.condition:
+                if not self.closed:
+                    self.error = e
+                self.condition.notify_all()
+
+    def _read_update(self) -> None:
+        rect_count, = struct.unpack(">xH", self._read(3))
+        changes = []
+        for _ in range(rect_count):
+            x, y, w, h, encoding = struct.unpack(">HHHHi", self._read(12))
+            if encoding == self.RAW_ENCODING:
+                data = self._read(w * h * self.BYTES_PER_PIXEL)
+                # B, G, R, padding -> R, G, B
+                pixels = np.frombuffer(data, dtype=np.uint8).reshape(h, w, self.BYTES_PER_PIXEL)[:, :, 2::-1]
+                changes.append((x, y, pixels))
+            elif encoding == self.COPY_RECT_ENCODING:
+                src_x, src_y = struct.unpack(">HH", self._read(4))
+                changes.append((x, y, (src_x, src_y, w, h)))
+            elif encoding == self.DESKTOP_SIZE_ENCODING:
+                changes.append((w, h, None))
+            elif encoding == self.CURSOR_ENCODING:
+                self._read(w * h * self.BYTES_PER_PIXEL + (w + 7) // 8 * h)
+            else:
+                raise RfbError(f"Unsupported VNC encoding {encoding}")
+        with self.condition:
+            self.serial += 1
+            for x, y, pixels in changes:
+                self._apply(x, y, pixels)
+            self.last_update_at = time.time()
+            self.condition.notify_all()
+
+    def _apply(self, x: int, y: int, pixels) -> None:
+        """
+        one rectangle into the framebuffer, recording its changed pixels per row; caller holds self.condition
+        """
+        if pixels is None:
+            # DesktopSize: x, y are the new width and height
+            self.width, self.height = x, y
+            self.framebuffer = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+            self.changes.append((self.serial, 0, np.full(self.height, self.width)))
+            return
+        if isinstance(pixels, tuple):
+            src_x, src_y, w, h = pixels
+            pixels = self.framebuffer[src_y:src_y + h, src_x:src_x + w].copy()
+        h, w = pixels.shape[0], pixels.shape[1]
+        target = self.framebuffer[y:y + h, x:x + w]
+        pixels = pixels[:target.shape[0], :target.shape[1]]
+        row_changes = np.count_nonzero(np.any(target != pixels, axis=2), axis=1)
+        if row_changes.any():
+            self.changes.append((self.serial, y, row_changes))
+            target[...] = pixels
+
+    # framebuffer #####################################################################################################
+    def is_alive(self) -> bool:
+        return not self.closed and self.error is None and self.reader is not None and self.reader.is_alive()
+
+    def get_pixels(self) -> np.ndarray:
+        """
+        copy of the framebuffer, RGB (height, width, 3)
+        """
+        with self.condition:
+            if self.error is not None:
+                raise RfbError(f"VNC connection to {self.host}:{self.port} lost: {self.error}")
+            return self.framebuffer.copy()
+
+    def wait_for_update(self, since_serial: int, timeout: float) -> bool:
+        """
+        whether an update after since_serial arrived within timeout (seconds)
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: self.serial > since_serial or self.error is not None
+                                           or self.closed, timeout=timeout) and self.serial > since_serial
+
+    def get_changed_pixels(self, since_serial: int, ignore_top: int = 0) -> tuple[int, int]:
+        """
+        (pixels changed by the updates after since_serial, below row ignore_top; the current serial)
+        """
+        with self.condition:
+            changed_pixels = 0
+            for serial, y, row_changes in self.changes:
+                if serial > since_serial:
+                    changed_pixels += int(row_changes[max(0, ignore_top - y):].sum())
+            return changed_pixels, self.serial
+
+    # input ###########################################################################################################
+    def send(self, *messages: bytes) -> None:
+        """
+        messages in one write, so a whole gesture or text reaches the server at once
+        """
+        try:
+            with self.send_lock:
+                self.sock.sendall(b"".join(messages))
+        except OSError as e:
+            raise RfbError(f"VNC connection to {self.host}:{self.port} lost: {e}")
+
+    @staticmethod
+    def get_pointer_event(x: int, y: int, button_mask: int = 0) -> bytes:
+        return struct.pack(">BBHH", RfbClient.POINTER_EVENT, button_mask, max(0, x), max(0, y))
+
+    @staticmethod
+    def get_key_event(keysym: int, down: bool) -> bytes:
+        return struct.pack(">BBxxI", RfbClient.KEY_EVENT, int(down), keysym)
+
+    def click(self, x: int, y: int, button_mask: int = LEFT_BUTTON, repeat: int = 1) -> None:
+        events = [self.get_pointer_event(x, y)]
+        for _ in range(repeat):
+            events += [self.get_pointer_event(x, y, button_mask), self.get_pointer_event(x, y)]
+        self.send(*events)
+
+    def key_combo(self, keysyms: list[int]) -> None:
+        """
+        press keysyms in order, release them in reverse (e.g. ctrl+shift+t)
+        """
+        self.send(*[self.get_key_event(keysym, True) for keysym in keysyms],
+                  *[self.get_key_event(keysym, False) for keysym in reversed(keysyms)])
+
+    def type_keysyms(self, keysyms: list[int]) -> None:
+        self.send(*[event for keysym in keysyms
+                    for event in (self.get_key_event(keysym, True), self.get_key_event(keysym, False))])
+
+    def close(self) -> None:
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.sock.close()
@@ -0,0 +1,101 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+from config import SETTLE_PROFILE_MIN_SAMPLES, SETTLE_PROFILE_MAX_SAMPLES, SETTLE_PROFILE_TIMEOUT_FACTOR, \
+    SETTLE_PROFILE_MIN_DELAY_MS, SETTLE_PROFILE_MAX_TIMEOUT_MS
+
+
+class SettleProfile:
+    """
+    Learned settle times per (app, build, action kind), persisted as JSON next to the outputs.
+    A settle time is when the screen last changed after an action (the timeout if it never settled).
+    DockerComputer.settle takes its initial polling delay (p10) and timeout (p95 * factor) from here
+    once enough samples exist, instead of the fixed wait_time.
+
+    {"<app>|<build>|<action kind>": [settle_ms, ...]}, with build "*" for all builds of the app
+    """
+
+    ALL_BUILDS = "*"
+
+    # one profile per file, shared by every DockerComputer of the process
+    shared_profiles = {}
+    shared_profiles_lock = threading.Lock()
+
+    def __init__(self, filepath):
+        self.filepath = Path(filepath)
+        self.lock = threading.Lock()
+        self.samples = {}
+        if self.filepath.exists():
+            try:
+                with open(self.filepath, "r") as f:
+                    self.samples = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"[!] Ignore unreadable settle profile {self.filepath}: {e}")
+
+    @staticmethod
+    def get_shared(filepath):
+        with SettleProfile.shared_profiles_lock:
+            key = str(filepath)
+            if key not in SettleProfile.shared_profiles:
+                SettleProfile.shared_profiles[key] = SettleProfile(filepath)
+            return SettleProfile.shared_profiles[key]
+
+    @staticmethod
+    def get_action_kind(action, keys=None):
+        """
+        keypresses are told apart by combo (ctrl+o opens a file dialog, ctrl+s saves...), other actions by name
+        """
+        if action == "keypress" and keys:
+            return f"keypress:{'+'.join(key.lower() for key in keys)}"
+        return action
+
+    @staticmethod
+    def get_keys(app, build, action_kind):
+        """
+        lookup order, most specific first: this build, then all builds; exact action kind, then its base action
+        """
+        action_kinds = [action_kind]
+        if ":" in action_kind:
+            action_kinds.append(action_kind.split(":", 1)[0])
+        return [f"{app}|{one_build}|{one_action_kind}"
+                for one_action_kind in action_kinds
+                for one_build in [build, SettleProfile.ALL_BUILDS] if one_build is not None]
+
+    def record(self, app, build, action_kind, settle_ms):
+        keys = self.get_keys(app, build, action_kind)
+        with self.lock:
+            for key in keys:
+                self.samples[key] = (self.samples.get(key, []) + [int(settle_ms)])[-SETTLE_PROFILE_MAX_SAMPLES:]
+
+    @staticmethod
+    def get_percentile(values, percentile):
+        values = sorted(values)
+        return values[min(len(values) - 1, int(len(values) * percentile / 100))]
+
+    def get_timing(self, app, build, action_kind, stable_ms, default_min_ms, default_timeout_ms):
+        """
+        (initial polling delay, timeout) in ms for the next settle, the defaults while samples are scarce
+        """
+        with self.lock:
+            for key in self.get_keys(app, build, action_kind):
+                samples = self.samples.get(key, [])
+                if len(samples) >= SETTLE_PROFILE_MIN_SAMPLES:
+                    break
+            else:
+                return default_min_ms, default_timeout_ms
+        timeout_ms = int(self.get_percentile(samples, 95) * SETTLE_PROFILE_TIMEOUT_FACTOR) + stable_ms
+        timeout_ms = min(max(timeout_ms, stable_ms + SETTLE_PROFILE_MIN_DELAY_MS), SETTLE_PROFILE_MAX_TIMEOUT_MS)
+        min_ms = min(max(self.get_percentile(samples, 10), SETTLE_PROFILE_MIN_DELAY_MS), timeout_ms)
+        return min_ms, timeout_ms
+
+    def save(self):
+        with self.lock:
+            data = json.dumps(self.samples)
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        # write then rename, so a crash never leaves half a profile
+        tmp_filepath = self.filepath.with_name(f".{self.filepath.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_filepath, "w") as f:
+            f.write(data)
+        os.replace(tmp_filepath, self.filepath)
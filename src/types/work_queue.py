@@ -0,0 +1,138 @@
+import json
+import os
+import shutil
+import socket
+import time
+from pathlib import Path
+
+
+class WorkQueue:
+    """
+    Directory-based task queue shared by the coordinator and the workers, e.g. on an NFS mount.
+
+    root/pending/<task_id>.json      waiting for a worker
+    root/running/<task_id>.json      claimed (os.rename is atomic, so only one worker gets a task)
+    root/done/<task_id>.json         result, artifacts in root/artifacts/<task_id>
+    root/failed/<task_id>.json       result with the error message
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    ARTIFACTS = "artifacts"
+
+    def __init__(self, root):
+        self.root = Path(root)
+        for name in [self.PENDING, self.RUNNING, self.DONE, self.FAILED, self.ARTIFACTS]:
+            Path(self.root, name).mkdir(parents=True, exist_ok=True)
+
+    def _path(self, state, task_id):
+        return Path(self.root, state, f"{task_id}.json")
+
+    @staticmethod
+    def _write_json(filepath, data):
+        # write then rename, so a reader never sees half a file
+        tmp_filepath = filepath.with_name(f".{filepath.name}.{os.getpid()}.tmp")
+        with open(tmp_filepath, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_filepath, filepath)
+
+    @staticmethod
+    def _read_json(filepath):
+        with open(filepath, "r") as f:
+            return json.load(f)
+
+    # coordinator #####################################################################################################
+    def put(self, task_id, payload):
+        for state in [self.RUNNING, self.DONE, self.FAILED]:
+            self._path(state, task_id).unlink(missing_ok=True)
+        shutil.rmtree(Path(self.root, self.ARTIFACTS, task_id), ignore_errors=True)
+        self._write_json(self._path(self.PENDING, task_id), {"task_id": task_id, "payload": payload,
+                                                              "submitted_at": time.time()})
+
+    def get_result(self, task_id):
+        """
+        (state, result) once the task is done or failed, else (None, None)
+        """
+        for state in [self.DONE, self.FAILED]:
+            filepath = self._path(state, task_id)
+            if filepath.exists():
+                return state, self._read_json(filepath)
+        return None, None
+
+    def get_artifacts_path(self, task_id):
+        return Path(self.root, self.ARTIFACTS, task_id)
+
+    def requeue_stale(self, lease_timeout):
+        """
+        move running tasks whose worker has not heartbeat for lease_timeout seconds back to pending
+        """
+        requeued = []
+        for filepath in Path(self.root, self.RUNNING).glob("*.json"):
+            try:
+                if time.time() - filepath.stat().st_mtime < lease_timeout:
+                    continue
+                os.rename(filepath, Path(self.root, self.PENDING, filepath.name))
+                requeued.append(filepath.stem)
+            except FileNotFoundError:
+                # finished or requeued in the meantime
+                continue
+        return requeued
+
+    # worker ##########################################################################################################
+    def claim(self, worker_id=None):
+        """
+        take the oldest pending task, None if the queue is empty
+        """
+        worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        for filepath, _ in sorted(self._get_pending_mtimes(), key=lambda item: item[1]):
+            running_filepath = Path(self.root, self.RUNNING, filepath.name)
+            try:
+                os.rename(filepath, running_filepath)
+                # rename keeps the submission mtime, requeue_stale would take a long-pending task for a lost one
+                os.utime(running_filepath)
+                task = self._read_json(running_filepath)
+                task["worker_id"] = worker_id
+                task["claimed_at"] = time.time()
+                self._write_json(running_filepath, task)
+            except FileNotFoundError:
+                # another worker was faster, or the task was requeued in the meantime
+                continue
+            return task
+        return None
+
+    def _get_pending_mtimes(self):
+        """
+        [(filepath, mtime)] of the pending tasks, without the ones claimed while listing
+        """
+        pending_mtimes = []
+        for filepath in Path(self.root, self.PENDING).glob("*.json"):
+            try:
+                pending_mtimes.append((filepath, filepath.stat().st_mtime))
+            except FileNotFoundError:
+                continue
+        return pending_mtimes
+
+    def heartbeat(self, task_id):
+        running_filepath = self._path(self.RUNNING, task_id)
+        if running_filepath.exists():
+            os.utime(running_filepath)
+
+    def complete(self, task, result, artifacts_path=None):
+        """
+        upload the artifacts folder, then publish the result
+        """
+        task_id = task["task_id"]
+        if artifacts_path is not None and Path(artifacts_path).exists():
+            shutil.copytree(artifacts_path, self.get_artifacts_path(task_id), dirs_exist_ok=True)
+        self._finish(task, self.DONE, result)
+
+    def fail(self, task, error):
+        self._finish(task, self.FAILED, {"error": f"{error}"})
+
+    def _finish(self, task, state, result):
+        task_id = task["task_id"]
+        self._write_json(self._path(state, task_id), {"task_id": task_id, "worker_id": task.get("worker_id"),
+                                                      "finished_at": time.time(), "result": result})
+        self._path(self.RUNNING, task_id).unlink(missing_ok=True)
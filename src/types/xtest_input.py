@@ -0,0 +1,189 @@
+import json
+import subprocess
+import threading
+
+# Runs inside the container (python3 -u -c, needs python3-xlib): one JSON request per stdin line with the events of
+# one action, one JSON response per stdout line once they are injected with the XTest extension.
+# Events: ["move", x, y], ["button", button, down], ["key", keysym, down], ["text", [keysym, ...], delay_ms],
+#         ["sleep", ms]
+# A keysym the keyboard map lacks is bound to a spare keycode first, as xdotool does; a shifted keysym is
+# pressed with Shift.
+# stdout: {"ready"} (or {"ready": false, "error"}) once, then {"id", "ok"} or {"id", "ok": false, "error", "injected"},
+# injected: input events of the request already sent to the X server when it failed
+XTEST_SCRIPT = r'''
+import json, sys, time
+try:
+    from Xlib import X, XK, display as xdisplay
+    from Xlib.ext import xtest
+    display = xdisplay.Display()
+    if not display.has_extension("XTEST"):
+        raise RuntimeError(f"no XTEST extension on {display.get_display_name()}")
+except Exception as e:
+    print(json.dumps({"ready": False, "error": f"{type(e).__name__}: {e}"}), flush=True)
+    sys.exit(0)
+
+min_keycode, max_keycode = display.display.info.min_keycode, display.display.info.max_keycode
+shift_keycode = display.keysym_to_keycode(XK.XK_Shift_L)
+keyboard_mapping = display.get_keyboard_mapping(min_keycode, max_keycode - min_keycode + 1)
+spare_keycodes = [min_keycode + index for index, keysyms in enumerate(keyboard_mapping) if not any(keysyms)]
+bound_keycodes = {}  # keysym -> spare keycode it is bound to
+injected = 0  # fake inputs of the current request
+
+
+def fake_input(event_type, detail=0, **kwargs):
+    global injected
+    xtest.fake_input(display, event_type, detail, **kwargs)
+    injected += 1
+
+
+def get_keycode(keysym):
+    if keysym in bound_keycodes:
+        return bound_keycodes[keysym], False
+    for keycode, index in display.keysym_to_keycodes(keysym):
+        if index in (0, 1):
+            return keycode, index == 1
+    if not spare_keycodes:
+        raise RuntimeError(f"no keycode for keysym {keysym:#x}")
+    keycode = spare_keycodes[len(bound_keycodes) % len(spare_keycodes)]
+    for other_keysym, other_keycode in list(bound_keycodes.items()):
+        if other_keycode == keycode:
+            del bound_keycodes[other_keysym]
+    display.change_keyboard_mapping(keycode, [(keysym, keysym)])
+    display.sync()
+    bound_keycodes[keysym] = keycode
+    return keycode, False
+
+
+def key(keysym, down):
+    keycode, shift = get_keycode(keysym)
+    if shift and down:
+        fake_input(X.KeyPress, shift_keycode)
+    fake_input(X.KeyPress if down else X.KeyRelease, keycode)
+    if shift and not down:
+        fake_input(X.KeyRelease, shift_keycode)
+
+
+def run(event):
+    kind = event[0]
+    if kind == "move":
+        fake_input(X.MotionNotify, x=event[1], y=event[2])
+    elif kind == "button":
+        fake_input(X.ButtonPress if event[2] else X.ButtonRelease, event[1])
+    elif kind == "key":
+        key(event[1], event[2])
+    elif kind == "text":
+        for keysym in event[1]:
+            key(keysym, True)
+            key(keysym, False)
+            if event[2]:
+                display.sync()
+                time.sleep(event[2] / 1000)
+    elif kind == "sleep":
+        display.sync()
+        time.sleep(event[1] / 1000)
+    else:
+        raise ValueError(f"unknown event {kind}")
+
+
+print(json.dumps({"ready": True}), flush=True)
+for line in sys.stdin:
+    request = json.loads(line)
+    injected = 0
+    try:
+        for event in request["events"]:
+            run(event)
+        display.sync()
+        response = {"id": request["id"], "ok": True}
+    except Exception as e:
+        response = {"id": request["id"], "ok": False, "error": f"{type(e).__name__}: {e}", "injected": injected}
+    sys.stdout.write(json.dumps(response) + "\n")
+    sys.stdout.flush()
+'''
+
+
+class XTestInputError(RuntimeError):
+    """
+    The input process is gone, could not start (e.g. no python3-xlib in the image) or failed to inject an event.
+    injected: input events of the action that reached the X server before the failure, None if unknown
+    """
+
+    def __init__(self, message: str, injected: int | None = 0):
+        super().__init__(message)
+        self.injected = injected
+
+
+class XTestInput:
+    """
+    One persistent process per display injecting input with XTest (XTEST_SCRIPT): an action costs a line over
+    the `docker exec -i` pipe instead of an xdotool process, so typing throughput does not depend on process spawns.
+    """
+
+    def __init__(self, container_name: str, env: dict[str, str]):
+        self.container_name = container_name
+        # DISPLAY (and the display's XDG folders, see DockerComputer.get_env)
+        self.env = env
+        self.process = None
+        self.request_id = 0
+        self.lock = threading.Lock()
+
+    def start(self) -> None:
+        self.process = subprocess.Popen(
+            ["docker", "exec", "-i", *[arg for key, value in self.env.items() for arg in ["-e", f"{key}={value}"]],
+             self.container_name, "bash", "-lc", 'exec python3 -u -c "$0"', XTEST_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+        )
+        ready = self._read_response()
+        if not ready.get("ready"):
+            self.close()
+            raise XTestInputError(f"XTest input in {self.container_name} unavailable: {ready.get('error')}")
+        print(f"[+] XTest input started in {self.container_name} ({self.env.get('DISPLAY')})")
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def _read_response(self) -> dict:
+        line = self.process.stdout.readline()
+        if not line:
+            raise XTestInputError(f"XTest input in {self.container_name} exited")
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError:
+            raise XTestInputError(f"XTest input in {self.container_name} answered garbage: {line[:200]!r}")
+
+    def send(self, events: list[list]) -> None:
+        """
+        inject the events of one action, return once the X server has them
+        """
+        with self.lock:
+            if not self.is_alive():
+                self.start()
+            self.request_id += 1
+            try:
+                self.process.stdin.write(json.dumps({"id": self.request_id, "events": events}) + "\n")
+                self.process.stdin.flush()
+            except (BrokenPipeError, OSError) as e:
+                raise XTestInputError(f"XTest input in {self.container_name} is gone: {e}")
+            try:
+                response = self._read_response()
+            except XTestInputError as e:
+                # the process died while injecting: some events may have reached the X server
+                raise XTestInputError(str(e), injected=None)
+        if not response["ok"]:
+            raise XTestInputError(f"XTest input in {self.container_name} failed: {response['error']}",
+                                  injected=response.get("injected"))
+
+    def close(self) -> None:
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+            try:
+                self.process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
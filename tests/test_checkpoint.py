@@ -0,0 +1,82 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.pipelines.placeholder import Placeholder
+
+try:
+    from src.pipelines.executor import Executor
+    EXECUTOR_IMPORT_ERROR = None
+except Exception as e:
+    # importing the executor needs the LLM API keys (GPTUtil clients) and an X display (pyautogui)
+    Executor = None
+    EXECUTOR_IMPORT_ERROR = f"src.pipelines.executor not importable: {e}"
+
+
+@unittest.skipIf(Executor is None, EXECUTOR_IMPORT_ERROR)
+class CheckpointTest(unittest.TestCase):
+    """
+    Executor.load_checkpoint on Play checkpoints written by Executor.append_checkpoint
+    """
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.checkpoint_filepath = Path(tmp_dir.name, f"{Placeholder.PLAYER}_checkpoint.jsonl")
+
+    def append(self, record):
+        Executor.append_checkpoint(self.checkpoint_filepath, record)
+
+    def append_answer(self, loop_index, new_messages, tool_use_id):
+        self.append({Placeholder.CHECKPOINT_KIND: Placeholder.ANSWER,
+                     Placeholder.CHECKPOINT_LOOP_INDEX: loop_index,
+                     Placeholder.ANSWER: {Placeholder.STEP: f"step {loop_index}"},
+                     Placeholder.CHECKPOINT_NEW_MESSAGES: new_messages,
+                     Placeholder.CHECKPOINT_TOOL_USE_ID: tool_use_id})
+
+    def append_ui_instruction(self, screenshot):
+        self.append({Placeholder.CHECKPOINT_KIND: Placeholder.UI_INSTRUCTION,
+                     Placeholder.OUTPUT: {Placeholder.SCREENSHOT: screenshot}})
+
+    def write_play(self):
+        self.append({Placeholder.CHECKPOINT_KIND: Placeholder.CHECKPOINT_START,
+                     Placeholder.REUSABLE_INSTRUCTIONS: {"steps": ["open"]}})
+        self.append_answer(0, ["user 0", "assistant 0"], "tool-0")
+        self.append_ui_instruction("s0")
+        self.append_ui_instruction("s1")
+        self.append_answer(1, ["user 1", "assistant 1"], "tool-1")
+        self.append_ui_instruction("s2")
+
+    def test_load(self):
+        self.write_play()
+        checkpoint = Executor.load_checkpoint(self.checkpoint_filepath)
+        self.assertEqual(checkpoint[Placeholder.REUSABLE_INSTRUCTIONS], {"steps": ["open"]})
+        self.assertEqual(checkpoint[Placeholder.CHECKPOINT_MESSAGES],
+                         ["user 0", "assistant 0", "user 1", "assistant 1"])
+        self.assertEqual([output[Placeholder.SCREENSHOT] for output in checkpoint[Placeholder.OUTPUT]],
+                         ["s0", "s1", "s2"])
+        answers = checkpoint[Placeholder.ANSWER]
+        self.assertEqual([(answer[Placeholder.CHECKPOINT_LOOP_INDEX], answer[Placeholder.CHECKPOINT_TOOL_USE_ID],
+                           answer[Placeholder.CHECKPOINT_DONE_INSTRUCTION_COUNT]) for answer in answers],
+                         [(0, "tool-0", 2), (1, "tool-1", 1)])
+        self.assertNotIn(Placeholder.CHECKPOINT_NEW_MESSAGES, answers[-1])
+
+    def test_torn_last_line_is_ignored(self):
+        self.write_play()
+        with open(self.checkpoint_filepath, "a") as f:
+            f.write(json.dumps({Placeholder.CHECKPOINT_KIND: Placeholder.UI_INSTRUCTION,
+                                Placeholder.OUTPUT: {Placeholder.SCREENSHOT: "s3"}})[:20])
+        checkpoint = Executor.load_checkpoint(self.checkpoint_filepath)
+        self.assertEqual(len(checkpoint[Placeholder.OUTPUT]), 3)
+        self.assertEqual(checkpoint[Placeholder.ANSWER][-1][Placeholder.CHECKPOINT_DONE_INSTRUCTION_COUNT], 1)
+
+    def test_crash_before_first_answer(self):
+        self.append({Placeholder.CHECKPOINT_KIND: Placeholder.CHECKPOINT_START,
+                     Placeholder.REUSABLE_INSTRUCTIONS: None})
+        checkpoint = Executor.load_checkpoint(self.checkpoint_filepath)
+        self.assertEqual((checkpoint[Placeholder.ANSWER], checkpoint[Placeholder.OUTPUT]), ([], []))
+
+
+if __name__ == "__main__":
+    unittest.main()
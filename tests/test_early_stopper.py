@@ -0,0 +1,51 @@
+import unittest
+
+from src.pipelines.early_stopper import EarlyStopper
+
+
+class EarlyStopperTest(unittest.TestCase):
+    """
+    EarlyStopper duplicate detection and the low-yield streak
+    """
+
+    @staticmethod
+    def get_bug_reports(*summaries):
+        return [{"summary": summary} for summary in summaries]
+
+    def test_near_duplicates_are_not_new(self):
+        stopper = EarlyStopper()
+        self.assertEqual(stopper.record(0, self.get_bug_reports("Save button does nothing",
+                                                                "Sidebar overlaps the editor")), 2)
+        self.assertEqual(stopper.record(1, self.get_bug_reports("save  button does  nothing.",
+                                                                "Export menu is empty")), 1)
+        self.assertEqual(stopper.new_bug_report_counts, {0: 2, 1: 1})
+
+    def test_stop_after_patience_low_yield_scenarios(self):
+        stopper = EarlyStopper(patience=2)
+        stopper.record(0, self.get_bug_reports("Save button does nothing"))
+        stopper.record(1, self.get_bug_reports("Save button does nothing"))
+        self.assertFalse(stopper.should_stop())
+        stopper.record(2, [])
+        self.assertTrue(stopper.should_stop())
+
+    def test_new_bug_report_resets_streak(self):
+        stopper = EarlyStopper(patience=2)
+        stopper.record(0, [])
+        stopper.record(1, self.get_bug_reports("Export menu is empty"))
+        stopper.record(2, [])
+        self.assertFalse(stopper.should_stop())
+
+    def test_no_patience_never_stops(self):
+        stopper = EarlyStopper(patience=None)
+        for index in range(5):
+            stopper.record(index, [])
+        self.assertFalse(stopper.should_stop())
+
+    def test_get_bug_reports(self):
+        detector_output = [{"bug_reports": self.get_bug_reports("a")}, None, {}, {"bug_reports": self.get_bug_reports("b")}]
+        self.assertEqual(EarlyStopper.get_bug_reports(detector_output), self.get_bug_reports("a", "b"))
+        self.assertEqual(EarlyStopper.get_bug_reports(None), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
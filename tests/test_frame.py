@@ -0,0 +1,74 @@
+import struct
+import unittest
+
+import numpy as np
+
+from src.types.frame import Frame
+
+
+class FrameTest(unittest.TestCase):
+    """
+    Frame.from_xwd on hand-built xwd dumps, and Frame.diff_ratio
+    """
+
+    @staticmethod
+    def get_xwd(pixels, byte_order=0, pad_bytes=4, ncolors=2, window_name=b"root\0"):
+        """
+        32 bits per pixel TrueColor ZPixmap, like `xwd -root -silent` on Xvfb; rows padded by pad_bytes
+        """
+        height, width = pixels.shape[:2]
+        bytes_per_line = width * 4 + pad_bytes
+        header_size = Frame.XWD_HEADER_FIELD_COUNT * 4 + len(window_name)
+        fields = [header_size, Frame.XWD_FILE_VERSION, Frame.XWD_Z_PIXMAP, 24, width, height, 0, byte_order,
+                  32, byte_order, 32, 32, bytes_per_line, 4, 0xff0000, 0x00ff00, 0x0000ff, 8, 256, ncolors,
+                  width, height, 0, 0, 0]
+        data = struct.pack(">25I", *fields) + window_name + b"\xaa" * (ncolors * Frame.XWD_COLOR_SIZE)
+        for row in pixels:
+            for red, green, blue in row:
+                value = struct.pack(">I", (int(red) << 16) | (int(green) << 8) | int(blue))
+                data += value[::-1] if byte_order == 0 else value
+            data += b"\xff" * pad_bytes
+        return data
+
+    def setUp(self):
+        self.pixels = np.array([[[255, 0, 0], [0, 255, 0], [0, 0, 255]],
+                                [[1, 2, 3], [250, 128, 7], [0, 0, 0]]], dtype=np.uint8)
+
+    def test_from_xwd_lsb_first(self):
+        frame = Frame.from_xwd(self.get_xwd(self.pixels, byte_order=0))
+        self.assertEqual((frame.width, frame.height), (3, 2))
+        np.testing.assert_array_equal(frame.pixels, self.pixels)
+
+    def test_from_xwd_msb_first(self):
+        frame = Frame.from_xwd(self.get_xwd(self.pixels, byte_order=1))
+        np.testing.assert_array_equal(frame.pixels, self.pixels)
+
+    def test_from_xwd_without_colormap_or_padding(self):
+        frame = Frame.from_xwd(self.get_xwd(self.pixels, pad_bytes=0, ncolors=0))
+        np.testing.assert_array_equal(frame.pixels, self.pixels)
+
+    def test_from_xwd_unsupported(self):
+        data = bytearray(self.get_xwd(self.pixels))
+        data[4:8] = struct.pack(">I", 6)
+        with self.assertRaises(ValueError):
+            Frame.from_xwd(bytes(data))
+
+    def test_base64_round_trip(self):
+        frame = Frame(self.pixels)
+        np.testing.assert_array_equal(Frame.from_base64_png(frame.to_base64()).pixels, self.pixels)
+
+    def test_diff_ratio(self):
+        changed_pixels = self.pixels.copy()
+        changed_pixels[0, 0] = [254, 0, 0]
+        frame, changed_frame = Frame(self.pixels), Frame(changed_pixels)
+        self.assertEqual(frame.diff_ratio(Frame(self.pixels.copy())), 0.0)
+        self.assertAlmostEqual(frame.diff_ratio(changed_frame), 100.0 / 6)
+        # the change is in the ignored top row
+        self.assertEqual(frame.diff_ratio(changed_frame, ignore_top=1), 0.0)
+
+    def test_diff_ratio_other_size(self):
+        self.assertEqual(Frame(self.pixels).diff_ratio(Frame(self.pixels[:1])), 100.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.types.job_store import JobStore
+
+
+class JobStoreTest(unittest.TestCase):
+    """
+    JobStore stage transitions, which of them count as finished, and what a restarted run sees
+    """
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.db_filepath = Path(tmp_dir.name, "jobs.db")
+        self.job_store = self.open_job_store()
+
+    def open_job_store(self):
+        job_store = JobStore(self.db_filepath)
+        self.addCleanup(job_store.close)
+        return job_store
+
+    def test_transitions(self):
+        job = self.job_store.scenario_job("pr-1", 0)
+        self.assertFalse(job.is_finished(JobStore.STAGE_EXECUTE))
+        job.start(JobStore.STAGE_EXECUTE)
+        self.assertFalse(job.is_finished(JobStore.STAGE_EXECUTE))
+        job.fail(JobStore.STAGE_EXECUTE, error=RuntimeError("container died"))
+        self.assertFalse(job.is_finished(JobStore.STAGE_EXECUTE))
+        self.assertEqual(self.job_store.get_job("pr-1", 0, JobStore.STAGE_EXECUTE)["error"], "container died")
+        job.done(JobStore.STAGE_EXECUTE, output_path="/tmp/out", cost=0.5, duration_mins=2.0)
+        self.assertTrue(job.is_done(JobStore.STAGE_EXECUTE))
+        self.assertTrue(job.is_finished(JobStore.STAGE_EXECUTE))
+        self.assertEqual(job.get_output_path(JobStore.STAGE_EXECUTE), Path("/tmp/out"))
+        self.assertIsNone(self.job_store.get_job("pr-1", 0, JobStore.STAGE_EXECUTE)["error"])
+
+    def test_skipped_is_finished_but_not_done(self):
+        job = self.job_store.scenario_job("pr-1", 0)
+        job.skip(JobStore.STAGE_DETECT, reason="no replay output")
+        self.assertTrue(job.is_finished(JobStore.STAGE_DETECT))
+        self.assertFalse(job.is_done(JobStore.STAGE_DETECT))
+        self.assertFalse(job.is_finished(JobStore.STAGE_REPLAY))
+        self.assertFalse(self.job_store.is_finished("pr-1", 1, JobStore.STAGE_DETECT))
+
+    def test_cost_and_duration_of_done_jobs(self):
+        self.job_store.done("pr-1", 0, JobStore.STAGE_EXECUTE, cost=1.0, duration_mins=3.0)
+        self.job_store.done("pr-1", 0, JobStore.STAGE_DETECT, cost=0.25, duration_mins=1.0)
+        self.job_store.done("pr-2", 0, JobStore.STAGE_EXECUTE, cost=2.0, duration_mins=4.0)
+        self.job_store.start("pr-2", 1, JobStore.STAGE_EXECUTE)
+        self.assertEqual(self.job_store.get_cost_and_duration("pr-1"), (1.25, 4.0))
+        self.assertEqual(self.job_store.get_cost_and_duration(), (3.25, 8.0))
+
+    def test_restarted_run(self):
+        self.job_store.register_pr("pr-1", "/tmp/pr-1")
+        self.job_store.done("pr-1", 0, JobStore.STAGE_EXECUTE)
+        self.assertFalse(self.job_store.is_pr_done("pr-1"))
+        self.job_store.set_pr_status("pr-1", JobStore.STATUS_DONE)
+        self.job_store.close()
+
+        job_store = self.open_job_store()
+        self.assertTrue(job_store.is_pr_done("pr-1"))
+        self.assertEqual(job_store.get_pr_output_path("pr-1"), Path("/tmp/pr-1"))
+        self.assertTrue(job_store.is_done("pr-1", 0, JobStore.STAGE_EXECUTE))
+        self.assertIsNone(job_store.get_pr_output_path("pr-2"))
+
+
+if __name__ == "__main__":
+    unittest.main()
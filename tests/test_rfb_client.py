@@ -0,0 +1,27 @@
+import unittest
+
+from src.types.rfb_client import RfbClient
+
+
+class RfbClientTest(unittest.TestCase):
+    """
+    RfbClient.get_vnc_auth_response against known VNC authentication responses
+    """
+
+    def test_known_response(self):
+        response = RfbClient.get_vnc_auth_response("secret", bytes(range(16)))
+        self.assertEqual(response.hex(), "ee22539f33a5983ec12f9c2edbc995dd")
+
+    def test_password_truncated_to_8_bytes(self):
+        challenge = bytes(range(16, 32))
+        self.assertEqual(RfbClient.get_vnc_auth_response("password", challenge),
+                         RfbClient.get_vnc_auth_response("password-and-more", challenge))
+
+    def test_short_password_zero_padded(self):
+        challenge = bytes(range(16))
+        self.assertEqual(RfbClient.get_vnc_auth_response("abc", challenge),
+                         RfbClient.get_vnc_auth_response("abc\0\0\0\0\0", challenge))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+from unittest import mock
+
+from src.pipelines.placeholder import Placeholder
+from src.pipelines.scheduler import ScenarioScheduler
+from src.types.budget import Budget
+
+
+class BudgetTest(unittest.TestCase):
+    """
+    Budget limits, None meaning unlimited
+    """
+
+    def test_unlimited(self):
+        budget = Budget()
+        budget.charge(cost=100.0, llm_calls=100)
+        self.assertTrue(budget.can_afford(cost=100.0, minutes=100.0, llm_calls=100))
+        self.assertEqual(budget.get_used_ratio(), 0.0)
+
+    def test_cost_and_llm_calls(self):
+        budget = Budget(max_cost=10.0, max_llm_calls=4)
+        budget.charge(cost=6.0, llm_calls=1)
+        self.assertEqual(budget.get_used_ratio(), 0.6)
+        self.assertTrue(budget.can_afford(cost=4.0))
+        self.assertFalse(budget.can_afford(cost=4.5))
+        budget.charge(llm_calls=2)
+        self.assertEqual(budget.get_used_ratio(), 0.75)
+        self.assertFalse(budget.can_afford(llm_calls=2))
+
+    def test_minutes(self):
+        budget = Budget(max_minutes=10)
+        with mock.patch("src.types.budget.time.time", return_value=budget.started_at + 9 * 60):
+            self.assertAlmostEqual(budget.get_used_ratio(), 0.9)
+            self.assertTrue(budget.can_afford(minutes=1.0))
+            self.assertFalse(budget.can_afford(minutes=1.5))
+
+
+class ScenarioSchedulerTest(unittest.TestCase):
+    """
+    ScenarioScheduler order, admission from the mean scenario cost, and degraded settings
+    """
+
+    @staticmethod
+    def get_replay_output(cost, minutes_after, minutes_before, llm_calls):
+        outputs = [{Placeholder.ANSWER: {Placeholder.CHAIN_OF_THOUGHTS: "click"}}] * llm_calls
+        return {Placeholder.TOTAL_COST: cost, Placeholder.OUTPUT: outputs + [{Placeholder.ANSWER: None}],
+                f"{Placeholder.DURATION_MINS}_AFTER_CHANGE": minutes_after,
+                f"{Placeholder.DURATION_MINS}_BEFORE_CHANGE": minutes_before}
+
+    def test_order_by_oracles_per_step(self):
+        test_scenarios = [
+            {"steps": [{"oracles": []}, {"oracles": None}]},
+            {"steps": [{"oracles": ["a", "b"]}, {"oracles": ["c"]}]},
+            {"steps": [{"oracles": ["a"]}]},
+            {"steps": [{"oracles": []}, {"oracles": []}]},
+        ]
+        order = ScenarioScheduler().order(test_scenarios)
+        self.assertEqual([index for index, _ in order], [1, 2, 0, 3])
+
+    def test_admit_by_mean_scenario_cost(self):
+        budget = Budget(max_cost=10.0)
+        scheduler = ScenarioScheduler(pr_budget=budget)
+        self.assertTrue(scheduler.admit(0))
+        scheduler.record_execution(0, self.get_replay_output(3.0, 1.0, 1.0, llm_calls=2))
+        scheduler.record_detection(0, [{}, {}], cost=1.0, duration_mins=0.5)
+        self.assertEqual(budget.cost, 4.0)
+        self.assertEqual(budget.llm_calls, 4)
+        self.assertEqual(scheduler.get_expected_cost(), (4.0, 2.5, 4))
+        self.assertTrue(scheduler.admit(1))
+        scheduler.record_execution(1, self.get_replay_output(4.0, 1.0, 1.0, llm_calls=1))
+        # 8.0 spent, the mean scenario (4.0) no longer fits
+        self.assertFalse(scheduler.admit(2))
+        self.assertEqual(scheduler.skipped_indexes, [2])
+
+    def test_batch_budget_also_limits(self):
+        scheduler = ScenarioScheduler(pr_budget=Budget(max_cost=100.0), batch_budget=Budget(max_cost=5.0))
+        scheduler.record_execution(0, self.get_replay_output(3.0, 0.0, 0.0, llm_calls=1))
+        self.assertFalse(scheduler.admit(1))
+
+    def test_adjust_once_degraded(self):
+        budget = Budget(max_cost=10.0)
+        scheduler = ScenarioScheduler(pr_budget=budget, degrade_ratio=0.8, degraded_executor_model="small")
+        executor_kwargs = {"executor_model": "large"}
+        detector_kwargs = {"detector_model": "large", "detector_reasoning_level": "high"}
+        self.assertEqual(scheduler.adjust(executor_kwargs, detector_kwargs), (executor_kwargs, detector_kwargs))
+        budget.charge(cost=8.0)
+        self.assertEqual(scheduler.adjust(executor_kwargs, detector_kwargs),
+                         ({"executor_model": "small"}, {"detector_model": "large", "detector_reasoning_level": "low"}))
+        self.assertEqual(executor_kwargs, {"executor_model": "large"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.types.settle_profile import SettleProfile
+from config import SETTLE_PROFILE_MIN_SAMPLES, SETTLE_PROFILE_TIMEOUT_FACTOR, SETTLE_PROFILE_MIN_DELAY_MS, \
+    SETTLE_PROFILE_MAX_TIMEOUT_MS
+
+
+class SettleProfileTest(unittest.TestCase):
+    """
+    SettleProfile percentiles, the timing they give, key fallback and persistence
+    """
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.filepath = Path(tmp_dir.name, "settle_profiles.json")
+        self.profile = SettleProfile(self.filepath)
+
+    def test_get_percentile(self):
+        values = list(range(100, 0, -1))
+        self.assertEqual(SettleProfile.get_percentile(values, 10), 11)
+        self.assertEqual(SettleProfile.get_percentile(values, 95), 96)
+        self.assertEqual(SettleProfile.get_percentile(values, 100), 100)
+        self.assertEqual(SettleProfile.get_percentile([7], 95), 7)
+
+    def test_defaults_while_samples_are_scarce(self):
+        for _ in range(SETTLE_PROFILE_MIN_SAMPLES - 1):
+            self.profile.record("zettlr", "a", "click", 400)
+        self.assertEqual(self.profile.get_timing("zettlr", "a", "click", 500, 200, 3000), (200, 3000))
+
+    def test_timing_from_percentiles(self):
+        for settle_ms in range(100, 2100, 100):
+            self.profile.record("zettlr", "a", "click", settle_ms)
+        min_ms, timeout_ms = self.profile.get_timing("zettlr", "a", "click", 500, 200, 3000)
+        self.assertEqual(min_ms, 300)
+        self.assertEqual(timeout_ms, int(2000 * SETTLE_PROFILE_TIMEOUT_FACTOR) + 500)
+
+    def test_timing_bounds(self):
+        for _ in range(SETTLE_PROFILE_MIN_SAMPLES):
+            self.profile.record("zettlr", "a", "click", 0)
+            self.profile.record("zettlr", "a", "drag", SETTLE_PROFILE_MAX_TIMEOUT_MS * 10)
+        self.assertEqual(self.profile.get_timing("zettlr", "a", "click", 500, 200, 3000),
+                         (SETTLE_PROFILE_MIN_DELAY_MS, 500 + SETTLE_PROFILE_MIN_DELAY_MS))
+        self.assertEqual(self.profile.get_timing("zettlr", "a", "drag", 500, 200, 3000)[1],
+                         SETTLE_PROFILE_MAX_TIMEOUT_MS)
+
+    def test_fallback_to_all_builds_and_base_action(self):
+        keypress_kind = SettleProfile.get_action_kind("keypress", ["Ctrl", "S"])
+        self.assertEqual(keypress_kind, "keypress:ctrl+s")
+        for _ in range(SETTLE_PROFILE_MIN_SAMPLES):
+            self.profile.record("zettlr", "a", keypress_kind, 1000)
+        # another build, another combo: the samples of build "a" count for all builds and for every keypress
+        self.assertNotEqual(self.profile.get_timing("zettlr", "b", "keypress:ctrl+o", 500, 200, 3000), (200, 3000))
+        self.assertEqual(self.profile.get_timing("godot", "a", keypress_kind, 500, 200, 3000), (200, 3000))
+
+    def test_save_and_load(self):
+        for _ in range(SETTLE_PROFILE_MIN_SAMPLES):
+            self.profile.record("zettlr", "a", "click", 400)
+        self.profile.save()
+        profile = SettleProfile(self.filepath)
+        self.assertEqual(profile.get_timing("zettlr", "a", "click", 500, 200, 3000),
+                         self.profile.get_timing("zettlr", "a", "click", 500, 200, 3000))
+
+    def test_unreadable_file_is_ignored(self):
+        self.filepath.write_text("{")
+        self.assertEqual(SettleProfile(self.filepath).samples, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
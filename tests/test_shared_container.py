@@ -0,0 +1,80 @@
+import unittest
+from unittest import mock
+
+from src.types.docker import DockerComputer, DockerComputerPool
+from config import DOCKER_COMPUTER_VNC_PORT
+
+
+class SharedContainerTest(unittest.TestCase):
+    """
+    SharedContainer.run_display against a mocked Docker: which display starts the container, which reuse it
+    """
+
+    def setUp(self):
+        self.running = False
+        patches = [
+            mock.patch.object(DockerComputer, "backend", "xdotool"),
+            mock.patch.object(DockerComputer, "run_from_image", side_effect=self.run_container),
+            mock.patch.object(DockerComputer, "is_running", side_effect=lambda: self.running),
+            mock.patch.object(DockerComputer, "start_display", autospec=True),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.run_from_image = DockerComputer.run_from_image
+        self.start_display = DockerComputer.start_display
+        self.pool = DockerComputerPool(size=2, name_prefix="shared-test", displays_per_container=2)
+
+    def run_container(self, **kwargs):
+        self.running = True
+
+    def get_start_display_calls(self):
+        return [(computer.display, vnc_port, kwargs) for (computer, vnc_port), kwargs
+                in self.start_display.call_args_list]
+
+    def test_two_displays_leased_at_once(self):
+        with self.pool.lease(2) as (slot_0, slot_1):
+            computer_0 = slot_0.run_from_image("zettlr:diff-a")
+            computer_1 = slot_1.run_from_image("zettlr:diff-a")
+        self.assertEqual(self.run_from_image.call_count, 1)
+        self.assertEqual(self.run_from_image.call_args.kwargs["name"], "shared-test-0")
+        self.assertEqual((computer_0.container_name, computer_1.container_name), ("shared-test-0", "shared-test-0"))
+        self.assertEqual(self.get_start_display_calls(), [
+            (slot_0.display, DOCKER_COMPUTER_VNC_PORT, {"start": False, "reset": False}),
+            (slot_1.display, DOCKER_COMPUTER_VNC_PORT + 1, {"start": True, "reset": True}),
+        ])
+
+    def test_second_display_starts_the_container(self):
+        with self.pool.lease(2) as (slot_0, slot_1):
+            slot_1.run_from_image("zettlr:diff-a")
+            slot_0.run_from_image("zettlr:diff-a")
+        self.assertEqual(self.run_from_image.call_count, 1)
+        self.assertEqual(self.get_start_display_calls(), [
+            (slot_1.display, DOCKER_COMPUTER_VNC_PORT + 1, {"start": True, "reset": False}),
+            (slot_0.display, DOCKER_COMPUTER_VNC_PORT, {"start": False, "reset": True}),
+        ])
+
+    def test_other_image_refused_while_a_display_is_in_use(self):
+        with self.pool.lease(2) as (slot_0, slot_1):
+            slot_0.run_from_image("zettlr:diff-a")
+            with self.assertRaises(RuntimeError):
+                slot_1.run_from_image("zettlr:diff-b")
+
+    def test_restarted_when_not_running(self):
+        with self.pool.lease(2) as (slot_0, slot_1):
+            slot_0.run_from_image("zettlr:diff-a")
+            self.running = False
+            slot_1.run_from_image("zettlr:diff-b")
+        self.assertEqual(self.run_from_image.call_count, 2)
+
+    def test_recreated_once_released(self):
+        with self.pool.lease(1) as slot_0:
+            slot_0.run_from_image("zettlr:diff-a")
+        with self.pool.lease(1) as slot_1:
+            slot_1.run_from_image("zettlr:diff-b")
+        self.assertEqual(self.run_from_image.call_count, 2)
+        self.assertEqual(self.run_from_image.call_args.kwargs["image"], "zettlr:diff-b")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from src.types.work_queue import WorkQueue
+
+
+class WorkQueueTest(unittest.TestCase):
+    """
+    WorkQueue claim order, completion with artifacts, and requeueing of tasks whose worker went away
+    """
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+        self.queue = WorkQueue(Path(self.tmp_dir, "queue"))
+
+    def put(self, task_id, submitted_ago):
+        self.queue.put(task_id, {"index": task_id})
+        submitted_at = time.time() - submitted_ago
+        os.utime(self.queue._path(WorkQueue.PENDING, task_id), (submitted_at, submitted_at))
+
+    def test_claim_oldest_first(self):
+        self.put("b", submitted_ago=10)
+        self.put("a", submitted_ago=20)
+        task = self.queue.claim(worker_id="worker-0")
+        self.assertEqual((task["task_id"], task["payload"], task["worker_id"]), ("a", {"index": "a"}, "worker-0"))
+        self.assertEqual(self.queue.claim()["task_id"], "b")
+        self.assertIsNone(self.queue.claim())
+
+    def test_claim_skips_task_taken_by_another_worker(self):
+        self.put("a", submitted_ago=20)
+        self.put("b", submitted_ago=10)
+        rename = os.rename
+
+        def rename_after_other_worker(src, dst):
+            if Path(src).stem == "a":
+                raise FileNotFoundError(src)
+            return rename(src, dst)
+
+        with mock.patch("src.types.work_queue.os.rename", side_effect=rename_after_other_worker):
+            self.assertEqual(self.queue.claim()["task_id"], "b")
+
+    def test_complete(self):
+        self.put("a", submitted_ago=0)
+        task = self.queue.claim(worker_id="worker-0")
+        self.assertEqual(self.queue.get_result("a"), (None, None))
+        artifacts_path = Path(self.tmp_dir, "artifacts")
+        artifacts_path.mkdir()
+        Path(artifacts_path, "replay.json").write_text("{}")
+        self.queue.complete(task, {"index": 0}, artifacts_path=artifacts_path)
+
+        state, result = self.queue.get_result("a")
+        self.assertEqual((state, result["result"], result["worker_id"]), (WorkQueue.DONE, {"index": 0}, "worker-0"))
+        self.assertTrue(Path(self.queue.get_artifacts_path("a"), "replay.json").exists())
+        self.assertFalse(self.queue._path(WorkQueue.RUNNING, "a").exists())
+
+    def test_fail(self):
+        self.put("a", submitted_ago=0)
+        self.queue.fail(self.queue.claim(), RuntimeError("no display"))
+        self.assertEqual(self.queue.get_result("a"), (WorkQueue.FAILED, mock.ANY))
+        self.assertEqual(self.queue.get_result("a")[1]["result"], {"error": "no display"})
+
+    def test_requeue_stale(self):
+        # pending for longer than the lease: claiming restarts the lease
+        self.put("a", submitted_ago=600)
+        self.put("b", submitted_ago=600)
+        self.queue.claim()
+        self.queue.claim()
+        self.assertEqual(self.queue.requeue_stale(lease_timeout=60), [])
+
+        lost_at = time.time() - 120
+        os.utime(self.queue._path(WorkQueue.RUNNING, "a"), (lost_at, lost_at))
+        self.assertEqual(self.queue.requeue_stale(lease_timeout=60), ["a"])
+        self.assertEqual(self.queue.claim()["task_id"], "a")
+
+    def test_put_again_clears_previous_result(self):
+        self.put("a", submitted_ago=0)
+        self.queue.complete(self.queue.claim(), {"index": 0})
+        self.put("a", submitted_ago=0)
+        self.assertEqual(self.queue.get_result("a"), (None, None))
+        self.assertEqual(self.queue.claim()["task_id"], "a")
+
+
+if __name__ == "__main__":
+    unittest.main()